@@ -0,0 +1,106 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from madz.MDL.ast_cache import MdlAstCache
+from madz.MDL.loaders import MDLparser, MdlCachedLoader
+from madz.MDL.parser.parser import ParseError
+from madz.MDL.parser_impl import get_result
+
+source = "type a int8;\ntype b {x: int8, y: *b};\nvar f (v a) -> b;\n"
+
+def parse(source):
+    return get_result(MDLparser.parse(source))
+
+class Madz_AstCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MdlAstCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.directory.name) if name.endswith(".pickle"))
+
+    def test_key(self):
+        """Keys depend only on the source."""
+        self.assertEqual(self.cache.key(source), MdlAstCache(os.path.join(self.directory.name, "other")).key(source))
+        self.assertNotEqual(self.cache.key(source), self.cache.key(source + " "))
+
+    def test_put_get(self):
+        key = self.cache.key(source)
+        self.assertFalse(self.cache.contains(key))
+        self.assertEqual(self.cache.get(key), None)
+        self.cache.put(key, parse(source), ["c"])
+        self.assertTrue(self.cache.contains(key))
+        roots, chunk_keys = self.cache.get(key)
+        self.assertEqual(roots, parse(source))
+        self.assertEqual(chunk_keys, ["c"])
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_invalid_entries(self):
+        """Unreadable entries, or entries of another key, are misses."""
+        key, other = self.cache.key(source), self.cache.key("")
+        self.cache.put(key, [])
+        with open(os.path.join(self.directory.name, self.entries()[0]), "wb") as entry_file:
+            entry_file.write(b"garbage")
+        self.assertEqual(self.cache.get(key), None)
+        with open(os.path.join(self.directory.name, "ast-{}.pickle".format(other)), "wb") as entry_file:
+            entry_file.write(pickle.dumps((key, [], None)))
+        self.assertEqual(self.cache.get(other), None)
+
+    def test_load(self):
+        """Sources are parsed once, and failed parses aren't cached."""
+        calls = []
+        def parse_func(source):
+            calls.append(source)
+            return MdlCachedLoader.parse_source(source)
+        first = self.cache.load(source, parse_func)
+        second = self.cache.load(source, parse_func)
+        self.assertEqual(first, second)
+        self.assertEqual(calls, [source])
+
+        self.assertRaises(ParseError, self.cache.load, "type @;", parse_func)
+        self.assertRaises(ParseError, self.cache.load, "type @;", parse_func)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_evict(self):
+        """The least recently used entries are removed first."""
+        keys = [self.cache.key(str(index)) for index in range(3)]
+        for index, key in enumerate(keys):
+            self.cache.put(key, [])
+            os.utime(os.path.join(self.directory.name, "ast-{}.pickle".format(key)), (index, index))
+        self.cache.get(keys[0])
+        size = os.path.getsize(os.path.join(self.directory.name, "ast-{}.pickle".format(keys[0])))
+        self.cache.max_bytes = 2 * size
+        self.cache.evict()
+        self.assertTrue(self.cache.contains(keys[0]))
+        self.assertFalse(self.cache.contains(keys[1]))
+        self.assertTrue(self.cache.contains(keys[2]))
+
+    def test_changed_items(self):
+        """Only the changed items of an edited source are parsed, to the same result as a full parse."""
+        self.cache.load(source, lambda source: MdlCachedLoader.parse_source(source, self.cache))
+        edited = source.replace("y: *b", "y: *a")
+        with self.assertLogs("madz.MDL.loaders", "DEBUG") as logs:
+            roots, chunk_keys = MdlCachedLoader.parse_source(edited, self.cache)
+        self.assertIn("Parsed 1 changed MDL items of 3.", "\n".join(logs.output))
+        self.assertEqual(roots, parse(edited))
+        self.assertEqual(len(chunk_keys), 3)
+
+    def test_changed_items_error(self):
+        """A parse error in a changed item is reported by a full parse."""
+        self.cache.load(source, lambda source: MdlCachedLoader.parse_source(source, self.cache))
+        edited = source.replace("y: *b", "y *b")
+        self.assertRaises(ParseError, MdlCachedLoader.parse_source, edited, self.cache)
+
+    def test_pickle(self):
+        """Chunk keys stay in the process."""
+        self.cache.remember_chunks("key", ["c"])
+        copy = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(copy.directory, self.cache.directory)
+        self.assertEqual(copy.find_chunks(["c"]), {})
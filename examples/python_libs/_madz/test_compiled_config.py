@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from madz.config import *
+from madz.config.compiled import CompiledConfigCache, evaluate_config_file
+
+plain_config = """
+from madz.config import *
+config = UserConfig([OptionSystemSkipDependencies({})])
+"""
+
+own_class_config = """
+from madz.config import *
+class OwnOption(BaseOption):
+    default_value = 1
+config = UserConfig([OwnOption(3)])
+"""
+
+class Madz_CompiledConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = CompiledConfigCache(os.path.join(self.directory, ".madz"))
+        self.evaluated = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, source):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "w") as f:
+            f.write(source)
+        return filename
+
+    def load(self, filename, kind="config"):
+        def evaluate():
+            self.evaluated += 1
+            return evaluate_config_file(filename)
+        return self.cache.load([filename], evaluate, kind=kind)
+
+    def test_cached_until_changed(self):
+        filename = self.write("plain.py", plain_config.format(True))
+        self.assertEqual(self.load(filename).get(OptionSystemSkipDependencies), True)
+        self.assertEqual(self.load(filename).get(OptionSystemSkipDependencies), True)
+        self.assertEqual(self.evaluated, 1)
+
+        self.write("plain.py", plain_config.format(False))
+        self.assertEqual(self.load(filename).get(OptionSystemSkipDependencies), False)
+        self.assertEqual(self.evaluated, 2)
+
+    def test_kinds_are_kept_apart(self):
+        filename = self.write("plain.py", plain_config.format(True))
+        self.load(filename)
+        self.load(filename, kind="system")
+        self.load(filename, kind="system")
+        self.assertEqual(self.evaluated, 2)
+
+    def test_config_file_classes_not_cached(self):
+        """Configs using classes defined in the config file can't be unpickled in another process."""
+        filename = self.write("own.py", own_class_config)
+        self.load(filename)
+        self.load(filename)
+        self.assertEqual(self.evaluated, 2)
+        self.assertFalse(os.path.exists(self.cache.directory) and os.listdir(self.cache.directory))
@@ -0,0 +1,81 @@
+import threading
+import unittest
+
+from madz.config import *
+
+class Madz_FlatConfig(unittest.TestCase):
+
+    def test_values(self):
+        with config.and_merge(SystemConfig([OptionSystemSkipDependencies(True)])):
+            flat = config.get_flat_config()
+            self.assertIs(flat, config.get_flat_config())
+            self.assertEqual(flat[OptionSystemSkipDependencies], True)
+            self.assertEqual(config.get(OptionSystemSkipDependencies), True)
+            self.assertEqual(flat.get(OptionSystemExecutePlugin, "missing"), "missing")
+        self.assertEqual(config.get(OptionSystemSkipDependencies), False)
+
+    def test_imposters_at_lookup(self):
+        """Imposters provide their option when the config is looked up, not when it is merged."""
+        preference = ["gcc"]
+        imposter_config = SystemConfig([OptionImposter(lambda: OptionCompilerPreference(preference[0]))])
+        world = ConfigWorld([imposter_config])
+        flat = world.get_flat_config()
+        self.assertEqual(flat[OptionCompilerPreference], "gcc")
+        preference[0] = "clang"
+        self.assertIs(flat, world.get_flat_config())
+        self.assertEqual(flat[OptionCompilerPreference], "clang")
+        self.assertEqual(flat.get(OptionCompilerPreference), "clang")
+        self.assertEqual(world.get(OptionCompilerPreference), "clang")
+        self.assertEqual(dict(flat.items())[OptionCompilerPreference], "clang")
+
+class Madz_ConfigWorld(unittest.TestCase):
+
+    def setUp(self):
+        self.skip = SystemConfig([OptionSystemSkipDependencies(True)])
+        self.world = ConfigWorld([SystemConfig([OptionSystemSkipDependencies(False)])])
+
+    def test_merge_cached(self):
+        """Merged configs are computed once per stack, and again when the stack changes."""
+        world = self.world
+        merged = world.get_merged_config()
+        self.assertIs(merged, world.get_merged_config())
+        with world.and_merge(self.skip):
+            self.assertIsNot(world.get_merged_config(), merged)
+            self.assertEqual(world.get(OptionSystemSkipDependencies), True)
+            inner = world.get_merged_config()
+        self.assertIs(world.get_merged_config(), merged)
+        with world.and_merge(self.skip):
+            self.assertIs(world.get_merged_config(), inner)
+
+    def test_layers_shared(self):
+        """Stacks share their layers, and copied states are unaffected by later changes."""
+        world = self.world
+        state = world.copy_state()
+        world.add(self.skip)
+        self.assertEqual(len(world.config_list), 2)
+        self.assertIs(world.layer.parent, state)
+        self.assertIs(world.pop(), self.skip)
+        self.assertIs(world.copy_state(), state)
+        self.assertIs(state.push(self.skip), state.push(self.skip))
+
+        world.set_state(ConfigLayer.from_list([self.skip]))
+        self.assertEqual(world.config_list, [self.skip])
+        world.set_state(state)
+        self.assertEqual(world.get(OptionSystemSkipDependencies), False)
+        self.assertRaises(IndexError, ConfigLayer().pop)
+
+    def test_stack_per_thread(self):
+        """Each thread starts from the default stack, and its changes stay in it."""
+        world = self.world
+        seen = []
+        def run():
+            seen.append(world.get(OptionSystemSkipDependencies))
+            world.add(self.skip)
+            seen.append(world.get(OptionSystemSkipDependencies))
+        with world.and_merge(self.skip):
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+            self.assertEqual(world.get(OptionSystemSkipDependencies), True)
+        self.assertEqual(seen, [False, True])
+        self.assertEqual(len(world.config_list), 1)
@@ -0,0 +1,85 @@
+import unittest
+
+from madz.core.dependency_graph import PluginDependencyGraph
+
+class FakePlugin(object):
+    """Stands in for a PluginStub, the graph only reads loaded_depends and loaded_imports."""
+    def __init__(self, name, depends=(), imports=()):
+        self.name = name
+        self.loaded_depends = list(depends)
+        self.loaded_imports = list(imports)
+
+    def __repr__(self):
+        return self.name
+
+def make_plugins(edges):
+    """Makes plugins from a {name: (depends, imports)} dictionary of names."""
+    plugins = {name: FakePlugin(name) for name in edges}
+    for name, (depends, imports) in edges.items():
+        plugins[name].loaded_depends = [plugins[dep] for dep in depends]
+        plugins[name].loaded_imports = [plugins[imp] for imp in imports]
+    return plugins
+
+class Madz_DependencyGraph(unittest.TestCase):
+
+    def test_chain(self):
+        """Closures of an acyclic graph, each requirement after the plugins it depends on."""
+        p = make_plugins({"a": (["b"], []), "b": (["c"], []), "c": ([], []), "d": ([], ["a"])})
+        graph = PluginDependencyGraph([p["d"]])
+        self.assertEqual(len(graph), 4)
+        self.assertFalse(graph.has_cycles())
+        order = graph.topological_order()
+        self.assertTrue(order.index(p["c"]) < order.index(p["b"]) < order.index(p["a"]) < order.index(p["d"]))
+        self.assertEqual(graph.recursive_depends(p["a"]), [p["c"], p["b"]])
+        self.assertEqual(graph.recursive_depends(p["d"]), [])
+        self.assertEqual(graph.required_imports(p["d"]), [p["c"], p["b"], p["a"]])
+        self.assertEqual(set(graph.recursive_requires(p["d"])), {p["a"], p["b"], p["c"]})
+        self.assertEqual(graph.dependents(p["c"]), [p["b"]])
+        self.assertEqual(graph.affected_by([p["b"]]), [p["b"], p["a"], p["d"]])
+
+    def test_cycle_closures(self):
+        """Every plugin of a cycle requires every plugin of the cycle, whichever plugin is asked first."""
+        for first in "abc":
+            p = make_plugins({"a": (["b"], []), "b": (["c"], []), "c": (["a"], []), "d": (["a"], [])})
+            graph = PluginDependencyGraph([p[first], p["d"]])
+            cycle = {p["a"], p["b"], p["c"]}
+            self.assertEqual([set(c) for c in graph.cycles()], [cycle])
+            for name in "abc":
+                self.assertEqual(set(graph.recursive_requires(p[name])), cycle)
+                self.assertEqual(set(graph.recursive_depends(p[name])), cycle)
+            self.assertEqual(set(graph.recursive_requires(p["d"])), cycle)
+            self.assertEqual(graph.affected_by([p["c"]]), [q for q in graph.topological_order() if q in cycle | {p["d"]}])
+
+    def test_cycle_through_imports(self):
+        """A cycle made by an import is a requires cycle, but not a depends cycle."""
+        p = make_plugins({"driver": (["task"], []), "task": (["base"], ["driver"]), "base": ([], [])})
+        graph = PluginDependencyGraph([p["driver"]])
+        requires = {p["driver"], p["task"], p["base"]}
+        self.assertEqual(set(graph.recursive_requires(p["driver"])), requires)
+        self.assertEqual(set(graph.recursive_requires(p["task"])), requires)
+        self.assertEqual(graph.recursive_depends(p["driver"]), [p["base"], p["task"]])
+        self.assertEqual(graph.recursive_depends(p["task"]), [p["base"]])
+        self.assertEqual(graph.required_imports(p["task"]), [p["base"], p["task"], p["driver"]])
+
+    def test_self_cycle(self):
+        p = make_plugins({"a": (["a"], []), "b": (["a"], [])})
+        graph = PluginDependencyGraph([p["b"]])
+        self.assertEqual(graph.cycles(), [[p["a"]]])
+        self.assertEqual(graph.recursive_depends(p["a"]), [p["a"]])
+        self.assertEqual(graph.recursive_depends(p["b"]), [p["a"]])
+
+    def test_deep_chain(self):
+        """Graph walks are iterative, deep graphs don't hit the recursion limit."""
+        plugins = [FakePlugin("p0")]
+        for i in range(1, 5000):
+            plugins.append(FakePlugin("p{}".format(i), depends=[plugins[-1]]))
+        graph = PluginDependencyGraph([plugins[-1]])
+        self.assertEqual(graph.recursive_depends(plugins[-1]), plugins[:-1])
+
+    def test_unresolved_requirements(self):
+        """Requirements which failed to resolve are None, they are skipped."""
+        a = FakePlugin("a")
+        b = FakePlugin("b", depends=[None, a, a])
+        graph = PluginDependencyGraph([b])
+        self.assertEqual(graph.requires(b), [a])
+        self.assertEqual(graph.recursive_depends(b), [a])
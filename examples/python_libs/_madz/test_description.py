@@ -0,0 +1,170 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from madz.MDL import base_types, nodes
+from madz.MDL.description import MDLDescription, MDLparser
+from madz.MDL.ast_cache import MdlAstCache
+from madz.MDL.loaders import MdlRawLoader, MdlStringLoader, MdlCachedLoader
+from madz.MDL.parser_impl import get_result
+
+def make_description(source, dependencies={}):
+    description = MDLDescription(MdlRawLoader([]), dict(dependencies))
+    description.ast = sorted(get_result(MDLparser.parse(source)), key=MDLDescription.keyfunc)
+    return description
+
+def get_root(description, name):
+    return [root for root in description.ast if root.name == name][0]
+
+class Madz_DescriptionInterning(unittest.TestCase):
+
+    def test_shared_structure(self):
+        """Structurally identical types are a single shared instance, across descriptions."""
+        a = make_description("type s {a: int8, b: *(x float32) -> void};")
+        b = make_description("var v {a: int8, b: *(x float32) -> void};")
+        self.assertIs(get_root(a, "s").type, get_root(b, "v").type)
+        self.assertEqual(get_root(a, "s").type, get_root(b, "v").type)
+        self.assertEqual(hash(get_root(a, "s").type), hash(get_root(b, "v").type))
+
+    def test_shared_types_are_immutable(self):
+        shared = get_root(make_description("type s {a: int8};"), "s").type
+        self.assertRaises(ValueError, shared.set_attribute, nodes.DocumentationAttribute, nodes.DocumentationAttribute("doc"))
+        self.assertIs(shared.copy(), shared)
+
+    def test_named_types_are_scoped(self):
+        """A NamedType resolves in the description it is in, even when its symbol has a namespace."""
+        dep_x = make_description("type T int8;")
+        dep_y = make_description("type T float64;")
+        x = make_description("var v *dep.T;", {"dep": dep_x})
+        y = make_description("var v *dep.T;", {"dep": dep_y})
+        self.assertTrue(x.validate())
+        self.assertTrue(y.validate())
+        self.assertIsNot(get_root(x, "v").type, get_root(y, "v").type)
+        self.assertEqual(get_root(x, "v").type.type.get_type(), base_types.TypeInt8)
+        self.assertEqual(get_root(y, "v").type.type.get_type(), base_types.TypeFloat64)
+
+    def test_unshared_types(self):
+        """Types with attributes are left as they are."""
+        struct = base_types.TypeStruct([base_types.TypeStructElement("a", base_types.TypePointer(base_types.TypeInt8))])
+        struct.set_attribute(nodes.DocumentationAttribute, nodes.DocumentationAttribute("A struct."))
+        self.assertIs(base_types.type_interner.intern(struct), struct)
+        self.assertIsNone(struct._interned)
+        self.assertIsNone(struct.elements[0].type._interned)
+
+class Madz_DescriptionValidation(unittest.TestCase):
+
+    dep_source = "type u int32;\ntype node {next: *node, v: u};\n"
+    main_source = "var x *dep.node;\ntype y {a: dep.node, b: *y};\nvar z y;\n"
+
+    def setUp(self):
+        self.dep = make_description(self.dep_source)
+        self.main = make_description(self.main_source, {"dep": self.dep})
+
+    def count_struct_validations(self):
+        return mock.patch.object(base_types.TypeStruct, "validate", autospec=True, side_effect=base_types.TypeStruct.validate)
+
+    def test_recursive_types(self):
+        """Recursive types, across descriptions, validate and are remembered."""
+        self.assertTrue(self.dep.validate())
+        self.assertTrue(self.main.validate())
+        self.assertEqual(self.main._validate_state.errors, [])
+        self.assertIn(get_root(self.dep, "node").type, self.dep._validated_types)
+        self.assertIn(get_root(self.main, "y").type, self.main._validated_types)
+
+    def test_revalidate_unchanged(self):
+        """Revalidating unchanged descriptions validates no remembered types again."""
+        self.dep.validate()
+        self.main.validate()
+        with self.count_struct_validations() as validate:
+            self.assertTrue(self.dep.revalidate())
+            self.assertTrue(self.main.revalidate())
+        self.assertEqual(validate.call_count, 0)
+
+    def test_dependency_changed(self):
+        """A changed declaration in a dependency is found by the types referring to it, with the same errors."""
+        self.dep.validate()
+        self.main.validate()
+        broken = base_types.TypeStruct([base_types.TypeStructElement("1bad", base_types.TypeInt32)])
+        self.dep.ast = [root for root in self.dep.ast if root.name != "u"] + [nodes.TypeDeclaration("u", broken)]
+        self.dep.revalidate()
+        self.main.revalidate()
+        self.assertIn("StructElement name '1bad' is not valid.", "".join(self.main._validate_state.errors))
+
+        fresh = make_description(self.main_source, {"dep": self.dep})
+        fresh.validate()
+        self.assertEqual(fresh._validate_state.errors, self.main._validate_state.errors)
+
+    def test_invalid_types_are_not_remembered(self):
+        """Types with errors are validated, and report their errors, every time."""
+        description = make_description("type w {a: missing_name};")
+        description.validate()
+        errors = description._validate_state.errors
+        self.assertNotEqual(errors, [])
+        self.assertNotIn(get_root(description, "w").type, description._validated_types)
+        description.revalidate()
+        self.assertEqual(description._validate_state.errors, errors)
+
+class Madz_DescriptionIndexes(unittest.TestCase):
+
+    def test_lookups(self):
+        dep = make_description("type t int8;")
+        description = make_description("type a int8;\ntype b {x: a};\nvar f (v a) -> void;\nvar g a;\n", {"dep": dep})
+        a = get_root(description, "a")
+        self.assertEqual([root.name for root in description.declarations()], ["a", "b"])
+        self.assertEqual([root.name for root in description.definitions()], ["f", "g"])
+        self.assertEqual(description.get_definition_index("g"), 1)
+        self.assertRaises(KeyError, description.get_definition_index, "a")
+        self.assertIs(description.get_named_root("", "a", nodes.TypeDeclaration), a)
+        self.assertIs(description.get_named_root("dep", "t", nodes.TypeDeclaration), get_root(dep, "t"))
+        self.assertEqual(description.get_name_for_node(a.type), "a")
+        self.assertEqual(description.get_types_of(a.type), [a])
+        self.assertIs(description.resolve_type("dep.t"), get_root(dep, "t").type)
+        self.assertIsNone(description.resolve_type("f"))
+        self.assertIsNone(description.resolve_type("missing"))
+
+    def test_ast_changed(self):
+        """The indexes are built again when the ast is set."""
+        description = make_description("type a int8;")
+        self.assertEqual(len(description.declarations()), 1)
+        description.ast = description.ast + get_result(MDLparser.parse("type b int16;"))
+        self.assertEqual([root.name for root in description.declarations()], ["a", "b"])
+        self.assertEqual(description.resolve_type("b"), base_types.TypeInt16)
+
+class Madz_DescriptionPreload(unittest.TestCase):
+
+    sources = ["type a int8;\nvar f (x a) -> void;\n", "type b {x: int8, y: *b};\nvar g b;\n"]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MdlAstCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_descriptions(self, sources):
+        return [MDLDescription(MdlCachedLoader(MdlStringLoader(source), self.cache), {}) for source in sources]
+
+    def serial_ast(self, source):
+        return sorted(get_result(MDLparser.parse(source)), key=MDLDescription.keyfunc)
+
+    def test_workers(self):
+        """Sources parsed in workers give the same ast as a serial parse, and each source is parsed once."""
+        descriptions = self.make_descriptions(self.sources + self.sources[:1])
+        with self.assertLogs("madz.MDL.description", "DEBUG") as logs:
+            self.assertEqual(MDLDescription.preload_all(descriptions, workers=2), 3)
+        self.assertIn("Parsing 2 MDL sources with 2 workers", "\n".join(logs.output))
+        for description, source in zip(descriptions, self.sources + self.sources[:1]):
+            self.assertEqual(description.ast, self.serial_ast(source))
+        self.assertIsNot(descriptions[0].ast, descriptions[2].ast)
+        self.assertTrue(self.cache.contains(self.cache.key(self.sources[1])))
+
+    def test_cached_skipped(self):
+        """Sources already in the cache, or of materialized descriptions, aren't preloaded."""
+        self.make_descriptions(self.sources[:1])[0].ast
+        descriptions = self.make_descriptions(self.sources)
+        self.assertEqual(MDLDescription.preload_all(descriptions, workers=2), 1)
+        self.assertIsNone(descriptions[0]._preloaded_ast)
+        self.assertIsNotNone(descriptions[1]._preloaded_ast)
+        self.assertEqual(MDLDescription.preload_all(descriptions, workers=2), 0)
+        self.assertEqual([description.ast for description in descriptions], [self.serial_ast(source) for source in self.sources])
+        self.assertEqual(MDLDescription.preload_all(self.make_descriptions(["type @;"]), workers=0), 0)
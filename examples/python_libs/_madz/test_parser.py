@@ -0,0 +1,108 @@
+import unittest
+
+from madz.MDL import nodes
+from madz.MDL.loaders import MDLparser
+from madz.MDL.parser.lexer import Lexer
+from madz.MDL.parser.parse_rules import ParseRuleChar, ParseRuleMatch
+from madz.MDL.parser.parser import Parser, ParseError, ParseLimitError
+from madz.MDL.parser_impl import get_result
+
+class Madz_Parser(unittest.TestCase):
+
+    def test_parse(self):
+        roots = get_result(MDLparser.parse("type t {a: int8, b: *t};\nvar f (x t) -> void;\n"))
+        self.assertEqual([(root.__class__, root.name) for root in roots],
+            [(nodes.TypeDeclaration, "t"), (nodes.VariableDefinition, "f")])
+
+    def test_error_lists_expected(self):
+        """Rules which can't match the next character are reported with what they expected."""
+        with self.assertRaises(ParseError) as context:
+            MDLparser.parse("type t @;")
+        message = str(context.exception)
+        self.assertIn("line 1, column 8", message)
+        self.assertIn("TypeBase[int8]: Expected one of 'Ii'", message)
+        self.assertIn("TypeComplex[Struct]: Expected one of '{'", message)
+
+    def test_error_lists_failures(self):
+        """Rules which were tried are reported with their failure."""
+        with self.assertRaises(ParseError) as context:
+            MDLparser.parse("typo t int8;")
+        message = str(context.exception)
+        self.assertIn("KeyWord[Type]: No Keyword", message)
+        self.assertIn("KeyWord[Var]: Expected one of 'Vv'", message)
+
+    def test_error_in_struct(self):
+        with self.assertRaises(ParseError) as context:
+            MDLparser.parse("type t {a int8};")
+        self.assertIn("TypeComplex[Struct]!Sep: Expected one of ':'", str(context.exception))
+
+class Madz_Lexer(unittest.TestCase):
+
+    def test_tokenize(self):
+        """Tokens cover the whole source, unmatched characters are single character tokens."""
+        lexer = Lexer([("word", r"[a-z]+", None), ("space", r"\s+", None)])
+        tokens = lexer.tokenize("ab  c;")
+        self.assertEqual([lexer.names[kind] for kind in tokens.kinds], ["word", "space", "word", Lexer.OTHER])
+        self.assertEqual(list(tokens.starts), [0, 2, 4, 5])
+        self.assertEqual(tokens.end(1), 4)
+        self.assertEqual(tokens.end(3), 6)
+        self.assertEqual(tokens.index_at(4), 2)
+        self.assertIsNone(tokens.index_at(3))
+
+    def test_tokens_match_source(self):
+        """Parsing from the token stream gives the same result as parsing the source."""
+        source = "type t {a: int8}; # comment\nvar f (x *t) -> void;\n"
+        tokens = MDLparser.tokenize(source)
+        self.assertEqual(tokens.length, len(source))
+        self.assertEqual(get_result(MDLparser.parse(source, tokens=tokens)), get_result(MDLparser.parse(source)))
+
+def accepted_strings(state):
+    return [result.parsed_string for result, depth in state[Parser.ParseStateDebugStack.key()]._stack]
+
+class ItemRule(ParseRuleMatch):
+    """Matches 'x', then parses 'a's, ambiguously as 'a' or 'aa', up to a ';' in a level of its own."""
+    def __init__(self):
+        super().__init__(match="x")
+        self.rules = [ParseRuleMatch(match="a"), ParseRuleMatch(match="aa"), ParseRuleChar(char=";")]
+
+    def _gen_levelargs(self, state, **kwargs):
+        def on_start(level, state):
+            level.outer_rules = state[Parser.ParseStateRules.key()].value
+            state[Parser.ParseStateRules.key()].value = self.rules
+        def on_parsed(level, state, accepted):
+            if accepted.parsed_string == ";":
+                level.finish(state)
+        def on_end(level, state):
+            state[Parser.ParseStateRules.key()].value = level.outer_rules
+        return dict(on_start=on_start, on_parsed=on_parsed, on_end=on_end)
+
+class Madz_ParserBacktracking(unittest.TestCase):
+
+    def test_backtrack(self):
+        """When the longest match fails later, the other matching rule is tried."""
+        parser = Parser([ParseRuleMatch(match="ab"), ParseRuleMatch(match="a"), ParseRuleMatch(match="bc")], [])
+        self.assertEqual(accepted_strings(parser.parse("abc")), ["a", "bc"])
+        self.assertEqual(accepted_strings(parser.parse("abab")), ["ab", "ab"])
+        self.assertRaises(ParseError, parser.parse, "abd")
+
+    def test_items(self):
+        parser = Parser([ItemRule()], [])
+        self.assertEqual(accepted_strings(parser.parse("xaaa;xa;")), ["x", "aa", "a", ";", "x", "a", ";"])
+        with self.assertRaises(ParseError) as context:
+            parser.parse("xa;xaaab")
+        self.assertNotIsInstance(context.exception, ParseLimitError)
+        self.assertEqual(context.exception.column, 8)
+
+    def test_limit(self):
+        """Backtracking gives up with a ParseLimitError, after as many steps whatever comes before the item."""
+        parser = Parser([ItemRule()], [])
+        limits = []
+        for count in (0, 50):
+            with self.assertRaises(ParseLimitError) as context:
+                parser.parse("xaaaa;" * count + "x" + "a" * 30 + "b")
+            error = context.exception
+            self.assertIn("backtrack limit", str(error))
+            self.assertEqual(error.position, 6 * count)
+            self.assertEqual(error.error.position, 6 * count + 31)
+            limits.append(error.steps)
+        self.assertEqual(limits[0], limits[1])
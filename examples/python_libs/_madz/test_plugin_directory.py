@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from madz.config import *
+from madz.core import plugin_directory
+from madz.core.system import PluginSystem
+from madz.core.plugin_directory import PluginDirectory
+from madz.core.plugin_index import PluginIndexDatabase, IndexedPluginStubFile
+
+def write_plugin(root, name, depends=(), description=None):
+    """Writes the '__plugin__.py' of a C plugin called name in root."""
+    directory = os.path.join(root, name)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    if description is None:
+        description = "type t {a: int32};\nvar f (x int32) -> void;\n"
+    with open(os.path.join(directory, "__plugin__.py"), "w") as plugin_file:
+        plugin_file.write("from madz.plugin_stub import *\n\nplugin = Plugin(\n    namespace={!r},\n    language='c',\n"
+            "    depends={!r},\n    description={!r},\n)\n".format(name, list(depends), description))
+    return directory
+
+def touch_later(path):
+    """Makes sure a rewritten file's stamp differs from the old one."""
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + 2, stat.st_mtime + 2))
+
+class PluginTree(unittest.TestCase):
+    """Indexes a temporary tree of plugins a, b and c, where c depends on b and b on a."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        write_plugin(self.root, "a")
+        write_plugin(self.root, "b", ["a"])
+        write_plugin(self.root, "c", ["b"])
+        self.system_config = SystemConfig()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_system(self, use_index=True):
+        system = PluginSystem(self.system_config)
+        system.add_directory(PluginDirectory(self.root, use_index))
+        return system
+
+    def index(self, system, *configs):
+        with config.and_merge(self.system_config, *configs):
+            system.index()
+        return {plugin.id.namespace: plugin for plugin in system.all_plugins()}
+
+    def index_paths(self):
+        return sorted(os.path.basename(path) for path in PluginIndexDatabase.for_directory(self.root).paths())
+
+
+class Madz_PluginIndexDatabase(unittest.TestCase):
+
+    def test_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = PluginIndexDatabase.for_directory(directory)
+            self.assertEqual(database.get("/p"), None)
+            database.set("/p", {"stamp": [["/p/__plugin__.py", 1.0, 10]]})
+            self.assertEqual(database.get("/p")["stamp"], [["/p/__plugin__.py", 1.0, 10]])
+            self.assertEqual(database.paths(), ["/p"])
+            database.remove("/p")
+            self.assertEqual(database.paths(), [])
+            database.close()
+
+    def test_other_versions_ignored(self):
+        """Records of other madz versions, or which can't be read, are missing."""
+        with tempfile.TemporaryDirectory() as directory:
+            database = PluginIndexDatabase.for_directory(directory)
+            database.set("/p", {})
+            with mock.patch.object(PluginIndexDatabase, "format_version", PluginIndexDatabase.format_version + 1):
+                self.assertEqual(database.get("/p"), None)
+            with database._connection:
+                database._connection.execute("UPDATE plugins SET record = 'garbage'")
+            self.assertEqual(database.get("/p"), None)
+            database.close()
+
+
+class Madz_PluginIndex(PluginTree):
+
+    def test_index(self):
+        """Every plugin is recorded, and a new system reuses the records without loading the descriptions."""
+        plugins = self.index(self.make_system())
+        self.assertEqual(sorted(plugins), ["a", "b", "c"])
+        self.assertEqual(self.index_paths(), ["a", "b", "c"])
+
+        plugins = self.index(self.make_system())
+        self.assertEqual(sorted(plugins), ["a", "b", "c"])
+        for plugin in plugins.values():
+            self.assertIsInstance(plugin.plugin_description_loader, IndexedPluginStubFile)
+            self.assertFalse(plugin.plugin_description_loader.loaded)
+        self.assertEqual([str(dep) for dep in plugins["c"].depends], ["b"])
+        self.assertIs(plugins["c"].loaded_depends[0], plugins["b"])
+
+    def test_edit(self):
+        """An edited plugin is loaded again, unchanged plugins keep their stubs."""
+        system = self.make_system()
+        before = self.index(system)
+        touch_later(write_plugin(self.root, "c", ["a"]) + "/__plugin__.py")
+        after = self.index(system)
+        self.assertIs(after["a"], before["a"])
+        self.assertIs(after["b"], before["b"])
+        self.assertIsNot(after["c"], before["c"])
+        self.assertIs(after["c"].loaded_depends[0], after["a"])
+
+        # The index has the edit too
+        plugins = self.index(self.make_system())
+        self.assertFalse(plugins["c"].plugin_description_loader.loaded)
+        self.assertEqual(plugins["c"].plugin_description_loader.get_metadata()["depends"], ["a"])
+
+    def test_delete(self):
+        """A deleted plugin is removed from the system and the index."""
+        system = self.make_system()
+        self.index(system)
+        shutil.rmtree(os.path.join(self.root, "c"))
+        self.assertEqual(sorted(self.index(system)), ["a", "b"])
+        self.assertEqual(self.index_paths(), ["a", "b"])
+        self.assertEqual(sorted(self.index(self.make_system())), ["a", "b"])
+
+    def test_refresh(self):
+        """Refreshing a path re-indexes only the plugins it affects."""
+        system = self.make_system()
+        before = self.index(system)
+        touch_later(write_plugin(self.root, "b", ["a"], "type u int8;\n") + "/__plugin__.py")
+        write_plugin(self.root, "d", ["c"])
+        with config.and_merge(self.system_config):
+            system.refresh([os.path.join(self.root, "b", "__plugin__.py"), os.path.join(self.root, "d")])
+        after = {plugin.id.namespace: plugin for plugin in system.all_plugins()}
+        self.assertEqual(sorted(after), ["a", "b", "c", "d"])
+        self.assertIs(after["a"], before["a"])
+        self.assertIsNot(after["b"], before["b"])
+        self.assertEqual([node.name for node in after["b"].description.ast], ["u"])
+        self.assertEqual(self.index_paths(), ["a", "b", "c", "d"])
+
+
+class Madz_PluginIndexWorkers(PluginTree):
+
+    def describe(self, plugins):
+        return {namespace: (plugin.id.as_tuple(), [str(dep) for dep in plugin.depends], [str(imp) for imp in plugin.imports])
+            for namespace, plugin in plugins.items()}
+
+    def test_workers_match_serial(self):
+        """Plugins loaded in worker processes are the same as those loaded serially."""
+        with mock.patch.object(plugin_directory.concurrent.futures, "ProcessPoolExecutor") as pool:
+            serial = self.index(self.make_system(use_index=False), SystemConfig([OptionSystemIndexWorkers(0)]))
+        self.assertFalse(pool.called)
+
+        parallel = self.index(self.make_system(use_index=False), SystemConfig([OptionSystemIndexWorkers(2)]))
+        for plugin in parallel.values():
+            self.assertIsInstance(plugin.plugin_description_loader, IndexedPluginStubFile)
+        self.assertEqual(self.describe(parallel), self.describe(serial))
+        self.assertEqual([node.name for node in parallel["c"].description.ast], [node.name for node in serial["c"].description.ast])
@@ -0,0 +1,119 @@
+import unittest
+
+from madz.core.plugin_id import PluginId
+from madz.core.semver import SemanticVersion
+from madz.core.plugin_resolver import *
+
+class FakeStub(object):
+    """Stands in for a PluginStub, the resolver only reads id and directory."""
+    def __init__(self, namespace, version=None, implementation="default", directory=None):
+        self.id = PluginId(namespace, SemanticVersion.parse(version), implementation)
+        self.directory = directory
+
+    def __repr__(self):
+        return "<FakeStub: {}[{}]({})>".format(self.id.namespace, self.id.version, self.id.implementation)
+
+def make_resolver(*stubs):
+    resolver = PluginResolver()
+    for stub in stubs:
+        resolver.add_plugin_stub(stub)
+    return resolver
+
+def v(string):
+    return SemanticVersion.parse(string)
+
+class Madz_PluginResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.stubs = [FakeStub("a", "1.2.0"), FakeStub("a", "0.9.0"), FakeStub("a", "2.0.0"),
+            FakeStub("a", "1.0.0"), FakeStub("a", "2.0.0-rc.1")]
+        self.resolver = make_resolver(*self.stubs)
+
+    def versions(self, stubs):
+        return [str(stub.id.version) for stub in stubs]
+
+    def test_sorted_insertion(self):
+        """Candidates are kept in version order whatever order they are added in."""
+        self.assertEqual(self.versions(self.resolver.get_candidates("a")),
+            ["0.9.0", "1.0.0", "1.2.0", "2.0.0-rc.1", "2.0.0"])
+
+    def test_newest_by_default(self):
+        """Without an orderer the newest version is picked, the first added of several with that version."""
+        newer, older = FakeStub("b", "2.0.0"), FakeStub("b", "1.0.0")
+        r = make_resolver(newer, older)
+        self.assertIs(r.get_plugin("b"), newer)
+        self.assertIs(self.resolver.get_plugin("a"), self.stubs[2])
+        same = FakeStub("b", "2.0.0", "other")
+        r.add_plugin_stub(same)
+        self.assertIs(r.get_plugin("b"), newer)
+        r.add_filter(VersionOrderer())
+        self.assertIs(r.get_plugin("b"), older)
+
+    def test_range(self):
+        """Range bounds are inclusive or exclusive as asked, and may be left open."""
+        r = self.resolver
+        self.assertEqual(self.versions(r.get_plugins_in_range("a", v("1.0.0"), v("2.0.0"))),
+            ["1.0.0", "1.2.0", "2.0.0-rc.1"])
+        self.assertEqual(self.versions(r.get_plugins_in_range("a", v("1.0.0"), v("2.0.0"), include_lower=False, include_upper=True)),
+            ["1.2.0", "2.0.0-rc.1", "2.0.0"])
+        self.assertEqual(self.versions(r.get_plugins_in_range("a", upper=v("1.0.0"))), ["0.9.0"])
+        self.assertEqual(self.versions(r.get_plugins_in_range("a", lower=v("2.0.0"))), ["2.0.0"])
+        self.assertEqual(r.get_plugins_in_range("a", v("3.0.0")), [])
+
+    def test_versioned_query(self):
+        """A version in the query limits the candidates to that version."""
+        r = self.resolver
+        self.assertIs(r.get_plugin("a[1.2.0]"), self.stubs[0])
+        self.assertIs(r.get_plugin(PluginId("a", v("0.9.0"))), self.stubs[1])
+        self.assertRaises(PluginResolverException, r.get_plugin, "a[1.1.0]")
+
+    def test_filters(self):
+        """Filters narrow and order the candidates, and invalidate cached resolutions."""
+        r = self.resolver
+        r.add_filter(VersionOrderer(reverse=True))
+        self.assertIs(r.get_plugin("a"), self.stubs[2])
+        r.add_filter(VersionFilter(v("1.0.0"), op=VersionFilter.lteq))
+        self.assertIs(r.get_plugin("a"), self.stubs[3])
+        r.add_filter(ImplementationFilter("other"))
+        self.assertRaises(PluginResolverException, r.get_plugin, "a")
+
+    def test_cache_invalidation(self):
+        """Adding and removing plugins is seen by later queries."""
+        r = self.resolver
+        r.add_filter(VersionOrderer(reverse=True))
+        self.assertIs(r.get_plugin("a"), self.stubs[2])
+        newer = FakeStub("a", "3.0.0")
+        r.add_plugin_stub(newer)
+        self.assertIs(r.get_plugin("a"), newer)
+        self.assertEqual(len(r.get_candidates("a")), 6)
+        r.remove_plugin_stub(newer)
+        self.assertIs(r.get_plugin("a"), self.stubs[2])
+        for stub in self.stubs:
+            r.remove_plugin_stub(stub)
+        self.assertRaises(PluginResolverException, r.get_plugin, "a")
+        self.assertRaises(PluginResolverException, r.get_candidates, "a")
+
+    def test_same_version(self):
+        """Plugins of the same version keep the order they were added in."""
+        first, second = FakeStub("b", "1.0.0", "x"), FakeStub("b", "1.0.0", "y")
+        r = make_resolver(first, second)
+        self.assertEqual(r.get_candidates("b"), [first, second])
+        r.remove_plugin_stub(first)
+        self.assertEqual(r.get_candidates("b"), [second])
+
+    def test_alias(self):
+        """Aliases resolve to the aliased namespace, and can't replace a namespace."""
+        r = self.resolver
+        r.alias("b", "a")
+        self.assertEqual(r.get_candidates("b"), r.get_candidates("a"))
+        self.assertIs(r.get_plugin("b[1.0.0]"), self.stubs[3])
+        self.assertRaises(PluginResolverException, r.alias, "a", "b")
+        r.alias("c", "missing")
+        self.assertRaises(PluginResolverException, r.get_plugin, "c")
+
+    def test_get_plugins(self):
+        """Many queries resolve at once, keyed by query."""
+        r = self.resolver
+        result = r.get_plugins(["a[1.0.0]", "a[2.0.0]"])
+        self.assertEqual(result, {"a[1.0.0]": self.stubs[3], "a[2.0.0]": self.stubs[2]})
+        self.assertRaises(PluginResolverException, r.get_plugins, ["a", "missing"])
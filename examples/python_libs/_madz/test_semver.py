@@ -0,0 +1,41 @@
+import pickle
+import unittest
+
+from madz.core.semver import SemanticVersion
+
+class Madz_SemanticVersion(unittest.TestCase):
+
+    def test_parse(self):
+        version = SemanticVersion.parse("1.2.3-beta.2+build")
+        self.assertEqual((version.major, version.minor, version.patch), (1, 2, 3))
+        self.assertEqual(version.prerelease, "beta.2")
+        self.assertEqual(version.metadata, "build")
+        self.assertEqual(str(version), "1.2.3-beta.2+build")
+        self.assertIsNone(SemanticVersion.parse(None))
+        self.assertIs(SemanticVersion.parse(version), version)
+
+    def test_parse_errors(self):
+        for string in ["1.2", "1.2.3.4", "a.b.c", "1.2.3+a+b", "1.2.3-a-b", "1.2.3+a-b"]:
+            self.assertRaises(SemanticVersion.SemanticVersionParseError, SemanticVersion.parse, string)
+        self.assertRaises(TypeError, SemanticVersion.parse, 1)
+
+    def test_precedence(self):
+        """Orders as in the example of semver.org 2.0.0."""
+        ordered = ["1.0.0-alpha", "1.0.0-alpha.1", "1.0.0-alpha.beta", "1.0.0-beta", "1.0.0-beta.2",
+            "1.0.0-beta.11", "1.0.0-rc.1", "1.0.0", "1.0.1", "1.1.0", "2.0.0", "10.0.0"]
+        versions = [SemanticVersion.parse(string) for string in ordered]
+        self.assertEqual(sorted(reversed(versions)), versions)
+        for lower, higher in zip(versions, versions[1:]):
+            self.assertTrue(lower < higher and lower <= higher and higher > lower and higher >= lower and lower != higher)
+
+    def test_metadata_ignored(self):
+        self.assertEqual(SemanticVersion.parse("1.0.0+a"), SemanticVersion.parse("1.0.0+b"))
+        self.assertEqual(hash(SemanticVersion.parse("1.0.0+a")), hash(SemanticVersion(1, 0, 0)))
+        self.assertTrue(SemanticVersion.parse("1.0.0-rc").same_version_numbers(SemanticVersion(1, 0, 0)))
+
+    def test_interned_and_immutable(self):
+        version = SemanticVersion.parse("3.1.4")
+        self.assertIs(SemanticVersion.parse("3.1.4"), version)
+        self.assertRaises(AttributeError, setattr, version, "major", 4)
+        self.assertEqual(pickle.loads(pickle.dumps(version)), version)
+        self.assertFalse(SemanticVersion(1, 0, 0) == "1.0.0")
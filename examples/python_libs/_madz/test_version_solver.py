@@ -0,0 +1,90 @@
+import unittest
+
+from madz.core.plugin_id import PluginId
+from madz.core.semver import SemanticVersion
+from madz.core.plugin_resolver import PluginResolver
+from madz.core.version_solver import *
+
+class FakeStub(object):
+    """Stands in for a PluginStub, the solver only reads id and requires."""
+    def __init__(self, plugin_id, requires=()):
+        self.id = PluginId.parse(plugin_id)
+        if self.id.implementation is None:
+            self.id.implementation = "default"
+        self.requires = [PluginId.parse(required) for required in requires]
+
+    def __repr__(self):
+        return "<FakeStub: {}[{}]>".format(self.id.namespace, self.id.version)
+
+def make_solver(*stubs):
+    resolver = PluginResolver()
+    for stub in stubs:
+        resolver.add_plugin_stub(stub)
+    return PluginVersionSolver(resolver)
+
+def v(string):
+    return SemanticVersion.parse(string)
+
+class Madz_VersionSolver(unittest.TestCase):
+
+    def test_version_satisfies(self):
+        """Compatible versions share a major version (and minor for 0.x) and are no older."""
+        self.assertTrue(version_satisfies(None, None))
+        self.assertTrue(version_satisfies(None, v("1.0.0")))
+        self.assertFalse(version_satisfies(v("1.0.0"), None))
+        self.assertTrue(version_satisfies(v("1.2.0"), v("1.3.1")))
+        self.assertFalse(version_satisfies(v("1.2.0"), v("1.1.9")))
+        self.assertFalse(version_satisfies(v("1.2.0"), v("2.0.0")))
+        self.assertTrue(version_satisfies(v("0.2.0"), v("0.2.5")))
+        self.assertFalse(version_satisfies(v("0.2.0"), v("0.3.0")))
+        self.assertFalse(version_satisfies(v("1.0.0"), v("1.0.0-rc.1")))
+
+    def test_id_satisfied_by(self):
+        """Implementations must match when required."""
+        stub = FakeStub("a[1.0.0](fast)")
+        self.assertTrue(id_satisfied_by(PluginId.parse("a[1.0.0]"), stub))
+        self.assertTrue(id_satisfied_by(PluginId.parse("a[1.0.0](fast)"), stub))
+        self.assertFalse(id_satisfied_by(PluginId.parse("a[1.0.0](slow)"), stub))
+
+    def test_prefers_newest(self):
+        """The newest compatible versions are picked."""
+        a1, a2 = FakeStub("a[1.0.0]", ["b[1.0.0]"]), FakeStub("a[1.1.0]", ["b[1.0.0]"])
+        b1, b2, b3 = FakeStub("b[1.0.0]"), FakeStub("b[1.4.0]"), FakeStub("b[2.0.0]")
+        solver = make_solver(a1, a2, b1, b2, b3)
+        self.assertEqual(solver.solve(["a"]), {"a": a2, "b": b2})
+        self.assertEqual(solver.solve(["b[2.0.0]"]), {"b": b3})
+
+    def test_backtracks(self):
+        """An older version is picked when the newest one conflicts with another requirement."""
+        a1 = FakeStub("a[1.0.0]", ["c[1.0.0]"])
+        a2 = FakeStub("a[1.1.0]", ["c[2.0.0]"])
+        b1 = FakeStub("b[1.0.0]", ["c[1.0.0]"])
+        c1, c2 = FakeStub("c[1.0.0]"), FakeStub("c[2.0.0]")
+        solver = make_solver(a1, a2, b1, c1, c2)
+        self.assertEqual(solver.solve(["a", "b"]), {"a": a1, "b": b1, "c": c1})
+        self.assertTrue(solver.steps > 3)
+
+    def test_conflict(self):
+        """A VersionConflict names the namespace and the requirements on it."""
+        a1 = FakeStub("a[1.0.0]", ["c[1.0.0]"])
+        b1 = FakeStub("b[1.0.0]", ["c[2.0.0]"])
+        c1, c2 = FakeStub("c[1.0.0]"), FakeStub("c[2.0.0]")
+        solver = make_solver(a1, b1, c1, c2)
+        with self.assertRaises(VersionConflict) as context:
+            solver.solve(["a", "b"])
+        self.assertTrue(context.exception.namespace in ("a", "b", "c"))
+        self.assertTrue(isinstance(context.exception, PluginResolverException))
+
+    def test_missing(self):
+        """A plugin requiring a missing namespace can't be picked."""
+        solver = make_solver(FakeStub("a[1.0.0]", ["missing"]))
+        with self.assertRaises(VersionConflict) as context:
+            solver.solve(["a"])
+        self.assertEqual(context.exception.namespace, "a")
+        self.assertEqual([source for required_id, source in context.exception.requirements], [None])
+
+    def test_cycle(self):
+        """Plugins requiring each other are solved once each."""
+        a1 = FakeStub("a[1.0.0]", ["b[1.0.0]"])
+        b1 = FakeStub("b[1.0.0]", ["a[1.0.0]"])
+        self.assertEqual(make_solver(a1, b1).solve(["a"]), {"a": a1, "b": b1})
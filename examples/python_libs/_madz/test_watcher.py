@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+from madz.config import *
+from madz.core import watcher
+from madz.core.system import PluginSystem
+from madz.core.plugin_directory import PluginDirectory
+from madz.core.watcher import PollingWatcher, InotifyWatcher, PluginSystemWatcher
+
+from .test_plugin_directory import write_plugin, touch_later
+
+def make_event(wd, mask, name=""):
+    """Packs an inotify event, names are nul padded."""
+    name = name.encode() + b"\0" * (4 - len(name) % 4) if name else b""
+    return InotifyWatcher._event_header.pack(wd, mask, 0, len(name)) + name
+
+def wait_for(test, timeout=10):
+    """Waits until test returns true, returning false if it never does."""
+    end = time.time() + timeout
+    while time.time() < end:
+        if test():
+            return True
+        time.sleep(0.02)
+    return False
+
+class WatcherTree(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        os.makedirs(os.path.join(self.root, "p"))
+        os.makedirs(os.path.join(self.root, ".hidden"))
+        self.file = os.path.join(self.root, "p", "f.txt")
+        with open(self.file, "w") as f:
+            f.write("a")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.root, *names)
+
+
+class Madz_PollingWatcher(WatcherTree):
+
+    def test_changes(self):
+        w = PollingWatcher()
+        w.add_tree(self.root)
+        self.assertEqual(w.poll(0), set())
+
+        with open(self.file, "w") as f:
+            f.write("ab")
+        with open(self.path(".hidden", "g.txt"), "w") as f:
+            f.write("a")
+        self.assertIn(self.file, w.poll(0))
+        self.assertEqual(w.poll(0), set())
+
+        os.remove(self.file)
+        self.assertIn(self.file, w.poll(0))
+        os.makedirs(self.path("q"))
+        self.assertEqual(w.poll(0), {self.path("q"), self.root})
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify requires linux")
+class Madz_InotifyWatcher(WatcherTree):
+
+    def setUp(self):
+        super().setUp()
+        try:
+            self.watcher = InotifyWatcher()
+        except InotifyWatcher.NotAvailable as exc:
+            self.skipTest(str(exc))
+        self.watcher.add_tree(self.root)
+
+    def tearDown(self):
+        self.watcher.close()
+        super().tearDown()
+
+    def decode(self, *events):
+        with mock.patch.object(watcher.select, "select", lambda r, w, x, timeout: (r, [], [])), \
+                mock.patch.object(self.watcher, "_read_events", lambda: b"".join(events)):
+            return self.watcher.poll(0)
+
+    def test_decode(self):
+        """Events are decoded to the paths of the watched directories."""
+        wd = self.watcher._paths[self.path("p")]
+        self.assertEqual(self.decode(make_event(wd, InotifyWatcher.IN_MODIFY, "f.txt"),
+            make_event(wd, InotifyWatcher.IN_ATTRIB, "abcdefgh")), {self.file, self.path("p", "abcdefgh")})
+        self.assertEqual(self.decode(make_event(wd, InotifyWatcher.IN_DELETE_SELF)), {self.path("p")})
+        self.assertEqual(self.decode(make_event(wd + 100, InotifyWatcher.IN_MODIFY, "f.txt")), set())
+
+    def test_overflow_and_ignored(self):
+        """An overflow changes every tree, an ignored watch is forgotten."""
+        wd = self.watcher._paths[self.path("p")]
+        self.assertEqual(self.decode(make_event(-1, InotifyWatcher.IN_Q_OVERFLOW)), {self.root})
+        self.assertEqual(self.decode(make_event(wd, InotifyWatcher.IN_IGNORED)), set())
+        self.assertNotIn(self.path("p"), self.watcher._paths)
+
+    def test_events(self):
+        """Changes are reported, and new directories are watched, hidden ones are skipped."""
+        self.assertNotIn(self.path(".hidden"), self.watcher._paths)
+        with open(self.file, "w") as f:
+            f.write("ab")
+        self.assertIn(self.file, self.watcher.poll(1))
+
+        os.makedirs(self.path("q"))
+        self.assertIn(self.path("q"), self.watcher.poll(1))
+        with open(self.path("q", "g.txt"), "w") as f:
+            f.write("a")
+        with open(self.path(".hidden", "g.txt"), "w") as f:
+            f.write("a")
+        changes = self.watcher.poll(1)
+        self.assertIn(self.path("q", "g.txt"), changes)
+        self.assertNotIn(self.path(".hidden", "g.txt"), changes)
+
+
+class Madz_PluginSystemWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        write_plugin(self.root, "a")
+        write_plugin(self.root, "b", ["a"])
+        self.system = PluginSystem(SystemConfig())
+        self.system.add_directory(PluginDirectory(self.root))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def plugins(self):
+        return {plugin.id.namespace: plugin for plugin in self.system.all_plugins()}
+
+    def test_watch(self):
+        """The system is indexed on start, refreshed on changes, and left alone once stopped."""
+        system_watcher = PluginSystemWatcher(self.system, PollingWatcher(), interval=0.02, settle_time=0.01)
+        system_watcher.start()
+        try:
+            self.assertTrue(system_watcher.is_watching())
+            self.assertIs(self.system.watcher, system_watcher)
+            before = self.plugins()
+            self.assertEqual(sorted(before), ["a", "b"])
+
+            touch_later(write_plugin(self.root, "b", ["a"], "type u int8;\n") + "/__plugin__.py")
+            write_plugin(self.root, "c", ["b"])
+            self.assertTrue(wait_for(lambda: sorted(self.plugins()) == ["a", "b", "c"] and not (self.plugins()["b"] is before["b"])))
+            self.assertIs(self.plugins()["a"], before["a"])
+            self.assertEqual([node.name for node in self.plugins()["b"].description.ast], ["u"])
+        finally:
+            system_watcher.stop()
+
+        self.assertFalse(system_watcher.is_watching())
+        self.assertIsNone(self.system.watcher)
+        write_plugin(self.root, "d")
+        time.sleep(0.1)
+        self.assertNotIn("d", self.plugins())
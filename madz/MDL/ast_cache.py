@@ -0,0 +1,219 @@
+"""MDL/ast_cache.py
+@OffbyOneStudios 2014
+A content addressed cache of parsed MDL, shared by every plugin of the user.
+"""
+import os
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+import collections
+
+from ..version import version
+from .parser_impl import parser_version
+
+logger = logging.getLogger(__name__)
+
+def default_cache_directory():
+    """Returns the user's MDL cache directory.
+
+    It is '$MADZ_CACHE_DIR/mdl' if MADZ_CACHE_DIR is set, otherwise 'madz/mdl' in the user's cache directory
+    ('$XDG_CACHE_HOME' or '~/.cache', '%LOCALAPPDATA%' on windows).
+    """
+    base = os.environ.get("MADZ_CACHE_DIR", None)
+    if base is None:
+        if os.name == "nt" and "LOCALAPPDATA" in os.environ:
+            user_cache = os.environ["LOCALAPPDATA"]
+        else:
+            user_cache = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+        base = os.path.join(user_cache, "madz")
+    return os.path.join(base, "mdl")
+
+class MdlAstCache(object):
+    """Caches parsed MDL by the hash of its source.
+
+    Entries are keyed by the hash of the source, the madz version and the parser version, so identical MDL is only
+    parsed once, whatever plugin, checkout or branch it is in, and an entry is never checked against its source.
+    Each entry is a pickle file holding its key, the parsed roots, and the chunk keys of the
+    source's top level items (see parser_impl.chunk_spans), one for each root, or None. Entries are written
+    atomically, and once the cache is bigger than max_bytes the least recently used entries (by modification time,
+    which is updated when an entry is used) are removed.
+
+    The chunk keys of the entries used recently are kept in memory, so when a source changes, the roots of its
+    unchanged items can be found in the entry of the source before the change, see find_chunks.
+
+    Attributes:
+        directory: The directory the cache files are stored in.
+        max_bytes: The size the cache is kept under.
+        max_chunks: The most chunk keys kept in memory.
+    """
+    format_version = 3
+
+    # The default size the cache is kept under
+    default_max_bytes = 64 * 2**20
+
+    # The default number of chunk keys kept in memory
+    default_max_chunks = 2**14
+
+    def __init__(self, directory, max_bytes=None, max_chunks=None):
+        self.directory = directory
+        self.max_bytes = self.default_max_bytes if max_bytes is None else max_bytes
+        self.max_chunks = self.default_max_chunks if max_chunks is None else max_chunks
+        self._chunks = collections.OrderedDict()
+        self._chunks_lock = threading.Lock()
+
+    def key(self, source):
+        """Returns the cache key of an MDL source string."""
+        header = "{}\0{}\0{}\0".format(self.format_version, version, parser_version)
+        return hashlib.sha1((header + source).encode("utf-8")).hexdigest()
+
+    def __getstate__(self):
+        # The chunk keys kept in memory stay in this process
+        state = dict(self.__dict__)
+        del state["_chunks"], state["_chunks_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._chunks = collections.OrderedDict()
+        self._chunks_lock = threading.Lock()
+
+    @staticmethod
+    def chunk_key(chunk):
+        """Returns the chunk key of the source of a top level item."""
+        return hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+    def _entry_filename(self, key):
+        return os.path.join(self.directory, "ast-{}.pickle".format(key))
+
+    def contains(self, key):
+        """Returns true if there is a cache entry for key, it may still fail to load."""
+        return os.path.exists(self._entry_filename(key))
+
+    def get(self, key):
+        """Returns the (roots, chunk_keys) of the cache entry of key, or None if there is no valid entry."""
+        entry_filename = self._entry_filename(key)
+        try:
+            with open(entry_filename, "rb") as entry_file:
+                cached_key, roots, chunk_keys = pickle.loads(entry_file.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Failed to load cached MDL '{}'.".format(entry_filename))
+            return None
+        if cached_key != key:
+            return None
+
+        try:
+            os.utime(entry_filename)
+        except OSError:
+            pass
+        self.remember_chunks(key, chunk_keys)
+        return roots, chunk_keys
+
+    def put(self, key, roots, chunk_keys=None):
+        """Atomically writes the cache entry of key, then evicts entries if the cache is too big."""
+        data = pickle.dumps((key, roots, chunk_keys))
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            handle, temp_filename = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_filename, self._entry_filename(key))
+        except OSError:
+            logger.warning("Failed to write cached MDL '{}'.".format(self._entry_filename(key)))
+            return
+        self.remember_chunks(key, chunk_keys)
+        self.evict()
+
+    def remember_chunks(self, key, chunk_keys):
+        """Keeps the chunk keys of the entry of key in memory, so find_chunks finds them."""
+        if chunk_keys is None:
+            return
+        with self._chunks_lock:
+            for index, chunk_key in enumerate(chunk_keys):
+                self._chunks[chunk_key] = (key, index)
+                self._chunks.move_to_end(chunk_key)
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+
+    def find_chunks(self, chunk_keys):
+        """Returns the parsed roots of the top level items of chunk_keys found in recently used entries.
+
+        Returns:
+            A dictionary of chunk keys to their root, read from the cache entry they are in.
+        """
+        entries = {}
+        with self._chunks_lock:
+            for chunk_key in chunk_keys:
+                if chunk_key in self._chunks:
+                    key, index = self._chunks[chunk_key]
+                    entries.setdefault(key, []).append((chunk_key, index))
+
+        found = {}
+        for key, chunks in entries.items():
+            cached = self.get(key)
+            if cached is None:
+                continue
+            for chunk_key, index in chunks:
+                found[chunk_key] = cached[0][index]
+        return found
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is no bigger than max_bytes."""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.startswith("ast-") and entry.name.endswith(".pickle"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+        except OSError:
+            return
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def load(self, source, parse_func):
+        """Returns the parsed roots of an MDL source string, from the cache if it was parsed before.
+
+        Args:
+            source: The MDL source string.
+            parse_func: Parses the source, returning its (roots, chunk_keys), see put. Failed parses raise, and
+                are not cached.
+
+        Returns:
+            The parsed roots.
+        """
+        key = self.key(source)
+        cached = self.get(key)
+        if not (cached is None):
+            logger.debug("Loaded cached MDL {}.".format(key))
+            return cached[0]
+
+        logger.debug("Parsing MDL...")
+        roots, chunk_keys = parse_func(source)
+        self.put(key, roots, chunk_keys)
+        return roots
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def default_cache():
+    """Returns the MdlAstCache in the user's MDL cache directory, see default_cache_directory."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = MdlAstCache(default_cache_directory())
+        return _default_cache
@@ -4,6 +4,8 @@ Base types of MDL. All wrappers should be able to work with these types.
 """
 
 import logging
+import weakref
+import threading
 
 from .nodes import *
 
@@ -13,15 +15,18 @@ TypeType.Pointer = lambda s: TypePointer(s)
 
 class TypeTypeSimple(TypeType):
     """A bare bones type."""
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__)
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash(self.__class__)
 
     def copy(self):
         return self
 
+    def _intern_args(self, intern):
+        return ()
+
     def node_type(self):
         return self
 
@@ -57,12 +62,15 @@ class TypeTypeWidth(TypeTypeSimple):
         """
         return (self.width in self._valid_widths)
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and self.width == other.width
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self.width))
 
+    def _intern_args(self, intern):
+        return (self.width,)
+
     def validate(self, validation, context):
         #TODO(Any): Make context do something
         """Validates TypeWidth objects to ensure their within is within their given range.
@@ -129,18 +137,23 @@ class TypePointer(TypeTypeComplex):
         """
         self.type = type
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and self.type == other.type
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self.type))
 
     def __repr__(self):
         return "TypePointer({})".format("<...>" if isinstance(self.type, TypeTypeComplex) else repr(self.type))
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(type=None if self.type is None else self.type.copy()))
 
+    def _intern_args(self, intern):
+        return (intern(self.type),)
+
     def validate(self, validation, context):
         """Validates this node and its subnodes in the given context
         
@@ -178,10 +191,10 @@ class TypeArray(TypeTypeComplex):
         self.type = type
         self.length = length
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and self.type == other.type and self.length == other.length
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self.type, self.length))
 
     def __repr__(self):
@@ -190,8 +203,13 @@ class TypeArray(TypeTypeComplex):
             self.length)
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(length=self.length, type=None if self.type is None else self.type.copy()))
 
+    def _intern_args(self, intern):
+        return (intern(self.type), self.length)
+
     def validate(self, validation, context):
         """Validates this node and its subnodes in the given context
         
@@ -231,12 +249,12 @@ class TypeStructElement(TypeTypeComplex):
     def is_general_type(self):
         return False
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and \
             self.type == other.type and \
             self.name == other.name
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self.name, self.type))
 
     def __repr__(self):
@@ -245,8 +263,13 @@ class TypeStructElement(TypeTypeComplex):
             ("<...>" if isinstance(self.type, TypeTypeComplex) else repr(self.type)))
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(name=self.name, type=None if self.type is None else self.type.copy()))
 
+    def _intern_args(self, intern):
+        return (self.name, intern(self.type))
+
     def validate(self, validation, context):
         """Validates this node and its subnodes in the given context
         
@@ -289,10 +312,10 @@ class TypeStruct(TypeTypeComplex):
         self.elements = elements
         self._elements_hash = hash(tuple(elements))
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and self.elements == other.elements
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self._elements_hash))
 
     def __repr__(self):
@@ -302,8 +325,13 @@ class TypeStruct(TypeTypeComplex):
         return self.elements
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(elements=[v.copy() for v in self.elements]))
 
+    def _intern_args(self, intern):
+        return (tuple(intern(v) for v in self.elements),)
+
     def validate(self, validation, context):
         """Validates this node and its subnodes in the given context
         
@@ -348,12 +376,12 @@ class TypeFunctionArgument(TypeTypeComplex):
     def is_general_type(self):
         return False
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and \
             self.type == other.type and \
             self.name == other.name
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self.name, self.type))
 
     def __repr__(self):
@@ -362,8 +390,13 @@ class TypeFunctionArgument(TypeTypeComplex):
             ("<...>" if isinstance(self.type, TypeTypeComplex) else repr(self.type)))
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(name=self.name, type=None if self.type is None else self.type.copy()))
 
+    def _intern_args(self, intern):
+        return (self.name, intern(self.type))
+
     def validate(self, validation, context):
         """Validates this node and its subnodes in the given context
         
@@ -402,12 +435,12 @@ class TypeFunction(TypeTypeComplex):
         self._arg_lookup = dict((i[1].name, i[0]) for i in enumerate(args))
         self._ret_args_hash = hash((return_type, tuple(args)))
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and \
             self.return_type == other.return_type and \
             self.args == other.args
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self._ret_args_hash))
 
     def __repr__(self):
@@ -428,8 +461,13 @@ class TypeFunction(TypeTypeComplex):
         return self.args
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(return_type=None if self.return_type is None else self.return_type.copy(), args=[v.copy() for v in self.args]))
 
+    def _intern_args(self, intern):
+        return (intern(self.return_type), tuple(intern(v) for v in self.args))
+
     def validate(self, validation, context):
         """Validates this node and its subnodes in the given context
         
@@ -475,6 +513,9 @@ class NamedType(TypeTypeComplex):
     While builtin types are represented by their associated types above, declared types
     (Like TypeStructType) are associated with the string name of the declared type.
 
+    A NamedType keeps the type it resolved to, which depends on the description it is in (and on that description's
+    dependencies, even for a symbol with a namespace), so TypeInterner only shares NamedTypes within an interning
+    scope.
 
     Attributes:
         symbol: str name of declared type.
@@ -488,18 +529,23 @@ class NamedType(TypeTypeComplex):
         self.symbol = symbol
         self._res_type = None
 
-    def __eq__(self, other):
+    def _structural_eq(self, other):
         return (self.__class__ == other.__class__) and self.symbol == other.symbol
 
-    def __hash__(self):
+    def _structural_hash(self):
         return hash((self.__class__, self.symbol))
 
     def __repr__(self):
         return "{}({!r})".format(self.__class__.__name__, self.symbol)
 
     def copy(self):
+        if not (self._interned is None):
+            return self
         return self._map_over(self.__class__(symbol=self.symbol))
 
+    def _intern_args(self, intern):
+        return (self.symbol,)
+
     class SymbolResolutionError(Exception): pass
 
     def resolve(self, context):
@@ -510,7 +556,7 @@ class NamedType(TypeTypeComplex):
         """
         namespace, symbol = context.split_namespace(self.symbol)
         try:
-            root_node = context.get_root_node(namespace, lambda n: isinstance(n, TypeDeclaration) and n.name == symbol)
+            root_node = context.get_named_root(namespace, symbol, TypeDeclaration)
         except:
             raise SymbolResolutionError("Symbol not found: {}".format(self.symbol))
         self._res_type = root_node.type
@@ -535,6 +581,7 @@ class NamedType(TypeTypeComplex):
         except:
             validation.add_error("Exception when resolving NamedType")
             return
+        validation.add_resolutions([(context, self.symbol, self._res_type)])
 
         # Check that it derives from TypeType.
         if not isinstance(self._res_type, TypeType):
@@ -547,8 +594,50 @@ class NamedType(TypeTypeComplex):
             return
 
         # Validate the resolved type; only if validation hasn't already started.
+        type_context = context.get_context(context.split_namespace(self.symbol)[0])
         if not (self.symbol in validation.valid_cache["base_types.NamedType"]):
             with validation.error_boundry("Type {} is not valid.".format(self._res_type)):
                 validation.valid_cache["base_types.NamedType"].add(self.symbol)
-                self._res_type.validate(validation, context.get_context(context.split_namespace(self.symbol)[0]))
+                type_context.validate_type(validation, self._res_type)
+        else:
+            validation.skipped_type(type_context, self._res_type)
 
+
+class TypeInterner(object):
+    """Makes structurally identical types a single shared, immutable, instance with a cached hash.
+
+    Only the type a NamedType resolves to is set on its shared instance, which is why NamedTypes (and so the types
+    they are in) are only shared within a scope. Shared instances are only kept while they are used. Types with
+    attributes, and types whose class has no _intern_args (like the types of extensions), are not interned, nor are
+    the types within them.
+    """
+    def __init__(self):
+        self._shared = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._shared)
+
+    def intern(self, type, scope=None):
+        """Returns the shared instance of type's structure, type is left as is.
+
+        Args:
+            type: The type to intern.
+            scope: The scope NamedTypes are shared in, usually the description they are in, see NamedType.
+        """
+        def intern_type(type):
+            if not isinstance(type, TypeType) or not hasattr(type, "_intern_args") or hasattr(type, "attributes"):
+                return type
+            args = type._intern_args(intern_type)
+            key = (type.__class__, scope if isinstance(type, NamedType) else None) + args
+            with self._lock:
+                shared = self._shared.get(key, None)
+                if shared is None:
+                    shared = type.__class__(*args)
+                    shared._interned_hash = shared._structural_hash()
+                    shared._interned = self
+                    self._shared[key] = shared
+            return shared
+        return intern_type(type)
+
+type_interner = TypeInterner()
@@ -8,6 +8,8 @@ import os
 import logging
 import contextlib
 import pickle
+import weakref
+import concurrent.futures
 
 from . import nodes
 from . import base_types
@@ -28,6 +30,7 @@ class ValidationState(object):
         warnings: List of warnings from validations.
         valid: Boolean.
         indent: String representing the indentation level for output.
+        valid_cache: Dictionary for nodes to remember what they validated.
     """
     def __init__(self):
         self.pending = []
@@ -37,6 +40,74 @@ class ValidationState(object):
         self.indent = 0
         self._pend_indent = 0
         self.valid_cache = {}
+        self._type_frames = []
+        self._checked_resolutions = {}
+
+    class _TypeFrame(object):
+        """A type being validated, see MDLDescription.validate_type.
+
+        Attributes:
+            context: The MDLDescription the type is validated in.
+            type: The type.
+            resolutions: The set of (context, symbol, type) NamedType resolutions made validating the type.
+            complete: False if the validation of a type it refers to was skipped, and can't be vouched for.
+        """
+        def __init__(self, context, type):
+            self.context = context
+            self.type = type
+            self.resolutions = set()
+            self.complete = True
+
+    @contextlib.contextmanager
+    def validating_type(self, context, type):
+        """Records the NamedType resolutions made while validating type in context, they are added to the enclosing type.
+
+        Yields:
+            The type's _TypeFrame.
+        """
+        frame = ValidationState._TypeFrame(context, type)
+        self._type_frames.append(frame)
+        try:
+            yield frame
+        finally:
+            self._type_frames.pop()
+            if self._type_frames:
+                self._type_frames[-1].resolutions.update(frame.resolutions)
+
+    def add_resolutions(self, resolutions):
+        """Adds (context, symbol, type) NamedType resolutions to the type being validated."""
+        if self._type_frames:
+            self._type_frames[-1].resolutions.update(resolutions)
+
+    def skipped_type(self, context, type):
+        """Notes that validating type in context was skipped, as it was already started.
+
+        Types being validated within type, which refers to them, then can't be remembered as valid, nor can any if type
+        isn't remembered as valid.
+        """
+        for depth, frame in enumerate(self._type_frames):
+            if frame.context is context and frame.type is type:
+                for inner_frame in self._type_frames[depth + 1:]:
+                    inner_frame.complete = False
+                return
+        resolutions = context.get_validated_resolutions(type)
+        if resolutions is None:
+            for frame in self._type_frames:
+                frame.complete = False
+        else:
+            self.add_resolutions(resolutions)
+
+    def check_resolutions(self, resolutions):
+        """Returns true if each (context, symbol, type) NamedType resolution still resolves to the same type."""
+        for resolution in resolutions:
+            resolved = self._checked_resolutions.get(resolution, None)
+            if resolved is None:
+                context, symbol, type = resolution
+                resolved = context.resolve_type(symbol) is type
+                self._checked_resolutions[resolution] = resolved
+            if not resolved:
+                return False
+        return True
 
     def _calc_error_string(self, msg, indent):
         return "{}{}\n".format(' ' * indent, msg)
@@ -102,35 +173,133 @@ class ValidationState(object):
             if self._pend_indent < 0:
                 self._pend_indent = 0
 
+def _parse_source(source, cache=None):
+    """Parses an MDL source string, meant to be run in a worker process.
+
+    Args:
+        source: The MDL source string.
+        cache: The MdlAstCache the result is written to, or None.
+
+    Returns:
+        The pickled roots, so each description using the source can unpickle its own copy, and the source's chunk
+        keys (see MdlAstCache.put). None if the source failed to parse, it should then be loaded as usual to report
+        the error.
+    """
+    try:
+        roots, chunk_keys = MdlCachedLoader.parse_source(source)
+    except Exception:
+        logger.debug("Failed to preload MDL.", exc_info=True)
+        return None
+    if not (cache is None):
+        cache.put(cache.key(source), roots, chunk_keys)
+    return pickle.dumps(roots), chunk_keys
+
 class MDLDescription(object):
     """An object holding an MDLDescription.
             
     Attributes:
         ast: An AST Loader from loaders.py
         dependencies: Dictionary mapping PluginIds to MDLDescription objects.
+        materialized_count: Class wide count of the descriptions whose ast has been loaded.
     """
+    materialized_count = 0
+
+    # The interned types which validated without resolving any NamedType, they are valid in any description
+    _context_free_types = weakref.WeakSet()
 
     def ast():
         doc = "The ast property."
         def fget(self):
             if self._ast is None:
-                ast = self.ast_loader.load(self.dir)
+                MDLDescription.materialized_count += 1
+                if self._preloaded_ast is None:
+                    ast = self.ast_loader.load(self.dir)
+                else:
+                    ast, self._preloaded_ast = pickle.loads(self._preloaded_ast), None
                 # clean up ast order
-                self._ast = sorted(ast, key=self.keyfunc)
+                self._ast = sorted(self._intern_types(ast), key=self.keyfunc)
                 self.validate()
             return self._ast
         def fset(self, v):
-            self._ast = v
+            self._ast = self._intern_types(v)
+            self._indexes = None
         return locals()
     ast = property(**ast())
 
     def __init__(self, ast_loader, dependencies, dir=""):
         self._validate_state = None
         self._ast = None
+        self._preloaded_ast = None
+        self._indexes = None
+        self._intern_scope = object()
+        self._validated_types = {}
         self.dir = dir
         self.ast_loader = ast_loader
         self.dependencies = dependencies
 
+    def is_materialized(self):
+        """Returns true if the ast of this description has been loaded."""
+        return not (self._ast is None)
+
+    def is_validated(self):
+        """Returns true if this description has been validated."""
+        return not (self._validate_state is None)
+
+    @staticmethod
+    def preload_all(descriptions, workers=None):
+        """Parses the MDL of many descriptions ahead of time, in a pool of worker processes.
+
+        The MDL sources of descriptions which aren't materialized, and whose loaders would parse them (see
+        IMdlLoader.unparsed_source), are each parsed once. The results are written to the loaders' MdlAstCaches, and
+        kept by the descriptions until their ast is first used, which then validates it as usual.
+
+        Args:
+            descriptions: The MDLDescriptions to preload.
+            workers: The number of worker processes, None for one per core. 0 or 1 parses in this process.
+
+        Returns:
+            The number of descriptions preloaded.
+        """
+        pending = {}
+        for description in descriptions:
+            if description.is_materialized() or not (description._preloaded_ast is None):
+                continue
+            unparsed = description.ast_loader.unparsed_source(description.dir)
+            if unparsed is None:
+                continue
+            source, cache = unparsed
+            pending.setdefault(source, (cache, []))[1].append(description)
+        if not pending:
+            return 0
+
+        sources = list(pending)
+        caches = [pending[source][0] for source in sources]
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        results = None
+        if workers > 1 and len(sources) > 1:
+            logger.debug("Parsing {} MDL sources with {} workers".format(len(sources), workers))
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(sources))) as pool:
+                    results = list(pool.map(_parse_source, sources, caches, chunksize=max(1, len(sources) // (workers * 4))))
+            except Exception as exc:
+                logger.warning("Failed to parse MDL in workers, parsing serially: {}".format(exc))
+        if results is None:
+            results = [_parse_source(source, cache) for source, cache in zip(sources, caches)]
+
+        preloaded = 0
+        for source, cache, result in zip(sources, caches, results):
+            if result is None:
+                continue
+            pickled_roots, chunk_keys = result
+            if not (cache is None):
+                cache.remember_chunks(cache.key(source), chunk_keys)
+            for description in pending[source][1]:
+                description._preloaded_ast = pickled_roots
+                preloaded += 1
+        return preloaded
+
     def copy(self):
         if not (self.ast is None):
             ast_loader = MdlRawLoader(list(self.ast))
@@ -138,8 +307,20 @@ class MDLDescription(object):
             ast_loader = self.ast_loader
         mdlDes = MDLDescription(ast_loader, dict(self.dependencies))
         mdlDes._validate_state = self._validate_state
+        mdlDes._intern_scope = self._intern_scope
         return mdlDes
 
+    def _intern_types(self, ast):
+        """Replaces the types of the root nodes of ast with their shared instances, see base_types.TypeInterner.
+
+        Returns:
+            ast
+        """
+        for node in ast:
+            if isinstance(getattr(node, "type", None), nodes.TypeType):
+                node.type = base_types.type_interner.intern(node.type, self._intern_scope)
+        return ast
+
     @staticmethod
     def keyfunc(node):
         """Returns a key, node name pair depending on the type of node passed into the function.
@@ -178,13 +359,57 @@ class MDLDescription(object):
         namespace = ".".join(split_name[:-1])
         return (namespace, end_name)
 
+    class _Indexes(object):
+        """The lookup tables of an ast, built once.
+
+        Attributes:
+            declarations: The declaration roots, in ast order.
+            definitions: The definition roots, in ast order.
+            by_name: A dictionary of namespace keys to dictionaries of names to the first root with that name.
+            type_names: A dictionary of types to the name of the first declaration of that type.
+            type_declarations: A dictionary of types to the TypeDeclarations of that type.
+            definition_indexes: A dictionary of names to the index of the last definition with that name.
+        """
+        def __init__(self, ast):
+            self.declarations = []
+            self.definitions = []
+            self.by_name = {}
+            self.type_names = {}
+            self.type_declarations = {}
+            self.definition_indexes = {}
+
+            for node in ast:
+                self.by_name.setdefault(node.get_namespace_key(), {}).setdefault(node.name, node)
+                if isinstance(node, nodes.Declaration):
+                    self.declarations.append(node)
+                    self.type_names.setdefault(node.type, node.name)
+                    if isinstance(node, nodes.TypeDeclaration):
+                        self.type_declarations.setdefault(node.type, []).append(node)
+                if isinstance(node, nodes.Definition):
+                    self.definition_indexes[node.name] = len(self.definitions)
+                    self.definitions.append(node)
+
+    def _get_indexes(self):
+        """Returns the _Indexes of the ast, building them on first use after the ast is loaded or set."""
+        if self._indexes is None:
+            self._indexes = MDLDescription._Indexes(self.ast)
+        return self._indexes
+
     def declarations(self):
         """Filters the root AST for nodes declaring new types or other information that aren't variables."""
-        return list(filter(lambda n: isinstance(n, nodes.Declaration), self.ast))
+        return list(self._get_indexes().declarations)
 
     def definitions(self):
         """Filters the root AST for nodes defining new variables or other information that aren't declarations."""
-        return list(filter(lambda n: isinstance(n, nodes.Definition), self.ast))
+        return list(self._get_indexes().definitions)
+
+    def get_definition_index(self, name):
+        """Returns the index of the definition called name in definitions().
+
+        Raises:
+            KeyError if there is no such definition.
+        """
+        return self._get_indexes().definition_indexes[name]
 
     def get_context(self, namespace):
         """Returns the MDLDescription object of the provided namespace.
@@ -208,7 +433,7 @@ class MDLDescription(object):
         Returns:
             List of TypeDeclarations which match the type.
         """
-        return filter(lambda n: isinstance(n, nodes.TypeDeclaration) and n.type == the_type, self.ast)
+        return list(self._get_indexes().type_declarations.get(the_type, []))
 
     def get_name_for_node(self, the_type):
         """Searches Declarations for the name of given type.
@@ -219,10 +444,7 @@ class MDLDescription(object):
         Returns:
             String name of the_type, otherwise the empty string
         """
-        for node in self.declarations():
-            if node.type == the_type:
-                return node.name
-        return ""
+        return self._get_indexes().type_names.get(the_type, "")
 
     def get_root_node(self, namespace, test_func):
         """Getter for type declarations.
@@ -239,6 +461,32 @@ class MDLDescription(object):
             return self.dependencies[namespace].get_root_node("", test_func)
         raise NotFoundError()
 
+    def resolve_type(self, symbol):
+        """Returns the type of the TypeDeclaration symbol names, or None if there is none."""
+        namespace, name = self.split_namespace(symbol)
+        try:
+            return self.get_named_root(namespace, name, nodes.TypeDeclaration).type
+        except (NotFoundError, KeyError):
+            return None
+
+    def get_named_root(self, namespace, name, node_class):
+        """Returns the first root node of node_class called name.
+
+        Args:
+            namespace: The namespace of the node, the empty string for this description.
+            name: The name of the node, without its namespace.
+            node_class: The class of root node, its NamespaceKey is the namespace key looked in.
+
+        Raises:
+            NotFoundError if there is no such node.
+        """
+        if namespace != "":
+            return self.dependencies[namespace].get_named_root("", name, node_class)
+        node = self._get_indexes().by_name.get(node_class.NamespaceKey, {}).get(name, None)
+        if not isinstance(node, node_class):
+            raise NotFoundError()
+        return node
+
     _symbol_regex = re.compile("^[A-Za-z][A-Za-z_0-9]*$")
 
     @classmethod
@@ -283,6 +531,69 @@ class MDLDescription(object):
             with validation.error_boundry("Node {} failed validation:".format(node)):
                 node.validate(validation, self)
 
+    def get_validated_resolutions(self, type):
+        """Returns the NamedType resolutions type was validated with in this description, or None if it wasn't.
+
+        Returns:
+            A frozenset of (context, symbol, type) resolutions, see validate_type.
+        """
+        if type in MDLDescription._context_free_types:
+            return frozenset()
+        return self._validated_types.get(type, None)
+
+    def validate_type(self, validation, type):
+        """Validates a type in this description.
+
+        Interned types which validate without errors are remembered, with each NamedType resolution made validating
+        them, including those of the types they refer to. They aren't validated again, in this or any later
+        validation, while all those names still resolve to the same types. So types shared by many descriptions are
+        validated once, and after an ast changes only the types referring to changed names are validated again.
+
+        Args:
+            validation: ValidationState object
+            type: The type to validate.
+        """
+        if not (type._interned is None):
+            resolutions = self.get_validated_resolutions(type)
+            if not (resolutions is None) and validation.check_resolutions(resolutions):
+                validation.add_resolutions(resolutions)
+                if isinstance(type, base_types.NamedType):
+                    type.resolve(self)
+                return
+
+        error_count = len(validation.errors)
+        with validation.validating_type(self, type) as frame:
+            type.validate(validation, self)
+        if frame.complete and len(validation.errors) == error_count and not (type._interned is None):
+            if frame.resolutions:
+                self._validated_types[type] = frozenset(frame.resolutions)
+            else:
+                MDLDescription._context_free_types.add(type)
+
+    def revalidate(self):
+        """Validates the description again, after its ast, or those of its dependencies, changed.
+
+        Returns:
+            The validation state of the current object after checking for validation.
+        """
+        self._validate_state = None
+        return self.validate()
+
+    def reload(self):
+        """Loads the ast again from the ast loader, after the MDL changed, and validates it.
+
+        Through an MdlCachedLoader only the changed top level items of the MDL are parsed again. Descriptions
+        depending on this one should then be revalidated, see revalidate.
+
+        Returns:
+            The validation state of the current object after checking for validation.
+        """
+        self._ast = None
+        self._preloaded_ast = None
+        self._indexes = None
+        self._validate_state = None
+        return self.ast is not None and self.validate()
+
     def validate(self):
         """Checks for valid declarations.
         
@@ -6,7 +6,8 @@ from abc import *
 
 from ..fileman import *
 
-from .parser_impl import generate_parser, get_result
+from .parser_impl import generate_parser, get_result, chunk_spans
+from . import ast_cache
 
 MDLparser = generate_parser()
 
@@ -19,11 +20,31 @@ class IMdlLoader(metaclass=ABCMeta):
 
     def dependency_files(self, dir):
         return []
+
+    def source_files(self, dir):
+        """The files the MDL is read from."""
+        return []
+
+    def parse(self, dir):
+        """Loads the MDL without reading or writing any caches."""
+        return self.load(dir)
+
+    def unparsed_source(self, dir):
+        """Returns the MDL source string load would parse and the MdlAstCache the result goes in (or None), as a
+        (source, cache) pair. None if loading doesn't parse, so the MDL can't be parsed ahead of time.
+        """
+        return None
         
 class IMdlPickleable(IMdlLoader):
     @abstractmethod
     def source(self, dir):
         pass
+
+    def parse(self, dir):
+        return get_result(MDLparser.parse(self.source(dir)))
+
+    def unparsed_source(self, dir):
+        return (self.source(dir), None)
         
           
 class MdlRawLoader(IMdlLoader):
@@ -55,6 +76,9 @@ class MdlFileLoader(IMdlPickleable):
     def dependency_files(self, dir):
         return [dir.file(self.handle)]
 
+    def source_files(self, dir):
+        return [dir.file(self.handle)]
+
     def load(self, dir):
         with dir.file(self.handle).pyopen("r") as f:
             self.loader = MDLStringLoader(f.read())
@@ -66,61 +90,74 @@ class MdlFileLoader(IMdlPickleable):
     
     
 class MdlCachedLoader(IMdlLoader):
+    """Loads the MDL of another loader through an MdlAstCache, so identical MDL is parsed once.
 
-    def __init__(self, loader):
+    Attributes:
+        loader: The IMdlPickleable loader of the MDL source.
+        cache: The MdlAstCache, the user's shared cache if None.
+    """
+    def __init__(self, loader, cache=None):
         self.loader = loader
+        self.cache = cache
+
+    def _get_cache(self):
+        return ast_cache.default_cache() if self.cache is None else self.cache
 
     def load(self, dir):
-        return self._parse_cached(self.loader.source(dir), dir)
+        cache = self._get_cache()
+        return cache.load(self.loader.source(dir), lambda source: self.parse_source(source, cache))
+
+    def unparsed_source(self, dir):
+        source = self.loader.source(dir)
+        cache = self._get_cache()
+        if cache.contains(cache.key(source)):
+            return None
+        return (source, cache)
 
     def dependency_files(self, dir):
-        return [dir.madz().file("ast.pickle")]
-
-    def _parse_cached(self, ast, dir):
-        # Set state flag
-        needs_parsing = True
-        # Check for cache pickle file
-        try:
-            if dir.madz().file_exists("ast.pickle"):
-                # Open cache file
-                with dir.madz().file("ast.pickle").pyopen("rb") as pickle_file:
-                    # Unpickle original source
-                    ast_str = pickle.load(pickle_file)
-                    # Check that the current source and original source match
-                    if ast_str == ast:
-                        logger.debug("Loading MDL...")
-
-                        # Unpack cached AST
-                        ast = pickle.load(pickle_file)
-                        # Close the file
-                        pickle_file.close()
-                        needs_parsing = False
-        except:
-            logger.warning("Failed to load cached MDL file.")
-            needs_parsing = True
-
-        # Parse AST syntax
-        if needs_parsing:
-            logger.debug("Parsing MDL...")
-            # Make the directory for the cache file
-            
-            # Open the cache file
-            with dir.madz().file("ast.pickle").pyopen("w+b") as pickle_file:
-                # Save the original AST
-                ast_str = ast
-
-                #Parse
-                try:
-                    ast = get_result(MDLparser.parse(ast))
-                except Exception as e:
-                    # Write bad parse and rethrow
-                    pickle.dump("", pickle_file)
-                    pickle.dump([], pickle_file)
-                    pickle_file.close()
-                    raise e
-                # Write successful parse
-                pickle.dump(ast_str, pickle_file)
-                pickle.dump(ast, pickle_file)
-                
-        return ast
-        
\ No newline at end of file
+        return self.loader.dependency_files(dir)
+
+    def source_files(self, dir):
+        return self.loader.source_files(dir)
+
+    def parse(self, dir):
+        return self.loader.parse(dir)
+
+    @staticmethod
+    def parse_source(source, cache=None):
+        """Parses source, returning its roots and chunk keys for the cache, see MdlAstCache.put.
+
+        If cache has the roots of some of source's top level items (see MdlAstCache.find_chunks), as it does after
+        a source it loaded is edited, those are reused and only the other items are parsed, one at a time. If that
+        fails, all of source is parsed, to report the error.
+        """
+        tokens = MDLparser.tokenize(source)
+        spans, rest = chunk_spans(MDLparser.lexer, source, tokens)
+        chunks = [source[start:end] for start, end in spans]
+        chunk_keys = [ast_cache.MdlAstCache.chunk_key(chunk) for chunk in chunks]
+
+        found = {}
+        if not (cache is None) and rest is None:
+            found = cache.find_chunks(chunk_keys)
+        if found:
+            try:
+                roots = []
+                parsed_count = 0
+                for chunk, chunk_key in zip(chunks, chunk_keys):
+                    root = found.pop(chunk_key, None)
+                    if root is None:
+                        parsed = get_result(MDLparser.parse(chunk))
+                        if len(parsed) != 1:
+                            raise ValueError("MDL item parsed to {} roots.".format(len(parsed)))
+                        root = parsed[0]
+                        parsed_count += 1
+                    roots.append(root)
+                logger.debug("Parsed {} changed MDL items of {}.".format(parsed_count, len(chunks)))
+                return roots, chunk_keys
+            except Exception:
+                logger.debug("Failed to parse changed MDL items, parsing all of it.", exc_info=True)
+
+        roots = get_result(MDLparser.parse(source, tokens=tokens))
+        if len(roots) != len(chunk_keys):
+            chunk_keys = None
+        return roots, chunk_keys
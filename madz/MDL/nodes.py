@@ -87,6 +87,8 @@ class Node(BaseNode):
         Args:
             type: An object type.
         """
+        if not (getattr(self, "_interned", None) is None):
+            raise ValueError("Cannot set an attribute of the shared instance of a type.")
         if not hasattr(self, "attributes"):
             self.attributes = {}
         self.attributes[type] = value
@@ -163,8 +165,45 @@ class OntologyAttribute(Attribute):
 
 
 class TypeType(Node):
-    """Type base class."""
-    
+    """Type base class.
+
+    Types interned by a base_types.TypeInterner are shared, immutable, instances of their structure. Two types interned
+    by the same interner are equal only if they are the same instance, and an interned type's hash is cached. Types
+    which aren't interned are compared by their structure, with _structural_eq and _structural_hash.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        type = super().__new__(cls)
+        # The TypeInterner this type is the shared instance of, if any. Set before __init__, so the attributes of
+        # every type are laid out alike, keeping their dictionaries small.
+        type._interned = None
+        type._interned_hash = None
+        return type
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not (self._interned is None) and self._interned is getattr(other, "_interned", None):
+            return False
+        return self._structural_eq(other)
+
+    def __hash__(self):
+        if self._interned is None:
+            return self._structural_hash()
+        return self._interned_hash
+
+    def _structural_eq(self, other):
+        return NotImplemented
+
+    def _structural_hash(self):
+        return object.__hash__(self)
+
+    def __getstate__(self):
+        # Unpickled and copied types aren't interned
+        if self._interned is None:
+            return self.__dict__
+        return {k: v for k, v in self.__dict__.items() if not (k in ("_interned", "_interned_hash"))}
+
     def validate(self, validation, context):
         pass
 
@@ -190,7 +229,7 @@ class TypeType(Node):
 
         e = False
         with validation.error_boundry("Type {} is not valid:".format(type)):
-            type.validate(validation, context)
+            context.validate_type(validation, type)
             
         if not validation.valid: return
 
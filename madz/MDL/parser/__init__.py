@@ -1,4 +1,5 @@
 from .abstract_bases import *
+from .lexer import *
 from .parser import *
 from .parse_rules import *
 from .states import *
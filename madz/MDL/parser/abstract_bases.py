@@ -50,10 +50,17 @@ class IParseRule(object):
         pass
 
     @abstractmethod
-    def try_parse(self, pstr, state):
-        """Tries the parse, fails quickly, returning None, otherwise returns IParseResult."""
+    def try_parse(self, cursor, state):
+        """Tries the parse at a ParseCursor, fails quickly, returning None, otherwise returns IParseResult."""
         pass
 
+    def first_chars(self):
+        """The characters a match of this rule can start with, or None if it can start with any character or match nothing.
+
+        Used by the parser to only try the rules which can match the next character.
+        """
+        return None
+
 class IParseState(object):
     __metaclass__ = ABCMeta
 
@@ -73,8 +80,51 @@ class IParseState(object):
 
     @staticmethod
     def copy_state(state):
+        if isinstance(state, ParseStateMap):
+            return state.fork()
         return {k: v.copy() for k, v in state.items()}
 
+class ParseStateMap(object):
+    """The state objects of a parse by key, copied on write.
+
+    Forking a map shares its state objects with the new map. As state objects are modified in place once
+    retrieved, a shared object is copied the first time it is retrieved from either map afterwards, so
+    objects which are never retrieved are never copied.
+    """
+    __slots__ = ("_objects", "_owned")
+
+    def __init__(self, objects=None):
+        self._objects = dict(objects or {})
+        self._owned = set()
+
+    def fork(self):
+        """Returns a copy of this map, sharing the state objects until they are retrieved."""
+        new = ParseStateMap(self._objects)
+        self._owned = set()
+        return new
+
+    def __getitem__(self, key):
+        value = self._objects[key]
+        if not (key in self._owned):
+            value = value.copy()
+            self._objects[key] = value
+            self._owned.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._objects[key] = value
+        self._owned.add(key)
+
+    def __contains__(self, key):
+        return key in self._objects
+
+    def touched(self):
+        """Returns true if any state object was retrieved from or set in this map since it was made."""
+        return len(self._owned) > 0
+
+    def keys(self):
+        return self._objects.keys()
+
 ###
 ### Bases
 ###
@@ -119,9 +169,13 @@ class ParseStateValue(ParseStateClassKeyMetaMod()):
     value = property(**value())
 
 class ParseStateStack(ParseStateClassKeyMetaMod()):
+    """A persistent stack, copies share their entries so copying takes constant time.
+
+    Entries are (value, entry below, depth) tuples.
+    """
     def __init__(self):
         super().__init__()
-        self._stack = []
+        self._top = None
 
     @classmethod
     def _valid_value(cls, value):
@@ -129,25 +183,42 @@ class ParseStateStack(ParseStateClassKeyMetaMod()):
 
     def _copy(self, new):
         super()._copy(new)
-        new._stack = list(self._stack)
+        new._top = self._top
 
     def push(self, value):
         if not self._valid_value(value):
             raise Exception("ParseStateStack: Bad stack value.")
-        self._stack.append(value)
+        self._top = (value, self._top, len(self) + 1)
 
     def pop(self):
-        return self._stack.pop()
+        if self._top is None:
+            raise IndexError("pop from empty stack")
+        value, self._top, depth = self._top
+        return value
+
+    def __len__(self):
+        return 0 if self._top is None else self._top[2]
+
+    @property
+    def _stack(self):
+        """The values of the stack as a list, bottom first."""
+        values = []
+        entry = self._top
+        while not (entry is None):
+            values.append(entry[0])
+            entry = entry[1]
+        values.reverse()
+        return values
 
     @property
     def top(self):
-        if len(self._stack) == 0:
+        if self._top is None:
             return None
-        return self._stack[-1]
+        return self._top[0]
 
     @property
     def bottom(self):
-        if len(self._stack) == 0:
+        if self._top is None:
             return None
         return self._stack[0]
 
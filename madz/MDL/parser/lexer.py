@@ -0,0 +1,80 @@
+import re
+import bisect
+from array import array
+
+###
+### Lexer
+###
+
+def char_class(chars):
+    """Returns a regular expression character class matching any of chars."""
+    return "[{}]".format("".join(re.escape(c) for c in chars))
+
+class TokenStream(object):
+    """The tokens of a source string, as compact arrays.
+
+    Tokens cover the whole source, each token ends where the next one starts.
+
+    Attributes:
+        kinds: The kind of each token, an index into the lexer's token kinds.
+        starts: The source offset of each token.
+        length: The length of the source.
+    """
+    def __init__(self, kinds, starts, length):
+        self.kinds = kinds
+        self.starts = starts
+        self.length = length
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def index_at(self, position):
+        """Returns the index of the token starting at position, or None if no token starts there."""
+        index = bisect.bisect_left(self.starts, position)
+        if index < len(self.starts) and self.starts[index] == position:
+            return index
+        return None
+
+    def end(self, index):
+        """Returns the source offset the token at index ends at."""
+        return self.starts[index + 1] if index + 1 < len(self.starts) else self.length
+
+class Lexer(object):
+    """Splits source strings into a TokenStream with a single compiled regular expression.
+
+    Token kinds are tried in order at each position, characters no kind matches become single character tokens
+    of the last kind, Lexer.OTHER.
+
+    Attributes:
+        names: The name of each token kind, by kind index.
+        rules: The parse rule matching exactly the tokens of each kind, or None, by kind index.
+    """
+    OTHER = "other"
+
+    def __init__(self, token_kinds):
+        """
+        Args:
+            token_kinds: A list of (name, pattern, rule) tuples. Patterns must not match the empty string, or contain
+                capturing groups. rule is the parse rule which, when it is tried at the start of a token of this kind,
+                matches exactly that token. It may be None.
+        """
+        token_kinds = list(token_kinds) + [(Lexer.OTHER, r".", None)]
+        if len(token_kinds) > 255:
+            raise Exception("Too many token kinds.")
+
+        self.names = [name for name, pattern, rule in token_kinds]
+        self.rules = [rule for name, pattern, rule in token_kinds]
+        self._regex = re.compile("|".join("({})".format(pattern) for name, pattern, rule in token_kinds), re.DOTALL)
+
+    def kind(self, name):
+        """Returns the kind index of the token kind called name."""
+        return self.names.index(name)
+
+    def tokenize(self, source):
+        """Returns the TokenStream of source."""
+        kinds = array('B')
+        starts = array('L')
+        for match in self._regex.finditer(source):
+            kinds.append(match.lastindex - 1)
+            starts.append(match.start())
+        return TokenStream(kinds, starts, len(source))
@@ -58,9 +58,11 @@ class ParseRuleBase(IParseRule):
     def _do_parse(self, pstro, state, gen_args):
         self.p_chars(pstro, state, self._chars)
 
-    def try_parse(self, pstr, state):
+    def try_parse(self, cursor, state):
         try:
-            pstro = ParseString(pstr)
+            if isinstance(cursor, str):
+                cursor = ParseCursor(cursor)
+            pstro = ParseString(cursor.source, cursor.position)
             state = state
 
             gen_args = dict()
@@ -85,6 +87,9 @@ class ParseRuleChar(ParseRuleBase):
         super().__init__(**kwargs)
         self._char = kwargs["char"]
 
+    def first_chars(self):
+        return self._char
+
     def _do_parse(self, pstro, state, gen_args):
         if (pstro.cur != self._char):
             raise Exception("Invalid char.")
@@ -96,6 +101,9 @@ class ParseRuleMatch(ParseRuleBase):
         super().__init__(**kwargs)
         self._match = kwargs["match"]
 
+    def first_chars(self):
+        return self._match[:1] or None
+
     def _do_parse(self, pstro, state, gen_args):
         if not pstro.match(self._match):
             return "Invalid match."
@@ -106,6 +114,9 @@ class ParseRuleWhitespace(ParseRuleBase):
         super().__init__(**kwargs)
         self._whitespace = whitespace
 
+    def first_chars(self):
+        return self._whitespace
+
     def _do_parse(self, pstro, state, gen_args):
         self.p_chars(pstro, state, self._whitespace)
         if len(pstro.parsed()) == 0:
@@ -178,7 +189,7 @@ class ParseRuleLevelBase(ParseRuleBase):
 
         def _copy(self, new):
             super()._copy(new)
-            self.parent._copy_level(new, old)
+            self._parent._copy_level(new, self)
 
     def _new_levelstate(self, **kwargs):
         return ParseRuleLevelBase.LevelState(**kwargs)
@@ -1,57 +1,148 @@
+import re
+
 from .abstract_bases import *
+from .lexer import *
 from numbers import Number
 
 ###
 ### Helpers
 ###
 
+class ParseCursor(object):
+    """An immutable position in the source being parsed.
+
+    Attributes:
+        source: The whole source string, shared by every cursor of a parse.
+        position: The offset in source.
+        line: The line of position, from 1.
+        column: The column of position, from 1.
+    """
+    __slots__ = ("source", "position", "line", "column")
+
+    def __init__(self, source, position=0, line=1, column=1):
+        self.source = source
+        self.position = position
+        self.line = line
+        self.column = column
+
+    @property
+    def cur(self):
+        """The character at the cursor, None at the end of the source."""
+        if self.position >= len(self.source):
+            return None
+        return self.source[self.position]
+
+    def at_end(self):
+        return self.position >= len(self.source)
+
+    def peek(self, length):
+        """Returns up to length characters of source from the cursor."""
+        return self.source[self.position:self.position + length]
+
+    def advance(self, length):
+        """Returns the cursor length characters further, tracking lines and columns."""
+        end = self.position + length
+        newlines = self.source.count("\n", self.position, end)
+        if newlines:
+            column = end - self.source.rfind("\n", self.position, end)
+        else:
+            column = self.column + length
+        return ParseCursor(self.source, end, self.line + newlines, column)
+
+    def __str__(self):
+        return "line {}, column {}".format(self.line, self.column)
+
+
+class ParseError(Exception):
+    """A failed parse, at a ParseCursor.
+
+    Attributes:
+        position: The source offset the parse failed at.
+        line: The line the parse failed at, from 1.
+        column: The column the parse failed at, from 1.
+    """
+    def __init__(self, message, cursor):
+        super().__init__("At {!s}: {}".format(cursor, message))
+        self.position = cursor.position
+        self.line = cursor.line
+        self.column = cursor.column
+
+
+class ParseLimitError(ParseError):
+    """A parse which gave up, after taking too many steps on a top level item, see Parser.step_limit_factor.
+
+    Attributes:
+        steps: The number of steps taken on the item.
+        error: The furthest ParseError found in the item before giving up, or None.
+    """
+    def __init__(self, steps, cursor, error=None):
+        message = "Gave up on the item starting here after the backtrack limit of {} parse steps.".format(steps - 1)
+        if not (error is None):
+            message += " The furthest error was:\n{!s}".format(error)
+        super().__init__(message, cursor)
+        self.steps = steps
+        self.error = error
+
+
 class ParseString():
-    def __init__(self, v):
+    """Reads a source string from a start offset, without copying it.
+
+    Attributes:
+        v: The whole source string.
+    """
+    def __init__(self, v, start=0):
         self.v = v
-        self._i = 0
+        self._start = start
+        self._i = start
         self._l = len(v)
 
     @property
     def cur(self):
-        if self._i is None:
+        if self._i >= self._l:
             return None
         return self.v[self._i]
 
     @property
     def lka(self):
-        if self._i is None:
+        if self._i >= self._l:
             return None
         return self.v[self._i + 1]
 
     def p(self):
-        self._i += 1
-        if self._i >= self._l:
-            self._i = None
+        if self._i < self._l:
+            self._i += 1
         return self.cur
 
     def parsed(self):
-        if self._i is None:
-            return self.v
-        return self.v[:self._i]
+        """Returns the string parsed since the start offset."""
+        return self.v[self._start:self._i]
 
     def test_in(self, tstr):
         cur = self.cur
         if cur is None: return None
         return cur in tstr
 
+    # Compiled regular expressions matching runs of characters, by the string of characters
+    _run_regexes = {}
+
     def match_all(self, tstr):
-        while (self.test_in(tstr)): self.p();
+        regex = ParseString._run_regexes.get(tstr, None)
+        if regex is None:
+            regex = re.compile(char_class(tstr) + "*")
+            ParseString._run_regexes[tstr] = regex
+        if self._i < self._l:
+            self._i = regex.match(self.v, self._i).end()
         return True;
 
     def match(self, matchstr, case_insensitive=False):
         lm = len(matchstr)
-        matching = self.v[self._i:self._i + lm]
 
         if (case_insensitive):
-            matching = matching.lower()
-            matchstr = matchstr.lower()
+            matches = self.v[self._i:self._i + lm].lower() == matchstr.lower()
+        else:
+            matches = self.v.startswith(matchstr, self._i)
 
-        if (matching != matchstr):
+        if not matches:
             return False
         else:
             self._i += lm
@@ -61,6 +152,35 @@ class ParseString():
 ### Parser
 ###
 
+class ParseRuleIndex(object):
+    """Indexes a list of parse rules by the characters they can start matching with, see IParseRule.first_chars.
+
+    Rules without first characters are candidates for every character. Candidates keep the order of the
+    rule list, as it decides between matches of the same length.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+        first_chars = [rule.first_chars() for rule in self.rules]
+        chars = set()
+        for rule_chars in first_chars:
+            if not (rule_chars is None):
+                chars.update(rule_chars)
+
+        self._first_chars = first_chars
+        self._default = [rule for rule, rule_chars in zip(self.rules, first_chars) if rule_chars is None]
+        self._by_char = {char: [rule for rule, rule_chars in zip(self.rules, first_chars) if rule_chars is None or char in rule_chars]
+            for char in chars}
+
+    def candidates(self, char):
+        """Returns the rules which can match a string starting with char."""
+        return self._by_char.get(char, self._default)
+
+    def skipped(self, char):
+        """Returns the (rule, first characters) of the rules which can't match a string starting with char."""
+        return [(rule, rule_chars) for rule, rule_chars in zip(self.rules, self._first_chars)
+            if not (rule_chars is None) and (char is None or not (char in rule_chars))]
+
 class Parser():
     class ParseStateRules(ParseStateValue):
         @classmethod
@@ -125,12 +245,19 @@ class Parser():
                 return True
             return False
 
+        def copy_levels(self):
+            """Replaces the levels of this stack with copies, as levels are changed in place while parsing."""
+            levels = [level.copy() for level in self._stack]
+            self._top = None
+            for level in levels:
+                self.push(level)
+
         def pop(self):
             popped = super().pop()
             popped.do_end()
             return popped
 
-    def __init__(self, parse_rules, state_objects):
+    def __init__(self, parse_rules, state_objects, lexer=None):
         parse_rules = self._valid_parse_rules(parse_rules)
         state_objects = self._valid_state_objects(state_objects)
 
@@ -139,6 +266,13 @@ class Parser():
 
         self._parse_rules = parse_rules
         self._state_objects = state_objects
+        self._rule_indices = {}
+        self._lexer = lexer
+
+    @property
+    def lexer(self):
+        """The Lexer the parser tokenizes with, or None."""
+        return self._lexer
 
     @staticmethod
     def _valid_parse_rules(parse_rules):
@@ -159,20 +293,51 @@ class Parser():
                 return False
         return state_objects
 
+    # The most rule lists to keep indexed, rule lists are usually built from a small set of grammar rules.
+    rule_index_cache_size = 1024
+
+    def _get_rule_index(self, rules):
+        """Returns the ParseRuleIndex of a list of rules, indexing each distinct list once."""
+        key = tuple(rules)
+        index = self._rule_indices.get(key, None)
+        if index is None:
+            if len(self._rule_indices) >= self.rule_index_cache_size:
+                self._rule_indices = {}
+            index = ParseRuleIndex(key)
+            self._rule_indices[key] = index
+        return index
+
     def _setup_parse(self):
-        new_state = dict(self._state_objects)
-        
+        new_state = ParseStateMap(self._state_objects)
+
         return new_state
 
-    def _do_rules(self, pstr, state):
+    def _do_rules(self, cursor, state, failures):
+        """Tries the current rules at cursor.
+
+        Args:
+            cursor: The ParseCursor to parse at.
+            state: The parse state, each rule is tried on a copy of it.
+            failures: A dictionary of (rule, position) to the failed results of rules which failed without
+                looking at their state. As they only depend on the source they are not tried again.
+
+        Returns:
+            The valid results, longest first.
+        """
         #=== Parse
         #= Clean up parse state
         accepted = []
         errored = []
 
-        #= Find best (longest) matching rule
-        for rule in state[Parser.ParseStateRules.key()].value:
-            result = rule.try_parse(pstr, IParseState.copy_state(state))
+        #= Find best (longest) matching rule, of the rules which can match the next character
+        rule_index = self._get_rule_index(state[Parser.ParseStateRules.key()].value)
+        for rule in rule_index.candidates(cursor.cur):
+            result = failures.get((rule, cursor.position), None)
+            if result is None:
+                rule_state = IParseState.copy_state(state)
+                result = rule.try_parse(cursor, rule_state)
+                if not (result is None or result.valid) and isinstance(rule_state, ParseStateMap) and not rule_state.touched():
+                    failures[(rule, cursor.position)] = result
             if result != None:
                 if result.valid:
                     accepted.append(result)
@@ -180,19 +345,76 @@ class Parser():
                     errored.append(result)
 
         if len(accepted) == 0:
-            raise Exception("No matching valid parse possible:\n{!r}\n Errors:\n{!s}\n {!s}".format(
-                pstr[:80],
+            # The rules which couldn't match the next character weren't tried, they fail for expecting another
+            raise ParseError("No matching valid parse possible:\n{!r}\n Errors:\n{!s}{!s}\n {!s}".format(
+                cursor.peek(80),
                 "".join(map(lambda r: "  {!s}: {!s}\n".format(r.rule, r), errored)),
-                state[Parser.ParseStateDebugStack.key()]))
+                "".join(map(lambda s: "  {!s}: Expected one of {!r}\n".format(s[0], "".join(sorted(set(s[1])))),
+                    rule_index.skipped(cursor.cur))),
+                state[Parser.ParseStateDebugStack.key()]), cursor)
 
         return sorted(accepted, key=lambda a: len(a.parsed_string), reverse=True)
 
-    def parse(self, pstr):
+    def tokenize(self, pstr):
+        """Returns the TokenStream of a string, or None if the parser has no lexer."""
+        if self._lexer is None:
+            return None
+        return self._lexer.tokenize(str(pstr))
+
+    def _token_rule(self, tokens, cursor, state):
+        """Returns the parse rule of the token at cursor and the token's length.
+
+        The rule is None if no token starts at cursor, or if its rule is not one of the current rules. Otherwise
+        the rule matches exactly the token and no other rule matches more, so it would be the accepted rule.
+        """
+        index = tokens.index_at(cursor.position)
+        if index is None:
+            return None, None
+        rule = self._lexer.rules[tokens.kinds[index]]
+        if rule is None or not (rule in state[Parser.ParseStateRules.key()].value):
+            return None, None
+        return rule, tokens.end(index) - cursor.position
+
+    # Each top level item is parsed in at most this many steps per character of it parsed so far, bounding the time
+    # spent backtracking.
+    step_limit_factor = 4
+
+    @staticmethod
+    def _backtrack(choices, error):
+        """Returns the cursor and result of the latest untried alternative, or raises error if there are none."""
+        while choices:
+            cursor, alternatives = choices[-1]
+            if alternatives:
+                alternative = alternatives.pop(0)
+                if not alternatives:
+                    choices.pop()
+                return cursor, alternative
+            choices.pop()
+        raise error
+
+    def parse(self, pstr, tokens=None):
+        """Parses a string.
+
+        When more than one rule matches, the longest match is accepted and the others are kept as alternatives.
+        If the parse later fails, it backtracks to the latest alternative. Rules which failed at a position are
+        remembered, so they are not tried again there after backtracking (see Parser._do_rules). Once a top level
+        item is finished (its levels are all ended) the parse doesn't backtrack into it.
+
+        Args:
+            pstr: The string to parse.
+            tokens: The TokenStream of pstr, see Parser.tokenize. Made by the parser's lexer if not given.
+
+        Raises:
+            ParseError at the furthest failure, when no alternative parses.
+            ParseLimitError if a top level item takes too many steps, see step_limit_factor.
+        """
         state = self._setup_parse()
         parse_rules = list(self._parse_rules)
 
-        pstr = str(pstr)
-        
+        cursor = ParseCursor(str(pstr))
+        if tokens is None:
+            tokens = self.tokenize(cursor.source)
+
         state[Parser.ParseStateLevelStack.key()] = Parser.ParseStateLevelStack()
 
         state[Parser.ParseStateRules.key()] = Parser.ParseStateRules()
@@ -200,39 +422,86 @@ class Parser():
 
         state[Parser.ParseStateDebugStack.key()] = Parser.ParseStateDebugStack()
 
-        # Parse loop
-        while (pstr != ""):
-            #= Inform level
-            top_level = state[Parser.ParseStateLevelStack.key()].top
-            if not (top_level is None):
-                top_level.parsing(state)
+        # Backtracking state, choices are [cursor, alternative results] with the latest last
+        choices = []
+        failures = {}
+        furthest_error = None
+        resume = None
 
-            try:
-                accepted = self._do_rules(pstr, state)[0]
-            except Exception as e:
-                print("Might need to backtrack!")
-                raise e #todo, partial parse! backtrack!
+        # The step budget of the current top level item, which grows with the furthest position parsed in it
+        item_start = cursor
+        item_furthest = cursor.position
+        item_done = False
+        steps = 0
 
-            #=== Build next parse state
-            state = IParseState.copy_state(accepted.state)
-            state[Parser.ParseStateDebugStack.key()].push((accepted, len(state[Parser.ParseStateLevelStack.key()]._stack)))
+        # Parse loop
+        while not (resume is None) or not cursor.at_end():
+            steps += 1
+            if steps > self.step_limit_factor * (item_furthest - item_start.position + 1):
+                # Give up backtracking, or parsing without progress
+                raise ParseLimitError(steps, item_start, furthest_error)
+
+            if not (resume is None):
+                accepted, resume = resume, None
+            else:
+                #= Inform level
+                top_level = state[Parser.ParseStateLevelStack.key()].top
+                if not (top_level is None):
+                    top_level.parsing(state)
+
+                #= Tokens with their own rule, like whitespace and comments, are accepted without trying other rules
+                token_rule, length = (None, None) if tokens is None else self._token_rule(tokens, cursor, state)
+                if not (token_rule is None):
+                    accepted = ParseResult(cursor.peek(length), _state=state, _rule=token_rule)
+                else:
+                    try:
+                        results = self._do_rules(cursor, state, failures)
+                    except ParseError as e:
+                        if furthest_error is None or e.position >= furthest_error.position:
+                            furthest_error = e
+                        cursor, resume = self._backtrack(choices, furthest_error)
+                        continue
+
+                    accepted = results[0]
+                    if len(results) > 1:
+                        # Alternatives get their own levels, the accepted result's levels are changed in place
+                        for alternative in results[1:]:
+                            alternative.state[Parser.ParseStateLevelStack.key()].copy_levels()
+                        choices.append([cursor, results[1:]])
+
+            #=== Build next parse state, each rule was tried on its own copy of the state
+            state = accepted.state
+            # The debug stack only keeps what it reports, so earlier parse states can be freed.
+            state[Parser.ParseStateDebugStack.key()].push(
+                (ParseResult(accepted.parsed_string, _rule=accepted.rule), len(state[Parser.ParseStateLevelStack.key()])))
 
             #= Inform level
+            level_depth = len(state[Parser.ParseStateLevelStack.key()])
             top_level = state[Parser.ParseStateLevelStack.key()].top
             if not (top_level is None):
                 top_level.parsed(state, accepted)
 
+            #= A finished top level item is not parsed again, so what was kept for backtracking into it can go
+            if level_depth > 0 and len(state[Parser.ParseStateLevelStack.key()]) == 0:
+                choices = []
+                failures = {}
+                item_done = True
+
             #= Change level (new parse rules, node assembly, etc.)
             new_level = accepted.new_level
             if not (new_level is None):
                 new_level.start(state)
                 state[Parser.ParseStateLevelStack.key()].push(new_level)
 
-            #= String update
+            #= Cursor update
             astr = accepted.parsed_string
-            if not pstr.startswith(astr):
-                raise Exception("Invalid parse string: {}".format(astr))
-            pstr = pstr[len(astr):]
+            if not cursor.source.startswith(astr, cursor.position):
+                raise ParseError("Invalid parse string: {}".format(astr), cursor)
+            cursor = cursor.advance(len(astr))
+            if item_done:
+                item_start, item_furthest, item_done, steps = cursor, cursor.position, False, 0
+            else:
+                item_furthest = max(item_furthest, cursor.position)
 
         return state
 
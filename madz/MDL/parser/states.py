@@ -17,9 +17,15 @@ class ParseStateSpecialRules(ParseStateClassKeyMetaMod(ParseStateConstantBase)):
         ]
 
 class ParseStateParseTree(ParseStateClassKeyMetaMod()):
+    """The parse tree being built.
+
+    Finished roots are not modified, so copies share them in a persistent list of (root, previous entry) tuples.
+    Copies share the current root too, until it is retrieved, then it is copied.
+    """
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.roots = []
+        self._roots = None
+        self._root_shared = False
         self.current_root = None
         self._current_func = (lambda r: r)
 
@@ -36,16 +42,37 @@ class ParseStateParseTree(ParseStateClassKeyMetaMod()):
             root = self.current_root
             self.current_root = None
             self._current_func = (lambda r: r)
-        self.roots.append(root)
+        self._roots = (root, self._roots)
+
+    def roots():
+        doc = "The finished roots, in parse order."
+        def fget(self):
+            roots = []
+            entry = self._roots
+            while not (entry is None):
+                roots.append(entry[0])
+                entry = entry[1]
+            roots.reverse()
+            return roots
+        def fset(self, value):
+            self._roots = None
+            for root in value:
+                self._roots = (root, self._roots)
+        return locals()
+    roots = property(**roots())
 
     def current_root():
         doc = "The current root being generated."
         def fget(self):
+            if self._root_shared:
+                self._current_root = self._current_root.copy()
+                self._root_shared = False
             return self._current_root
         def fset(self, value):
             if not self._valid_root(value):
                 raise ValueError("Root not valid.")
             self._current_root = value
+            self._root_shared = False
         def fdel(self):
             del self._current_root
             del self._current_func
@@ -73,6 +100,8 @@ class ParseStateParseTree(ParseStateClassKeyMetaMod()):
 
     def _copy(self, new):
         super()._copy(new)
-        new.roots = list(map(lambda r: r.copy(), self.roots))
-        new.current_root = None if self.current_root is None else self.current_root.copy()
+        new._roots = self._roots
+        new._current_root = self._current_root
+        shared = not (self._current_root is None)
+        new._root_shared = self._root_shared = shared
         new._current_func = self._current_func
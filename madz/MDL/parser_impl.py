@@ -1,3 +1,5 @@
+import re
+
 from .parser import *
 from .nodes import *
 from .base_types import *
@@ -12,6 +14,10 @@ class MdlParserConfig():
         #  keyword_end
 
 
+def _keyword_first_chars(keyword):
+    """Keywords are matched case insensitively."""
+    return keyword[:1].lower() + keyword[:1].upper() or None
+
 def MdlParseRuleBase(base=ParseRuleBase):
     class AMdlParseRuleBase(base):
         def __init__(self, **kwargs):
@@ -27,6 +33,9 @@ class MdlKeywordParseRule(MdlParseRuleBase(ParseRuleLevelBase)):
         self._attrs = kwargs["attrs"]
         self._subrules = [[self]] + kwargs["subrules"]
 
+    def first_chars(self):
+        return _keyword_first_chars(self._keyword)
+
     def _copy_level(self, new, old):
         super()._copy_level(new, old)
         new._i = old._i
@@ -65,6 +74,9 @@ class MdlKeywordParseRule(MdlParseRuleBase(ParseRuleLevelBase)):
 
 
 class MdlParseSymbol(MdlParseRuleBase()):
+    def first_chars(self):
+        return self._config.config["symbol_first_chars"]
+
     def _do_parse(self, pstro, state, gen_args):
         self.p_chars(pstro, state, self._config.config["symbol_chars"], self._config.config["symbol_first_chars"])
 
@@ -76,6 +88,9 @@ class MdlParseSymbol(MdlParseRuleBase()):
 
 
 class MdlTypeParseRuleNamed(MdlParseRuleBase()):
+    def first_chars(self):
+        return self._config.config["symbol_first_chars"]
+
     def _do_parse(self, pstro, state, gen_args):
         self.p_chars(pstro, state, self._config.config["symbol_chars"] + ".", self._config.config["symbol_first_chars"])
 
@@ -123,6 +138,9 @@ class MdlTypeParseRuleBase(MdlParseRuleBase()):
         self._nodetype = kwargs["nodetype"]
         self._keyword = kwargs["keyword"]
 
+    def first_chars(self):
+        return _keyword_first_chars(self._keyword)
+
     def _do_parse(self, pstro, state, gen_args):
         if not pstro.match(self._keyword, case_insensitive=True):
             raise Exception("No Keyword")
@@ -138,6 +156,9 @@ class MdlAttributeParseRuleBase(MdlParseRuleBase()):
         self._symbol = kwargs["attr_symbol"]
         self._node = kwargs["attr_node"]
 
+    def first_chars(self):
+        return "+"
+
     def _do_parse(self, pstro, state, gen_args):
         if not pstro.match("+", case_insensitive=True):
             raise Exception("No '+' marker.")
@@ -177,6 +198,9 @@ class MdlTypeParseRuleComplex(MdlParseRuleBase(ParseRuleLevelBase)):
         self._subnodetype = kwargs["subnodetype"]
         self._attrs = kwargs["attrs"]
 
+    def first_chars(self):
+        return self._chars[0][:1]
+
     def _end_rule(self):
         if not hasattr(self, "_endrule"):
             kwargs = dict(self.__kwargs)
@@ -188,6 +212,9 @@ class MdlTypeParseRuleComplex(MdlParseRuleBase(ParseRuleLevelBase)):
         return self._endrule
 
     def _name_rule(mself):
+        if hasattr(mself, "_namerule"):
+            return mself._namerule
+
         class SymbolRule(MdlParseSymbol):
             msubtype = mself._subnodetype
             mname=mself._name
@@ -199,7 +226,8 @@ class MdlTypeParseRuleComplex(MdlParseRuleBase(ParseRuleLevelBase)):
                 state[ParseStateParseTree.key()].set_current_node_func(
                     lambda r, current_func=state[ParseStateParseTree.key()].get_current_node_func(): current_func(r).get_complex_list()[-1])
                 super()._do_parse(pstro, state, gen_args)
-        return SymbolRule(**mself.__kwargs)
+        mself._namerule = SymbolRule(**mself.__kwargs)
+        return mself._namerule
 
     def _copy_level(self, new, old):
         super()._copy_level(new, old)
@@ -263,12 +291,14 @@ class MdlTypeParseRuleStruct(MdlTypeParseRuleComplex):
         super().__init__(**kwargs)
 
     def _seprule(self):
-        kwargs = dict(self.__kwargs)
-        kwargs["match"] = ":"
+        if not hasattr(self, "_sepmatchrule"):
+            kwargs = dict(self.__kwargs)
+            kwargs["match"] = ":"
 
-        return ParseRuleNameMod(
-            ("" if self._name is None else self._name) + "!Sep",
-            ParseRuleMatch(**kwargs))
+            self._sepmatchrule = ParseRuleNameMod(
+                ("" if self._name is None else self._name) + "!Sep",
+                ParseRuleMatch(**kwargs))
+        return self._sepmatchrule
 
     def _gen_levelargs(self, state, **kwargs):
         kwargs["parent"] = self
@@ -288,6 +318,11 @@ class MdlTypeParseRuleFunc(MdlTypeParseRuleComplex):
         kwargs["chars"] = ["(", ")"]
         super().__init__(**kwargs)
 
+    def _copy_level(self, new, old):
+        super()._copy_level(new, old)
+        if hasattr(old, '_j'):
+            new._j = old._j
+
     def _update_level(self, level, state, accepted):
         if not (accepted is None) and accepted.rule is self._end_rule():
             level._j = 0
@@ -322,16 +357,32 @@ class MdlTypeParseRuleFunc(MdlTypeParseRuleComplex):
         ]
         kwargs = dict(self.__kwargs)
         kwargs["match"] = "->"
-        self._endrules = [
-            [ParseRuleNameMod(
+        if not hasattr(self, "_arrowrule"):
+            self._arrowrule = ParseRuleNameMod(
                 ("" if self._name is None else self._name) + "!Arrow",
-                ParseRuleMatch(**kwargs))],
+                ParseRuleMatch(**kwargs))
+        self._endrules = [
+            [self._arrowrule],
             [self._config.config["typerule"]]
         ]
         return super()._gen_levelargs(state, **kwargs)
 
 
 
+def generate_lexer(config, specialrules):
+    """Builds the lexer of MDL from the parser config. Whitespace and comment tokens are consumed by their special rules."""
+    return Lexer([
+        ("whitespace", char_class(specialrules.whitespace.first_chars()) + "+", specialrules.whitespace),
+        ("comment", re.escape(specialrules.comment.first_chars()) + r"[^\n]*", specialrules.comment),
+        ("symbol", char_class(config.config["symbol_first_chars"]) + char_class(config.config["symbol_chars"]) + "*", None),
+        ("string", r'"[^"]*"', None),
+        ("arrow", r"->", None),
+    ])
+
+
+# The version of the MDL parser, change it whenever the results of parsing the same source change.
+parser_version = 1
+
 def generate_parser():
     config = MdlParserConfig({
         "symbol_chars": string.ascii_letters + "_" + string.digits, 
@@ -416,7 +467,8 @@ def generate_parser():
         [
             specialrules,
             ParseStateParseTree(),
-        ])
+        ],
+        lexer=generate_lexer(config, specialrules))
 
     return parser
 
@@ -425,6 +477,35 @@ def get_result(parse):
     return parse[ParseStateParseTree.key()].roots
 
 
+def chunk_spans(lexer, source, tokens):
+    """Splits MDL source into its top level items, each ended by a ';', which each parse to a single root node.
+
+    Args:
+        lexer: The lexer of the MDL parser.
+        source: The MDL source string.
+        tokens: The TokenStream of source.
+
+    Returns:
+        A (spans, rest) pair. spans is a list of the (start, end) source offsets of each item, from its first token
+        which isn't whitespace or a comment up to and including its ';'. rest is the offset of the first such token
+        after the last item, or None if there are none.
+    """
+    trivia = (lexer.kind("whitespace"), lexer.kind("comment"))
+    other = lexer.kind(Lexer.OTHER)
+    spans = []
+    start = None
+    for index, kind in enumerate(tokens.kinds):
+        if kind in trivia:
+            continue
+        token_start = tokens.starts[index]
+        if start is None:
+            start = token_start
+        if kind == other and source[token_start] == ";":
+            spans.append((start, token_start + 1))
+            start = None
+    return spans, start
+
+
 def main():
     import sys
 
@@ -18,6 +18,9 @@ class BaseAction(object):
     """
     action_name = "<BASE>"
 
+    # If the action uses the MDL descriptions of the plugins it acts on, they are parsed in a batch beforehand.
+    preloads_descriptions = False
+
     def __init__(self, system):
         self.system = system
 
@@ -28,11 +31,30 @@ class BaseAction(object):
 
         logger.info("ACTION[{}] performing across {} plugins.".format(self.action_name, len(active_plugins)))
 
+        if self.preloads_descriptions:
+            self._preload_descriptions(active_plugins)
+
         for plugin in active_plugins:
             self.do_plugin(plugin)
 
-    def _check_dependency(self, action_provider):
-        return config.get(OptionSystemSkipDependencies) or not (action_provider.get_dependency())
+    def _preload_descriptions(self, plugins):
+        """Preloads the descriptions of the plugins the action will act on, see PluginSystem.preload_descriptions."""
+        pending = []
+        for plugin_stub in plugins:
+            try:
+                with plugin_stub.and_configs() as effective_config:
+                    if self._check_dependency(self._get_provider(plugin_stub.language), effective_config):
+                        pending.append(plugin_stub)
+            except Exception:
+                # Reported when the action is done on the plugin
+                pass
+        try:
+            self.system.preload_descriptions(pending)
+        except Exception as e:
+            logger.warning("ACTION[{}] failed to preload plugin descriptions: {}".format(self.action_name, e))
+
+    def _check_dependency(self, action_provider, effective_config):
+        return effective_config.get(OptionSystemSkipDependencies) or not (action_provider.get_dependency())
 
     def _get_provider(self, language):
         #TODO(Mason): Implement this function.
@@ -40,12 +62,12 @@ class BaseAction(object):
 
     def do_plugin(self, plugin_stub):
         """Given a plugin, preforms the actions associated with the plugin on the current system."""
-        with plugin_stub.and_configs():
+        with plugin_stub.and_configs() as effective_config:
             language = plugin_stub.language
             provider = self._get_provider(language)
 
             try:
-                if self._check_dependency(provider):
+                if self._check_dependency(provider, effective_config):
                     logger.info("ACTION[{}] on plugin '{}'".format(self.action_name, plugin_stub))
                     try:
                         provider.do()
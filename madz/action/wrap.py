@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 class WrapAction(BaseAction):
     """Generates inter-language wrapper files required by a plugin."""
     action_name = "wrap"
+    preloads_descriptions = True
 
     def __init__(self, system):
         self.system = system
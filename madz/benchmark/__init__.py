@@ -0,0 +1,4 @@
+"""benchmark/__init__.py
+@OffbyOneStudios 2014
+Microbenchmarks of madz internals, each module can be run with 'python -m madz.benchmark.<module>'.
+"""
@@ -0,0 +1,271 @@
+"""benchmark/mdl.py
+@OffbyOneStudios 2014
+Measures the MDL pipeline, parsing, validating and wrapper generation, on a synthetic corpus.
+
+Results can be written to a JSON file, and compared with the results of an earlier run.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import importlib
+import tracemalloc
+
+from ..version import version as madz_version
+from ..MDL.description import MDLDescription, MDLparser
+from ..MDL.loaders import MdlRawLoader
+from ..MDL.parser_impl import get_result
+from .mdl_corpus import MdlCorpusGenerator
+
+format_version = 1
+
+def _make_descriptions(results):
+    """Makes the MDLDescriptions of the parsed namespaces, each depending on the namespaces before it."""
+    descriptions = {}
+    for namespace, roots in results:
+        description = MDLDescription(MdlRawLoader(roots), dict(descriptions))
+        description.ast = sorted(roots, key=MDLDescription.keyfunc)
+        descriptions[namespace] = description
+    return descriptions
+
+def _wrapgen_c(namespaces, descriptions):
+    from ..language.c.wrapgen import CGenerator
+    output = ""
+    for namespace in namespaces[:-1]:
+        output += CGenerator([], namespace, descriptions[namespace]).make_declares_and_vars()
+    code_fragments = {
+        "output_var_bindings": "",
+        "output_var_func_declares": "",
+        "out_struct_func_assigns": "",
+    }
+    gen = CGenerator([], "", descriptions[namespaces[-1]])
+    output += gen.make_declares_and_vars()
+    gen.build_current_output(code_fragments)
+    return output + "".join(code_fragments.values())
+
+def _wrapgen_cpp(namespaces, descriptions):
+    from ..language.cpp.wrapgen import CppCodeGenerator, CppNamespaceGenerator
+    cpp_gen = CppCodeGenerator()
+    output = ""
+    for namespace in namespaces[:-1]:
+        output += CppNamespaceGenerator(cpp_gen, namespace, descriptions[namespace]).make()
+    code_fragments = {
+        "output_var_bindings": "",
+        "out_struct_func_assigns": "",
+    }
+    gen = CppNamespaceGenerator(cpp_gen, namespaces[-1], descriptions[namespaces[-1]], is_current=True)
+    output += gen.make()
+    gen.build_current_output(code_fragments)
+    return output + "".join(code_fragments.values())
+
+def _wrapgen_python(namespaces, descriptions):
+    from ..language.python.wrapgen import PythonGenerator
+    output = ""
+    for namespace in namespaces[:-1]:
+        gen = PythonGenerator([], namespace, descriptions[namespace])
+        output += gen.make_def_function_types() + gen.make_typedefs() + gen.make_out_struct() + gen.make_get_in_struct()
+    gen = PythonGenerator([], "", descriptions[namespaces[-1]])
+    output += gen.make_c_header() + gen.make_typedefs() + gen.make_def_function_types() + gen.make_out_struct()
+    output += gen.make_function_callbacks() + gen.make_function_stubs() + gen.make_c_function_stubs()
+    return output
+
+wrapgens = [
+    ("c", "..language.c.wrapgen", _wrapgen_c),
+    ("cpp", "..language.cpp.wrapgen", _wrapgen_cpp),
+    ("python", "..language.python.wrapgen", _wrapgen_python),
+]
+
+def _import_wrapgens():
+    """Imports the wrapper generators before they are timed, those failing to import fail their phase later."""
+    for name, module, wrapgen in wrapgens:
+        try:
+            importlib.import_module(module, __package__)
+        except Exception:
+            pass
+
+class _Phase(object):
+    """Measures one phase of the pipeline, its time and, while tracing, its peak memory above what it started at."""
+    def __init__(self, results, name, items, characters):
+        self.results = results
+        self.result = {"name": name, "items": items, "characters": characters}
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self.result
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self._start
+        if tracemalloc.is_tracing():
+            self.result["peak_bytes"] = tracemalloc.get_traced_memory()[1] - self._start_memory
+        else:
+            self.result["seconds"] = seconds
+        if not (exc_type is None):
+            self.result["error"] = "{}: {}".format(exc_type.__name__, exc_value)
+        self.results.append(self.result)
+        return not (exc_type is None) and issubclass(exc_type, Exception)
+
+def run_pipeline(sources):
+    """Runs the MDL pipeline once over sources, measuring each phase.
+
+    Phases after a failed phase are skipped, except for the wrapper generators, which are independent.
+
+    Args:
+        sources: A list of (namespace, MDL source) pairs, dependencies first, see MdlCorpusGenerator.generate.
+
+    Returns:
+        A list of phase result dictionaries, with the phase's name, item (declaration) and character counts, and
+        its seconds, or peak_bytes if tracemalloc is tracing. Failed phases have an error.
+    """
+    results = []
+    characters = sum(len(source) for namespace, source in sources)
+    namespaces = [namespace for namespace, source in sources]
+    items = None
+
+    with _Phase(results, "tokenize", None, characters) as phase:
+        token_streams = [MDLparser.tokenize(source) for namespace, source in sources]
+    with _Phase(results, "parse", None, characters) as phase:
+        parses = [MDLparser.parse(source, tokens=tokens) for (namespace, source), tokens in zip(sources, token_streams)]
+    with _Phase(results, "get_result", None, characters) as phase:
+        parsed = [(namespace, get_result(parse)) for namespace, parse in zip(namespaces, parses)]
+        items = sum(len(roots) for namespace, roots in parsed)
+    for result in results:
+        result["items"] = items
+    if any("error" in result for result in results):
+        return results
+
+    descriptions = _make_descriptions(parsed)
+    with _Phase(results, "validate", items, characters) as phase:
+        phase["valid"] = all([descriptions[namespace].validate() for namespace in namespaces])
+    if "error" in results[-1]:
+        return results
+
+    for name, module, wrapgen in wrapgens:
+        with _Phase(results, "wrapgen_" + name, items, characters) as phase:
+            phase["output_characters"] = len(wrapgen(namespaces, descriptions))
+    return results
+
+def run(sources, repeat=1, memory=True):
+    """Measures the MDL pipeline on sources.
+
+    Args:
+        sources: A list of (namespace, MDL source) pairs, see run_pipeline.
+        repeat: The number of timed runs, each phase's fastest time is kept.
+        memory: If the pipeline should be run again, tracing memory allocations, to measure peak memory.
+
+    Returns:
+        A list of phase result dictionaries, see run_pipeline. Successful phases have their throughput, in
+        items_per_second and characters_per_second.
+    """
+    _import_wrapgens()
+
+    results = None
+    for i in range(repeat):
+        timed = run_pipeline(sources)
+        if results is None:
+            results = timed
+            continue
+        for result, timed_result in zip(results, timed):
+            if "seconds" in timed_result and timed_result["seconds"] < result.get("seconds", float("inf")):
+                result["seconds"] = timed_result["seconds"]
+
+    if memory:
+        tracemalloc.start()
+        try:
+            traced = run_pipeline(sources)
+        finally:
+            tracemalloc.stop()
+        for result, traced_result in zip(results, traced):
+            if "peak_bytes" in traced_result:
+                result["peak_bytes"] = traced_result["peak_bytes"]
+
+    for result in results:
+        if "error" in result or not result.get("seconds"):
+            continue
+        result["items_per_second"] = result["items"] / result["seconds"]
+        result["characters_per_second"] = result["characters"] / result["seconds"]
+    return results
+
+def make_report(results, parameters):
+    """Returns the machine readable report of a run, a JSON serializable dictionary."""
+    return {
+        "format_version": format_version,
+        "madz_version": madz_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": parameters,
+        "results": results,
+    }
+
+def load_report(filename):
+    with open(filename) as f:
+        report = json.load(f)
+    if report.get("format_version") != format_version:
+        raise ValueError("Benchmark report '{}' has an unknown format.".format(filename))
+    return report
+
+def _print_results(results, baseline=None):
+    baseline_seconds = {}
+    if not (baseline is None):
+        baseline_seconds = {r["name"]: r["seconds"] for r in baseline["results"] if r.get("seconds")}
+
+    for result in results:
+        if "error" in result:
+            print("{:<16} failed: {}".format(result["name"], result["error"]))
+            continue
+        line = "{:<16} {:>9.4f}s {:>12,.0f} decls/s {:>14,.0f} chars/s".format(
+            result["name"], result["seconds"], result.get("items_per_second", 0), result.get("characters_per_second", 0))
+        if "peak_bytes" in result:
+            line += " {:>10.2f} MiB peak".format(result["peak_bytes"] / 2**20)
+        if result["name"] in baseline_seconds:
+            line += " {:>7.2f}x baseline time".format(result["seconds"] / baseline_seconds[result["name"]])
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MDL parsing, validation and wrapper generation.")
+    parser.add_argument("-n", "--count", type=int, default=1000, help="The number of declarations.")
+    parser.add_argument("-d", "--depth", type=int, default=2, help="The deepest nesting of types.")
+    parser.add_argument("-w", "--width", type=int, default=4, help="The most fields of a struct.")
+    parser.add_argument("-a", "--arity", type=int, default=3, help="The most arguments of a function.")
+    parser.add_argument("--namespaces", type=int, default=2, help="The number of dependency namespaces.")
+    parser.add_argument("--references", type=float, default=0.25, help="The chance of a leaf type being a named type.")
+    parser.add_argument("--seed", type=int, default=0, help="The random seed used to generate the corpus.")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="The number of timed runs, the fastest is kept.")
+    parser.add_argument("--no-memory", action="store_true", help="Don't measure peak memory.")
+    parser.add_argument("-o", "--output", help="A JSON file to write the results to.")
+    parser.add_argument("-c", "--compare", help="A JSON file of earlier results to compare with.")
+    args = parser.parse_args(argv)
+
+    parameters = {
+        "count": args.count,
+        "depth": args.depth,
+        "width": args.width,
+        "arity": args.arity,
+        "namespaces": args.namespaces,
+        "references": args.references,
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+    baseline = None if args.compare is None else load_report(args.compare)
+    if not (baseline is None) and baseline["parameters"] != parameters:
+        print("Warning: the baseline was run with different parameters: {}".format(baseline["parameters"]))
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    generator = MdlCorpusGenerator(depth=args.depth, width=args.width, arity=args.arity,
+        reference_ratio=args.references, seed=args.seed)
+    sources = generator.generate(args.count, namespaces=args.namespaces)
+
+    results = run(sources, repeat=args.repeat, memory=not args.no_memory)
+    _print_results(results, baseline)
+
+    if not (args.output is None):
+        with open(args.output, "w") as f:
+            json.dump(make_report(results, parameters), f, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""benchmark/mdl_corpus.py
+@OffbyOneStudios 2014
+Generates synthetic MDL sources for benchmarks.
+"""
+
+import random
+
+_base_types = ["int8", "int16", "int32", "int64", "uint8", "uint32", "uint64", "float32", "float64", "char"]
+
+class MdlCorpusGenerator(object):
+    """Generates the MDL sources of a namespace and of the namespaces it depends on.
+
+    Each dependency namespace gets an equal share of the declarations, the main namespace the rest. Types refer to
+    the types declared before them, in their own namespace or (by full name) in an earlier dependency namespace.
+
+    Attributes:
+        depth: The deepest nesting of struct, function and pointer types.
+        width: The most fields of a struct type.
+        arity: The most arguments of a function type.
+        reference_ratio: The chance of a leaf type being a NamedType, rather than a base type.
+        seed: The random seed.
+    """
+    def __init__(self, depth=2, width=4, arity=3, reference_ratio=0.25, seed=0):
+        self.depth = depth
+        self.width = width
+        self.arity = arity
+        self.reference_ratio = reference_ratio
+        self.seed = seed
+
+    def _leaf_type(self, rng, names):
+        if names and rng.random() < self.reference_ratio:
+            return rng.choice(names)
+        return rng.choice(_base_types)
+
+    def _type(self, rng, depth, names):
+        roll = rng.random()
+        if depth > 0 and roll < 0.3:
+            return "{{{}}}".format(", ".join("f{}: {}".format(i, self._type(rng, depth - 1, names))
+                for i in range(rng.randint(1, self.width))))
+        elif depth > 0 and roll < 0.55:
+            return self._function_type(rng, depth, names)
+        elif depth > 0 and roll < 0.7:
+            return "*" + self._type(rng, depth - 1, names)
+        return self._leaf_type(rng, names)
+
+    def _function_type(self, rng, depth, names):
+        arguments = ", ".join("a{} {}".format(i, self._type(rng, depth - 1, names))
+            for i in range(rng.randint(0, self.arity)))
+        if rng.random() < 0.25:
+            return_type = "void"
+        else:
+            return_type = self._leaf_type(rng, names)
+        return "({}) -> {}".format(arguments, return_type)
+
+    def _source(self, rng, count, external_names):
+        lines = []
+        local_names = []
+        for i in range(count):
+            names = local_names + external_names
+            roll = rng.random()
+            if roll < 0.5:
+                lines.append("type t{} {};".format(i, self._type(rng, self.depth, names)))
+                local_names.append("t{}".format(i))
+            elif roll < 0.8:
+                lines.append("var f{} {} +doc:\"Function {}.\";".format(i, self._function_type(rng, self.depth, names), i))
+            else:
+                lines.append("# Variable {}\nvar v{} {};".format(i, i, self._type(rng, self.depth, names)))
+        return "\n".join(lines) + "\n", local_names
+
+    def generate(self, count, namespaces=2, namespace="benchmark"):
+        """Generates count declarations.
+
+        Args:
+            count: The number of declarations, over all the namespaces.
+            namespaces: The number of dependency namespaces.
+            namespace: The main namespace, dependency namespaces are called '<namespace>.dep<N>'.
+
+        Returns:
+            A list of (namespace, MDL source) pairs, dependencies first and the main namespace last.
+        """
+        rng = random.Random(self.seed)
+        share = count // (namespaces + 1)
+        sources = []
+        external_names = []
+        for i in range(namespaces):
+            dependency = "{}.dep{}".format(namespace, i)
+            source, local_names = self._source(rng, share, external_names)
+            sources.append((dependency, source))
+            external_names += ["{}.{}".format(dependency, name) for name in local_names]
+        source, local_names = self._source(rng, count - share * namespaces, external_names)
+        sources.append((namespace, source))
+        return sources
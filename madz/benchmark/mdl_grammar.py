@@ -0,0 +1,79 @@
+"""benchmark/mdl_grammar.py
+@OffbyOneStudios 2014
+Measures how MDL parse time grows with the size of deeply nested type declarations.
+"""
+
+import sys
+import time
+import argparse
+
+from ..MDL.parser_impl import generate_parser, get_result
+
+def make_nested_type(depth, tag=0):
+    """Returns an MDL type nested depth levels deep, alternating function and struct types."""
+    mdl_type = "int8"
+    for i in range(depth):
+        if i % 2:
+            mdl_type = "{{f{0}_{1}: {2}, g{0}_{1}: *char}}".format(tag, i, mdl_type)
+        else:
+            mdl_type = "(a{0}_{1} {2}, b{0}_{1} uint32) -> int32".format(tag, i, mdl_type)
+    return mdl_type
+
+def make_corpus(count, depth):
+    """Returns an MDL source of count type declarations, each nested depth levels deep."""
+    return "".join("type t{} {};\n".format(i, make_nested_type(depth, i)) for i in range(count))
+
+def _time_parse(parser, source):
+    start = time.perf_counter()
+    roots = get_result(parser.parse(source))
+    return time.perf_counter() - start, roots
+
+def run_series(parser, sources):
+    """Parses each source in turn.
+
+    Returns:
+        A list of (characters, seconds, growth) results, growth is the ratio of time per character to that of
+        the previous source, near 1.0 when parse time is linear in the source length.
+    """
+    results = []
+    previous = None
+    for source in sources:
+        seconds, roots = _time_parse(parser, source)
+        per_char = seconds / len(source)
+        results.append((len(source), seconds, None if previous is None else per_char / previous))
+        previous = per_char
+    return results
+
+def _print_series(title, labels, results):
+    print(title)
+    for label, (characters, seconds, growth) in zip(labels, results):
+        print("  {:<14} {:>9} chars {:>9.4f}s {:>9.3f} us/char {:>7}".format(
+            label, characters, seconds, 1e6 * seconds / characters, "" if growth is None else "x{:.2f}".format(growth)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MDL parse time on deeply nested type declarations.")
+    parser.add_argument("-n", "--count", type=int, default=10, help="The number of declarations of the smallest corpus.")
+    parser.add_argument("-d", "--depth", type=int, default=16, help="The nesting depth of each declaration.")
+    parser.add_argument("-s", "--steps", type=int, default=5, help="The number of corpora, each twice the size of the last.")
+    parser.add_argument("--max-depth", type=int, default=64, help="The deepest single declaration parsed.")
+    args = parser.parse_args(argv)
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100 * args.max_depth))
+    mdl_parser = generate_parser()
+
+    counts = [args.count * 2**i for i in range(args.steps)]
+    _print_series("{} deep declarations:".format(args.depth),
+        ["{} decls".format(count) for count in counts],
+        run_series(mdl_parser, [make_corpus(count, args.depth) for count in counts]))
+
+    depths = []
+    depth = max(1, args.depth // 2)
+    while depth <= args.max_depth:
+        depths.append(depth)
+        depth *= 2
+    _print_series("Single declarations (parse states copy the declaration being parsed, so this grows with depth):",
+        ["depth {}".format(depth) for depth in depths],
+        run_series(mdl_parser, [make_corpus(1, depth) for depth in depths]))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,81 @@
+"""benchmark/semver.py
+@OffbyOneStudios 2014
+Measures SemanticVersion parse, compare and sort throughput.
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from ..core.semver import SemanticVersion
+
+def make_version_strings(count, distinct, seed=0):
+    """Returns count random version strings, drawn from distinct versions as plugin sets repeat versions.
+
+    Some of the versions have prereleases and metadata.
+    """
+    rng = random.Random(seed)
+    prereleases = ["alpha", "alpha.1", "alpha.beta", "beta", "beta.2", "beta.11", "rc.1"]
+    pool = []
+    for i in range(distinct):
+        string = "{}.{}.{}".format(rng.randint(0, 20), rng.randint(0, 30), rng.randint(0, 50))
+        if rng.random() < 0.2:
+            string += "-" + rng.choice(prereleases)
+        if rng.random() < 0.05:
+            string += "+build.{}".format(rng.randint(0, 100))
+        pool.append(string)
+    return [rng.choice(pool) for i in range(count)]
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def run(count, distinct, seed=0):
+    """Runs the benchmark on count versions, drawn from distinct version strings.
+
+    Returns:
+        A list of (name, operation count, seconds) results.
+    """
+    strings = make_version_strings(count, distinct, seed)
+    results = []
+
+    uncached_time, versions = _timed(lambda: [SemanticVersion._parse_string(s) for s in strings])
+    results.append(("parse (uncached)", count, uncached_time))
+
+    parse = SemanticVersion.parse
+    parse_time, versions = _timed(lambda: [parse(s) for s in strings])
+    results.append(("parse (interned)", count, parse_time))
+
+    pairs = list(zip(versions, versions[1:] + versions[:1]))
+    compare_time, less = _timed(lambda: sum(1 for a, b in pairs if a < b))
+    results.append(("compare", len(pairs), compare_time))
+
+    equal_time, equal = _timed(lambda: sum(1 for a, b in pairs if a == b))
+    results.append(("equal", len(pairs), equal_time))
+
+    sort_time, ordered = _timed(lambda: sorted(versions))
+    results.append(("sort", count, sort_time))
+
+    key_sort_time, ordered_by_key = _timed(lambda: sorted(versions, key=lambda v: v.sort_key))
+    results.append(("sort (by sort_key)", count, key_sort_time))
+
+    # The order must be total and agree with the key.
+    if any(b < a for a, b in zip(ordered, ordered[1:])) or [v.sort_key for v in ordered] != [v.sort_key for v in ordered_by_key]:
+        raise AssertionError("SemanticVersion ordering is not consistent.")
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SemanticVersion parse, compare and sort throughput.")
+    parser.add_argument("-n", "--count", type=int, default=100000, help="The number of versions.")
+    parser.add_argument("-d", "--distinct", type=int, default=1000, help="The number of distinct version strings.")
+    parser.add_argument("--seed", type=int, default=0, help="The random seed used to generate versions.")
+    args = parser.parse_args(argv)
+
+    for name, operations, seconds in run(args.count, args.distinct, args.seed):
+        print("{:<20} {:>10} ops {:>9.4f}s {:>14,.0f} ops/s".format(name, operations, seconds, operations / seconds if seconds else float("inf")))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
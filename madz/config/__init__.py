@@ -25,6 +25,9 @@ DefaultConfig.default_options = [
     ## System options
     OptionSystemSkipDependencies(),
     OptionSystemExecuteFunctionName(),
+    OptionSystemIndexWorkers(),
+    OptionSystemParseWorkers(),
+    OptionSystemSolveVersions(),
 
     ## Compiler defaults
     OptionImposter(lambda: {
@@ -69,4 +72,4 @@ DefaultConfig.default_options = [
     ]),
 ]
 
-config.add(DefaultConfig())
\ No newline at end of file
+config.add_default(DefaultConfig())
\ No newline at end of file
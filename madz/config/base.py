@@ -10,6 +10,8 @@ BaseConfig: is the base config type from which all inherit.
 """
 
 import abc
+import copy
+import collections.abc
 
 class ConfigError(Exception): pass
 
@@ -247,6 +249,16 @@ class BaseConfig(object):
     def copy(self):
         return self.make(self._copy_options())
 
+    def _share_options(self):
+        """Returns a shallow copy of this config which shares its option objects.
+
+        Merges never modify an option in place, they replace it with a new merged option.
+        So the options can be shared copy-on-write between a config and its merges.
+        """
+        new_config = copy.copy(self)
+        new_config._opt_dict = dict(self._opt_dict)
+        return new_config
+
     def get_option(self, key, default=None):
         """Gets the option object sharing a key with the given type parameter, may return a default option."""
         return self._opt_dict.get(key, None)
@@ -266,6 +278,10 @@ class BaseConfig(object):
         """Returns the current options associated with the configuration."""
         return self._opt_dict.values()
 
+    def as_dict(self):
+        """Returns a flat mapping of option keys to option values, see FlatConfig."""
+        return FlatConfig(self._opt_dict)
+
     def apply_option(self, option):
         """Applies an option to this configuration.
         
@@ -308,7 +324,7 @@ class BaseConfig(object):
             A configuration object, which is the result of the old configuration and provided configuration being merged.
         """
         self._merge_check(other_config)
-        new_config = self.copy()
+        new_config = self._share_options()
         new_config.apply(other_config)
         return new_config
 
@@ -414,3 +430,40 @@ class OptionImposter(BaseOption):
         return "<IMPOSTER> {!s}: {!s}".format(self.get_key(), self.get_value())
 
 
+
+
+class FlatConfig(collections.abc.Mapping):
+    """A read only mapping of option keys to the values of a config's options.
+
+    Option values are computed once, except those of imposters, which are computed at each lookup, see OptionImposter.
+    """
+    def __init__(self, options):
+        self._values = {}
+        self._imposters = {}
+        for (key, option) in options.items():
+            if isinstance(option, OptionImposter):
+                self._imposters[key] = option
+            else:
+                self._values[key] = option.get_value()
+
+    def get(self, key, default=None):
+        if key in self._values:
+            return self._values[key]
+        if key in self._imposters:
+            return self._imposters[key].get_value()
+        return default
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        return self._imposters[key].get_value()
+
+    def __contains__(self, key):
+        return key in self._values or key in self._imposters
+
+    def __iter__(self):
+        yield from self._values
+        yield from self._imposters
+
+    def __len__(self):
+        return len(self._values) + len(self._imposters)
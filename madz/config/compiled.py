@@ -0,0 +1,161 @@
+"""config/compiled.py
+@OffbyOneStudios 2014
+An on disk cache of configs evaluated from python config files.
+"""
+import io
+import os
+import imp
+import types
+import pickle
+import hashlib
+import logging
+import tempfile
+
+from ..version import version
+from .base import *
+
+logger = logging.getLogger(__name__)
+
+# The module name python config files are evaluated as
+config_module_name = "a_config"
+
+class _ConfigPickler(pickle.Pickler):
+    """Pickles configs, refusing the classes and functions defined in config files, which can't be imported again."""
+    def persistent_id(self, obj):
+        defined_by = obj if isinstance(obj, (type, types.FunctionType)) else type(obj)
+        if getattr(defined_by, "__module__", None) == config_module_name:
+            raise pickle.PicklingError("{!r} is defined in a config file.".format(obj))
+        return None
+
+class CompiledConfigCache(object):
+    """Caches the configs evaluated from python config files.
+
+    Each entry is a single pickle file holding a header, made of the madz version and the
+    hashes of the source files, and the pickled config. An entry is only used when its
+    header matches, otherwise the config files are evaluated again and the entry is
+    replaced. Config files are expected to produce the same config for the same source.
+
+    Only the listed files are hashed, not the modules they import, so an entry is still used
+    after a module imported by a config file changes. Configs using classes or functions
+    defined in a config file are not cached, they can't be unpickled in another process.
+
+    Attributes:
+        directory: The directory the cache files are stored in.
+    """
+    format_version = 2
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def hash_file(filename):
+        """Returns the hash of the contents of a file."""
+        with open(filename, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _make_header(self, filenames, kind):
+        return (
+            self.format_version,
+            version,
+            kind,
+            tuple((os.path.abspath(f), self.hash_file(f)) for f in filenames))
+
+    def _cache_filename(self, filenames, kind):
+        name = hashlib.sha1("\n".join([kind] + list(map(os.path.abspath, filenames))).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "config-{}.pickle".format(name))
+
+    def _read(self, cache_filename, header):
+        """Returns the cached config, or None if there is no valid cache entry."""
+        try:
+            with open(cache_filename, "rb") as cache_file:
+                cached_header, payload = pickle.loads(cache_file.read())
+            if cached_header == header:
+                return pickle.loads(payload)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.warning("Failed to load compiled config cache '{}'.".format(cache_filename))
+        return None
+
+    def _write(self, cache_filename, header, config):
+        """Atomically writes a cache entry, skipping configs which cannot be pickled (for example imposters)."""
+        try:
+            payload = io.BytesIO()
+            _ConfigPickler(payload).dump(config)
+            data = pickle.dumps((header, payload.getvalue()))
+        except Exception as exc:
+            logger.debug("Config from {} cannot be pickled, not caching it: {}".format(header[3], exc))
+            return
+
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            handle, temp_filename = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_filename, cache_filename)
+        except OSError:
+            logger.warning("Failed to write compiled config cache '{}'.".format(cache_filename))
+
+    def load(self, filenames, evaluate_func, kind="config"):
+        """Returns the config built from filenames, from the cache if none of them changed.
+
+        Args:
+            filenames: The config files the config is built from.
+            evaluate_func: Builds the config from the files, called when the cache is out of date.
+            kind: The kind of config evaluate_func builds, the entries of different kinds are kept apart.
+
+        Returns:
+            The config.
+        """
+        filenames = list(filenames)
+        header = self._make_header(filenames, kind)
+        cache_filename = self._cache_filename(filenames, kind)
+
+        config = self._read(cache_filename, header)
+        if not (config is None):
+            logger.debug("Loaded compiled config for {}.".format(filenames))
+            return config
+
+        config = evaluate_func()
+        if not (config is None):
+            self._write(cache_filename, header, config)
+        return config
+
+def default_cache_directory(filename):
+    """Returns the default compiled config cache directory for a config file, the '.madz' directory next to it."""
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), ".madz")
+
+def evaluate_config_file(filename, varname="config"):
+    """Executes a python config file.
+
+    Args:
+        filename: The python config file.
+        varname: The name of the variable holding the config.
+
+    Returns:
+        The config in the varname variable.
+    """
+    with open(filename) as module_file: #TODO(Mason): Figure out this name
+        module = imp.load_module(config_module_name, module_file, filename, ('.py', 'r', imp.PY_SOURCE))
+    return getattr(module, varname)
+
+def load_config_files(filenames, varname="config", cache_directory=None):
+    """Loads and merges the configs of python config files, using the compiled config cache when none of them changed.
+
+    Args:
+        filenames: The python config files, in merge order.
+        varname: The name of the variable holding the config in each file.
+        cache_directory: The compiled config cache directory, defaults to the one of the first file.
+
+    Returns:
+        The merged config, or None if there are no files.
+    """
+    filenames = list(filenames)
+    if len(filenames) == 0:
+        return None
+    if cache_directory is None:
+        cache_directory = default_cache_directory(filenames[0])
+
+    return CompiledConfigCache(cache_directory).load(filenames,
+        lambda: merge(*[evaluate_config_file(f, varname) for f in filenames]))
@@ -4,30 +4,180 @@ A system for managing current config information.
 """
 
 import contextlib
+import contextvars
+import collections
+import threading
+import weakref
 
 from .base import *
 from .platform import *
 
+class ConfigLayer(object):
+    """An immutable node in a persistent (linked) stack of configs.
+
+    Pushing and popping layers is O(1) and never copies the stack, layers are shared
+    between every stack built on top of them. Each layer lazily caches the merged view
+    of itself and all of its parents, and pushing the same config onto the same layer
+    returns the existing child layer (while it is alive), so re-entering a previously
+    seen stack reuses its merged view.
+
+    Attributes:
+        config: The Configuration object of this layer, None for the root layer.
+        parent: The ConfigLayer below this one, None for the root layer.
+        depth: The number of configs in the stack ending at this layer.
+    """
+    def __init__(self, config=None, parent=None):
+        self.config = config
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self._merged = None
+        self._flat = None
+        self._children = weakref.WeakValueDictionary()
+
+    @classmethod
+    def from_list(cls, config_list, root=None):
+        """Builds a stack of layers from a list of configs.
+
+        Args:
+            config_list: A list of Configuration objects, bottom first.
+            root: The layer to build upon, defaults to a new root layer.
+
+        Returns:
+            The top ConfigLayer of the new stack.
+        """
+        layer = cls() if root is None else root
+        for config in config_list:
+            layer = layer.push(config)
+        return layer
+
+    def push(self, config):
+        """Returns the layer with config on top of this layer."""
+        key = id(config)
+        child = self._children.get(key, None)
+        if child is None or not (child.config is config):
+            child = self.__class__(config, self)
+            self._children[key] = child
+        return child
+
+    def pop(self):
+        """Returns the layer below this layer."""
+        if self.parent is None:
+            raise IndexError("Cannot pop the root config layer.")
+        return self.parent
+
+    def root(self):
+        """Returns the bottom most layer of this stack."""
+        layer = self
+        while not (layer.parent is None):
+            layer = layer.parent
+        return layer
+
+    def get_configs(self):
+        """Returns the list of configs in this stack, bottom first."""
+        configs = []
+        layer = self
+        while not (layer.parent is None):
+            configs.append(layer.config)
+            layer = layer.parent
+        configs.reverse()
+        return configs
+
+    def get_merged_config(self):
+        """Returns the MergedConfig of this stack, computed once per layer.
+
+        The result is shared between callers and must not be modified.
+        """
+        if self._merged is None:
+            if self.parent is None:
+                self._merged = MergedConfig()
+            else:
+                self._merged = merge(self.parent.get_merged_config(), self.config)
+        return self._merged
+
+    def get_flat_config(self):
+        """Returns the merged config of this stack as a FlatConfig of option keys to values, computed once per layer.
+
+        The result is shared between callers and must not be modified.
+        """
+        if self._flat is None:
+            self._flat = self.get_merged_config().as_dict()
+        return self._flat
+
+    def __len__(self):
+        return self.depth
+
+    def __iter__(self):
+        return iter(self.get_configs())
+
+
 class ConfigWorld(object):
-    """Defines a world of configurations from a list of configs.
-    
+    """Defines a world of configurations from a stack of configs.
+
+    The stack is a persistent ConfigLayer, so copy_state, set_state and and_merge are
+    O(1) and the merged config is cached per layer. Recently used layers are kept
+    alive, so re-entering the same plugin, command and mode combination reuses the
+    earlier merge. Configs are therefore treated as immutable once they are placed
+    into a world.
+
+    The current stack is a context variable: every thread and asyncio task has its own
+    stack, starting from the world's default stack, so they can push and pop configs
+    concurrently without locking. Threads which should continue from another thread's
+    stack can be handed it with copy_state and and_layer.
+
     Attributes:
         config_list: A list of Configuration objects.
+        layer: The top ConfigLayer of the current stack.
     """
+    recent_layers_size = 256
+
     def __init__(self, config_list=[]):
-        self.config_list = config_list
+        self._recent_layers = collections.OrderedDict()
+        self._recent_lock = threading.Lock()
+        self._root = ConfigLayer()
+        self._default_layer = ConfigLayer.from_list(config_list, self._root)
+        self._current_layer = contextvars.ContextVar("madz.config.ConfigWorld", default=None)
+
+    def config_list():
+        doc = "The config_list property. A list copy of the current stack."
+        def fget(self):
+            return self.layer.get_configs()
+        def fset(self, value):
+            self.layer = ConfigLayer.from_list(value, self._root)
+        return locals()
+    config_list = property(**config_list())
+
+    def layer():
+        doc = "The layer property. The top of the current config stack, for this thread or task."
+        def fget(self):
+            layer = self._current_layer.get()
+            return self._default_layer if layer is None else layer
+        def fset(self, value):
+            self._current_layer.set(value)
+        return locals()
+    layer = property(**layer())
+
+    def add_default(self, config):
+        """Appends a Configuration object to the default stack, which every thread and task starts from.
+
+        Args:
+            config: A Configuration object to be added to the end of the default stack.
+        """
+        self._default_layer = self._default_layer.push(config)
 
     def copy_state(self):
-        """Returns a copy of the current configuration list"""
-        return list(self.config_list)
+        """Returns the current config stack, which can later be given to set_state."""
+        return self.layer
 
-    def set_state(self, state_list):
-        """Sets the current config_list to the inputted list of configurations.
+    def set_state(self, state):
+        """Sets the current config stack.
         
         Args:
-            state_list: A list of configurations.
+            state: A ConfigLayer (from copy_state), or a list of configurations.
         """
-        self.config_list = state_list
+        if isinstance(state, ConfigLayer):
+            self.layer = state
+        else:
+            self.config_list = state
 
     def save(self):
         """Merges configs and saves.
@@ -37,9 +187,30 @@ class ConfigWorld(object):
         """
         return self.get_merged_config()
 
+    def _use_layer(self):
+        """Returns the current layer, keeping it alive as a recently used layer."""
+        layer = self.layer
+        with self._recent_lock:
+            recent = self._recent_layers
+            recent[id(layer)] = layer
+            recent.move_to_end(id(layer))
+            while len(recent) > self.recent_layers_size:
+                recent.popitem(last=False)
+        return layer
+
     def get_merged_config(self):
-        """Returns a MergedConfig object. Called in save."""
-        return merge(MergedConfig(), *self.config_list)
+        """Returns a MergedConfig object. Called in save.
+
+        The result is shared between callers and must not be modified.
+        """
+        return self._use_layer().get_merged_config()
+
+    def get_flat_config(self):
+        """Returns the merged config as a FlatConfig of option keys to values.
+
+        The result is shared between callers and must not be modified.
+        """
+        return self._use_layer().get_flat_config()
 
     def get_option(self, key):
         """Returns an option from the provided key.
@@ -78,8 +249,7 @@ class ConfigWorld(object):
         Returns:
             An Option object
         """
-        option = self.get_option(key)
-        return option.get_value() if not (option is None) else default
+        return self.get_flat_config().get(key, default)
 
     def add(self, config):
         """Appends a Configuration object to the end of the current config_list.
@@ -87,7 +257,7 @@ class ConfigWorld(object):
         Args:
             config: A Configuration objedt to be added to the end of the current config_list.
         """
-        self.config_list.append(config)
+        self.layer = self.layer.push(config)
 
     def pop(self):
         """Removes and returns the Configuration object from the front of the current config_list.
@@ -95,7 +265,9 @@ class ConfigWorld(object):
         Returns:
             The Configuration object at the front of the config_list.
         """
-        return self.config_list.pop()
+        layer = self.layer
+        self.layer = layer.pop()
+        return layer.config
 
     def remove(self, config_key):
         """Removes a configuration which matches the configuration key from the current config_list.
@@ -106,13 +278,33 @@ class ConfigWorld(object):
         self.config_list = list(filter(lambda c: c.get_key() != config_key, self.config_list))
 
     @contextlib.contextmanager
-    def and_merge(self, config):
-        old_state = self.copy_state()
-        self.add(config)
+    def and_layer(self, layer):
+        """Sets the config stack to layer for the duration of the with block.
+
+        Args:
+            layer: A ConfigLayer, usually built on top of the current one.
+        """
+        old_layer = self._current_layer.get()
+        self.set_state(layer)
+        try:
+            yield
+        finally:
+            self._current_layer.set(old_layer)
+
+    @contextlib.contextmanager
+    def and_merge(self, *configs):
+        """Pushes configs onto the stack for the duration of the with block.
+
+        Args:
+            configs: Configuration objects to push, in order.
+        """
+        old_layer = self._current_layer.get()
+        for config in configs:
+            self.add(config)
         try:
             yield
         finally:
-            self.set_state(old_state)
+            self._current_layer.set(old_layer)
 
 
 config = ConfigWorld()
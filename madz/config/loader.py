@@ -1,7 +1,6 @@
 import logging
 import os
 import sys
-import imp
 import traceback
 
 from . import system_config as sys_cfg
@@ -60,14 +59,13 @@ class ConfigLoader(object):
         return sys_cfg.SystemConfig(parsed_options)
 
 def load_config_from_file(filename, varname="config"):
-    with open(filename) as module_file: #TODO(Mason): Figure out this name
-        try:
-            module = imp.load_module("a_config", module_file, filename, ('.py', 'r', imp.PY_SOURCE))
-            config = getattr(module, varname)
-            loader = ConfigLoader(config)
-            return loader.parse_system_config()
-        except:
-            tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
-            logger.info("Failed to load config from file '{}':\n\t{}".format(filename, tb_string))
-            return None
+    """Loads the system config of a python config file, through the compiled config cache, see compiled.CompiledConfigCache."""
+    from .compiled import CompiledConfigCache, default_cache_directory, evaluate_config_file
+    try:
+        return CompiledConfigCache(default_cache_directory(filename)).load([filename],
+            lambda: ConfigLoader(evaluate_config_file(filename, varname)).parse_system_config(), kind="system")
+    except:
+        tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
+        logger.info("Failed to load config from file '{}':\n\t{}".format(filename, tb_string))
+        return None
 
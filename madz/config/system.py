@@ -31,6 +31,18 @@ class OptionSystemExecuteFunctionName(BaseOption):
     """This option determines the name of the function to execute."""
     default_value = "main"
 
+class OptionSystemSolveVersions(BaseOption):
+    """This option determines if plugin requirements are resolved by solving the versions given in depends and imports as constraints, rather than by namespace only."""
+    default_value = False
+
+class OptionSystemIndexWorkers(BaseOption):
+    """This option determines how many worker processes load plugin descriptions while indexing, 0 or 1 loads them serially."""
+    default_value = 0
+
+class OptionSystemParseWorkers(BaseOption):
+    """This option determines how many worker processes parse the MDL of plugins ahead of an action, None uses one per core, 0 or 1 parses serially."""
+    default_value = 0
+
 #
 # Default Options
 #
@@ -23,17 +23,13 @@ class UserConfig(BaseConfig):
 
     @classmethod
     def load_from_filename(cls, filename):
-        import sys
-        import traceback
-        import imp
+        from .compiled import load_config_files
         if (not (filename is None)) and os.path.exists(filename):
-            with open(filename) as module_file: #TODO(Mason): Figure out this name
-                module = imp.load_module("a_config", module_file, filename, ('.py', 'r', imp.PY_SOURCE))
-                config = getattr(module, "config")
-                if isinstance(config, UserConfig):
-                    return config
-                else:
-                    raise UserConfigNotFoundError("Did not find a UserConfig in the 'config' var of '{}'.")
+            config = load_config_files([filename])
+            if isinstance(config, UserConfig):
+                return config
+            else:
+                raise UserConfigNotFoundError("Did not find a UserConfig in the 'config' var of '{}'.")
         logger.info("Skipping user config. File not found '{}'.".format(filename))
                     
         return cls.make_default()
@@ -0,0 +1,220 @@
+"""core/dependency_graph.py
+@OffbyOneStudios 2014
+The dependency graph of the plugins in a system.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PluginDependencyGraph(object):
+    """The graph of the loaded depends and imports between initialized plugins.
+
+    Built once from the plugins' loaded_depends and loaded_imports, it must be rebuilt if they change.
+    Topological order, cycles and transitive closures are computed on first use and cached.
+    Graph walks are iterative, so deep graphs don't hit the recursion limit.
+
+    Attributes:
+        plugins: The plugins in the graph, the given plugins and every plugin they require.
+    """
+    def __init__(self, plugins):
+        """Builds the graph.
+
+        Args:
+            plugins: The plugins to build the graph of, the plugins they require are added as well.
+        """
+        self._depends = {}
+        self._imports = {}
+        self._dependents = {}
+        self.plugins = []
+
+        pending = list(plugins)
+        while pending:
+            plugin = pending.pop()
+            if plugin in self._depends:
+                continue
+            self.plugins.append(plugin)
+            self._dependents.setdefault(plugin, [])
+            self._depends[plugin] = self._known(getattr(plugin, "loaded_depends", []))
+            self._imports[plugin] = self._known(getattr(plugin, "loaded_imports", []))
+            for req in self._depends[plugin] + self._imports[plugin]:
+                self._dependents.setdefault(req, []).append(plugin)
+                pending.append(req)
+
+        self._order = None
+        self._cycles = None
+        self._recursive_depends = {}
+        self._required_imports = {}
+        self._recursive_requires = {}
+
+    @staticmethod
+    def _known(plugins):
+        """Skips requirements which failed to resolve, keeping the first of duplicates."""
+        known = []
+        for plugin in plugins:
+            if not (plugin is None or plugin in known):
+                known.append(plugin)
+        return known
+
+    def requires(self, plugin):
+        """The plugins plugin directly depends on and imports."""
+        return self._known(self._depends[plugin] + self._imports[plugin])
+
+    def __contains__(self, plugin):
+        return plugin in self._depends
+
+    def __len__(self):
+        return len(self.plugins)
+
+    def _strongly_connected(self, edges):
+        """Tarjan's algorithm over edges, iteratively.
+
+        Args:
+            edges: Returns the plugins a plugin has an edge to.
+
+        Returns:
+            The strongly connected components, each component after the components it has edges to.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+
+        for root in self.plugins:
+            if root in index:
+                continue
+            work = [(root, iter(edges(root)))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                plugin, children = work[-1]
+                advanced = False
+                for child in children:
+                    if not (child in index):
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(edges(child))))
+                        advanced = True
+                        break
+                    elif child in on_stack:
+                        lowlink[plugin] = min(lowlink[plugin], index[child])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[plugin])
+                if lowlink[plugin] == index[plugin]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member is plugin:
+                            break
+                    components.append(component)
+        return components
+
+    @staticmethod
+    def _is_cycle(component, edges):
+        return len(component) > 1 or component[0] in edges(component[0])
+
+    def _build_order(self):
+        components = self._strongly_connected(self.requires)
+        self._order = [plugin for component in components for plugin in component]
+        self._cycles = [component for component in components if self._is_cycle(component, self.requires)]
+        for cycle in self._cycles:
+            logger.warning("Plugin dependency cycle: {}".format(", ".join(str(p) for p in cycle)))
+
+    def topological_order(self):
+        """Returns every plugin in the graph, each after the plugins it requires (except within cycles)."""
+        if self._order is None:
+            self._build_order()
+        return list(self._order)
+
+    def cycles(self):
+        """Returns the dependency cycles of the graph, as lists of the plugins in each cycle."""
+        if self._cycles is None:
+            self._build_order()
+        return [list(cycle) for cycle in self._cycles]
+
+    def has_cycles(self):
+        return len(self.cycles()) > 0
+
+    def _closures(self, cache, edges):
+        """Fills cache with the transitive closure of edges of every plugin.
+
+        The closure is computed once for each strongly connected component of edges, after the components it has
+        edges to, and every member of a component gets the same closure. The members of a cycle are in their own
+        closure, after the plugins the cycle has edges to outside of it.
+        """
+        if not cache:
+            for component in self._strongly_connected(edges):
+                closure = []
+                seen = set(component)
+                for member in component:
+                    for target in edges(member):
+                        if target in seen:
+                            continue
+                        for subtarget in cache[target]:
+                            if not (subtarget in seen):
+                                seen.add(subtarget)
+                                closure.append(subtarget)
+                        if not (target in seen):
+                            seen.add(target)
+                            closure.append(target)
+                if self._is_cycle(component, edges):
+                    closure.extend(component)
+                for member in component:
+                    cache[member] = closure
+        return cache
+
+    def _depends_of(self, plugin):
+        return self._depends[plugin]
+
+    def recursive_depends(self, plugin):
+        """Returns all of the plugins plugin depends on, transitively, each after the plugins it depends on."""
+        return list(self._closures(self._recursive_depends, self._depends_of)[plugin])
+
+    def required_imports(self, plugin):
+        """Returns the plugins plugin imports, each after the plugins it depends on."""
+        if not (plugin in self._required_imports):
+            closure = []
+            seen = set()
+            for plugin_import in self._imports[plugin]:
+                if not (plugin_import in seen):
+                    for dep in self.recursive_depends(plugin_import):
+                        if not (dep in seen):
+                            seen.add(dep)
+                            closure.append(dep)
+                    if not (plugin_import in seen):
+                        seen.add(plugin_import)
+                        closure.append(plugin_import)
+            self._required_imports[plugin] = closure
+        return list(self._required_imports[plugin])
+
+    def recursive_requires(self, plugin):
+        """Returns all of the plugins plugin requires, transitively. No order."""
+        return list(self._closures(self._recursive_requires, self.requires)[plugin])
+
+    def dependents(self, plugin):
+        """Returns the plugins which directly depend on or import plugin."""
+        return self._known(self._dependents.get(plugin, []))
+
+    def affected_by(self, plugins):
+        """Returns the plugins which must be rebuilt if any of plugins change, in topological order.
+
+        These are the given plugins and every plugin which requires them, transitively.
+        """
+        affected = set()
+        pending = [p for p in plugins if p in self]
+        while pending:
+            plugin = pending.pop()
+            if plugin in affected:
+                continue
+            affected.add(plugin)
+            pending.extend(self._dependents.get(plugin, []))
+        return [plugin for plugin in self.topological_order() if plugin in affected]
@@ -0,0 +1,84 @@
+"""core/effective_config.py
+@OffbyOneStudios 2014
+Caches the fully resolved config of plugins.
+"""
+
+import logging
+
+from ..config import *
+
+logger = logging.getLogger(__name__)
+
+class EffectiveConfigCache(object):
+    """Caches the fully resolved config stack of each plugin per command, modes and target platform.
+
+    Entries are keyed by (plugin id, command, modes, target platform). An entry is only
+    reused while the configs below the plugin (default, system, user, command and mode
+    configs) are the same objects, and while the plugin's description file is unchanged.
+    Otherwise it is rebuilt.
+    """
+    class Entry(object):
+        def __init__(self, base_configs, description_stamp, layer):
+            self.base_configs = base_configs
+            self.description_stamp = description_stamp
+            self.layer = layer
+
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _platform_key():
+        return frozenset(config_target.get_flat_config().items())
+
+    @classmethod
+    def make_key(cls, plugin_stub, base_configs):
+        """Returns the cache key of a plugin for a stack of base configs.
+
+        Args:
+            plugin_stub: The PluginStub the config is for.
+            base_configs: The list of configs the plugin's configs are merged on top of.
+        """
+        command = tuple(c.label for c in base_configs if isinstance(c, CommandConfig))
+        modes = tuple(c.label for c in base_configs if isinstance(c, ModeConfig))
+        return (plugin_stub.id, command, modes, cls._platform_key())
+
+    def get_layer(self, plugin_stub, base_layer, build_func):
+        """Returns the effective ConfigLayer of a plugin, building it if it is not cached.
+
+        Args:
+            plugin_stub: The PluginStub the config is for.
+            base_layer: The ConfigLayer the plugin's configs are merged on top of.
+            build_func: Builds the effective layer from base_layer when needed.
+
+        Returns:
+            A ConfigLayer.
+        """
+        base_configs = base_layer.get_configs()
+        key = self.make_key(plugin_stub, base_configs)
+        stamp = plugin_stub.description_stamp
+
+        entry = self._entries.get(key, None)
+        if not (entry is None) \
+                and entry.description_stamp == stamp \
+                and entry.base_configs == base_configs:
+            self.hits += 1
+            return entry.layer
+
+        self.misses += 1
+        layer = build_func(base_layer)
+        # Build the flat config now, so later readers share it.
+        layer.get_flat_config()
+        self._entries[key] = EffectiveConfigCache.Entry(base_configs, stamp, layer)
+        return layer
+
+    def invalidate(self, plugin_id=None):
+        """Removes the cached configs of a plugin, or of every plugin if plugin_id is None."""
+        if plugin_id is None:
+            self._entries = {}
+        else:
+            self._entries = {k: v for (k, v) in self._entries.items() if k[0] != plugin_id}
+
+    def __len__(self):
+        return len(self._entries)
@@ -7,7 +7,20 @@ import imp
 
 from .._base import *
 
+def stamp_files(paths):
+    """Returns a stamp of files, a json friendly list which changes whenever one of the files changes."""
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp.append([path, stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            stamp.append([path, None, None])
+    return stamp
+
 class PythonPluginStubFile(object):
+    metadata_keys = ["namespace", "version", "implementation_name", "language", "libraries", "depends", "imports", "executable"]
+
     def __init__(self, directory):
         """Default Constructor
         Args:
@@ -38,5 +51,24 @@ class PythonPluginStubFile(object):
     def plugin_description(self):
         return self._plugin
 
+    def get_description_files(self):
+        """Returns the paths of the files the plugin description is read from."""
+        return [self._py_module_file.path] + [f.path for f in self._plugin.description.source_files(self.directory)]
+
+    def get_description_stamp(self):
+        """Returns a value which changes whenever one of the plugin description files changes."""
+        return stamp_files(self.get_description_files())
+
+    def get_metadata(self):
+        """Returns a dictionary of the plugin's basic description values, those in metadata_keys."""
+        return {key: getattr(self._plugin, key, None) for key in self.metadata_keys}
+
+    def has_preloaded_ast(self):
+        return False
+
+    def get_preloaded_ast(self):
+        """Returns the already parsed MDL of the plugin, or None if it must be loaded from the description."""
+        return None
+
     def get_plugin_loader_files(self):
         return [self._py_module_file] + self._plugin.description.dependency_files(self.directory)
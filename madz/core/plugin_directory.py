@@ -6,14 +6,18 @@ import os
 import sys
 import traceback
 import logging
+import concurrent.futures
 
 from ..config import *
 from .. import fileman
 
 from .plugin_id import *
 from .plugin_stub import PluginStub
+from . import plugin_index
+from .plugin_index import PluginIndexDatabase, IndexedPluginStubFile
 
 from .plugin_description.python import PluginStubFile as PythonPluginStubFile # Temporary until plugin_description chooser is finished.
+from .plugin_description.python.file import stamp_files
 
 logger = logging.getLogger(__name__)
 
@@ -22,14 +26,28 @@ class PluginDirectory(object):
 
     Loads the description for each plugin and validates it against it's location in the directory.
     """
-    def __init__(self, directory):
+    def __init__(self, directory, use_index=True):
         """Constructor for PluginDirectory.
 
         Args:
             directory: Pathname of the directory.
+            use_index: If true, plugin descriptions are recorded in a PluginIndexDatabase in the directory's '.madz' folder, and are only reloaded when their files change.
         """
         self.directory = fileman.new(directory)
+        self.use_index = use_index
+        self._index_db = None
         self._plugin_stubs = {}
+        self._plugin_stubs_by_path = {}
+
+    def _get_index_db(self):
+        """Returns the index database of this directory, or None if it is not used or cannot be opened."""
+        if self.use_index and self._index_db is None:
+            try:
+                self._index_db = PluginIndexDatabase.for_directory(self.directory.path)
+            except Exception as exc:
+                logger.warning("Could not open plugin index for '{}', indexing without it: {}".format(self, exc))
+                self.use_index = False
+        return self._index_db
 
     def _add_plugin_stub(self, system, plugin_stub):
         """Adds a plugin stub to a system
@@ -39,51 +57,234 @@ class PluginDirectory(object):
             plugin_stub; The plugin stub to be added to the provided system.
         """
         self._plugin_stubs[plugin_stub.id] = plugin_stub
+        self._plugin_stubs_by_path[plugin_stub.directory.path] = plugin_stub
         system.add_plugin_stub(self, plugin_stub)
 
+    def _remove_plugin_stub(self, system, plugin_stub):
+        """Removes a plugin stub from this directory and a system.
+
+        Args:
+            system: The system to remove the plugin stub from.
+            plugin_stub; The plugin stub to be removed.
+        """
+        if self._plugin_stubs.get(plugin_stub.id, None) is plugin_stub:
+            del self._plugin_stubs[plugin_stub.id]
+        if self._plugin_stubs_by_path.get(plugin_stub.directory.path, None) is plugin_stub:
+            del self._plugin_stubs_by_path[plugin_stub.directory.path]
+        system.remove_plugin_stub(self, plugin_stub)
+
+    def _load_plugin_stub(self, system, root, file_pid, index_db, loaded=None):
+        """Makes the plugin stub of the plugin directory root.
+
+        Uses the results of a worker process if given. Otherwise reuses the index record of
+        the plugin when its description files are unchanged, or loads the description and records it.
+
+        Returns:
+            A (PluginStub, record) pair, record is None if no index is used.
+        """
+        directory = fileman.new(root)
+        if not (loaded is None):
+            record, ast = loaded
+            stub = PluginStub(system, IndexedPluginStubFile(directory, record, ast), file_pid)
+            if not (index_db is None):
+                index_db.set(root, record)
+            return (stub, record)
+
+        if not (index_db is None):
+            record = index_db.get(root)
+            if not (record is None) and record["stamp"] == stamp_files([f[0] for f in record["stamp"]]):
+                logger.debug("Reusing indexed plugin description '{}'".format(file_pid))
+                return (PluginStub(system, IndexedPluginStubFile(directory, record), file_pid), record)
+
+        # Generate description object
+        plugin_description = PythonPluginStubFile(directory)
+
+        # Make the stub
+        stub = PluginStub(system, plugin_description, file_pid)
+
+        record = None
+        if not (index_db is None):
+            record = IndexedPluginStubFile.make_record(plugin_description)
+        return (stub, record)
+
+    def _check_platform(self, stub, record, index_db):
+        """Checks the stub against the target platform, caching the result in the stub's index record."""
+        if record is None:
+            return stub.check_platform(config_target)
+
+        platform_key = plugin_index.platform_key()
+        if not (platform_key in record["platforms"]):
+            record["platforms"][platform_key] = bool(stub.check_platform(config_target))
+            index_db.set(stub.directory.path, record)
+        return record["platforms"][platform_key]
+
+    def _split_relative(self, path):
+        """Returns the components of path relative to this directory, or None if path is hidden or outside of it."""
+        relpath = os.path.relpath(path, self.directory.path)
+        splitrelpath = relpath.split(os.sep)
+
+        # Skips hidden directories
+        for d in splitrelpath:
+            if d.startswith('.'):
+                return None
+        return splitrelpath
+
+    def _walk_plugin_roots(self, top):
+        """Generates (path, relative path components) of the plugin directories at or below top, skipping hidden directories."""
+        for root, dirs, files in os.walk(top):
+            splitrelroot = self._split_relative(root)
+            if splitrelroot is None:
+                continue
+
+            if PythonPluginStubFile.can_load_directory(fileman.new(root)):
+                yield (root, splitrelroot)
+
+    def _is_unchanged(self, root):
+        """Returns true if the stub of the plugin directory root exists and its description files are unchanged."""
+        old_stub = self._plugin_stubs_by_path.get(root, None)
+        return not (old_stub is None) and old_stub.description_stamp == stamp_files([f[0] for f in old_stub.description_stamp])
+
+    def _index_plugin(self, system, partial_root, root, splitrelroot, index_db, loaded=None):
+        """Indexes the plugin in the directory root, reusing its stub if it has not changed.
+
+        Args:
+            loaded: The results of load_plugin_description for the plugin, if it was loaded by a worker process.
+        """
+        file_pid = None
+        try:
+            # Generate PluginID for directory
+            file_pid = PluginId.parse(".".join([partial_root] + splitrelroot))
+
+            # Reuse the existing stub if the plugin has not changed
+            old_stub = self._plugin_stubs_by_path.get(root, None)
+            if not (old_stub is None):
+                if self._is_unchanged(root):
+                    record = None if index_db is None else index_db.get(root)
+                    if self._check_platform(old_stub, record, index_db):
+                        system.add_plugin_stub(self, old_stub)
+                        return
+                self._remove_plugin_stub(system, old_stub)
+
+            logger.debug("Indexing plugin with file_pid '{}'".format(file_pid))
+
+            stub, record = self._load_plugin_stub(system, root, file_pid, index_db, loaded)
+
+            # Check platform to make sure the plugin is valid for the target:
+            if self._check_platform(stub, record, index_db):
+                # Add stub to directory (and system)
+                self._add_plugin_stub(system, stub)
+            else:
+                logger.debug("Plugin failed platform check '{}'".format(stub.id))
+        except:
+            # TODO(Mason): More specific exceptions
+            tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
+            logger.error("Plugin failed to load, ID per directory is '{}':\n\t{}".format(file_pid, tb_string))
+
+    def _forget_plugin(self, system, root, index_db):
+        """Removes the plugin which was in the directory root, if any."""
+        old_stub = self._plugin_stubs_by_path.get(root, None)
+        if not (old_stub is None):
+            logger.debug("Removing plugin '{}'".format(old_stub.id))
+            self._remove_plugin_stub(system, old_stub)
+        if not (index_db is None):
+            index_db.remove(root)
+
+    def _load_in_workers(self, roots):
+        """Loads the plugin descriptions and MDL of the plugin directories in a pool of worker processes.
+
+        Only used when OptionSystemIndexWorkers is more than one, and there is more than one plugin to load.
+
+        Returns:
+            A dictionary of plugin directory paths to load_plugin_description results, plugins which failed to load are left out.
+        """
+        workers = config.get(OptionSystemIndexWorkers)
+        if not workers or workers <= 1 or len(roots) <= 1:
+            return {}
+
+        logger.debug("Loading {} plugin descriptions with {} workers".format(len(roots), workers))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(roots))) as pool:
+                results = pool.map(plugin_index.load_plugin_description, roots, chunksize=max(1, len(roots) // (workers * 4)))
+                return {root: result for root, result in zip(roots, results) if not (result is None)}
+        except Exception as exc:
+            logger.warning("Failed to load plugin descriptions in workers, loading serially: {}".format(exc))
+            return {}
+
     def index_plugins(self, system, partial_root):
         """Indexes all the plugins in this directory, adding them to the system.
 
+        Plugins indexed before whose description files are unchanged keep their PluginStub.
+        Plugins which changed are reloaded, and plugins which are gone are removed from the system.
+
         Args:
             system: The system to add the indexed plugins to.
             partial_root: String prepended to plugin id strings before construction of PluginStubs. Used to place plugins in a specific subnamespace area.
         """
-        for root, dirs, files in os.walk(self.directory.path):
-            relroot = os.path.relpath(root, self.directory.path)
-            splitrelroot = relroot.split(os.sep)
-
-            # Skips hidden directories
-            hiddendir = False
-            for d in splitrelroot:
-                if d.startswith('.'):
-                    hiddendir = True
-            if hiddendir:
+        index_db = self._get_index_db()
+        found_paths = set()
+
+        plugin_roots = list(self._walk_plugin_roots(self.directory.path))
+        found_paths.update(root for root, splitrelroot in plugin_roots)
+
+        loaded = self._load_in_workers([root for root, splitrelroot in plugin_roots if not self._is_unchanged(root)])
+        for root, splitrelroot in plugin_roots:
+            self._index_plugin(system, partial_root, root, splitrelroot, index_db, loaded.get(root, None))
+
+        # Remove the plugins which no longer exist
+        for path, stub in list(self._plugin_stubs_by_path.items()):
+            if not (path in found_paths):
+                self._remove_plugin_stub(system, stub)
+        if not (index_db is None):
+            for path in index_db.paths():
+                if not (path in found_paths):
+                    index_db.remove(path)
+
+    def refresh_plugins(self, system, partial_root, paths):
+        """Re-indexes only the plugins affected by changes to the given paths.
+
+        A changed path affects the plugin directory containing it, and every plugin directory at or below it.
+
+        Args:
+            system: The system the plugins of this directory are indexed into.
+            partial_root: The partial root this directory was indexed with.
+            paths: The changed file and directory paths, paths outside of this directory are ignored.
+        """
+        roots = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            if path == self.directory.path:
+                # The whole directory may have changed
+                self.index_plugins(system, partial_root)
+                return
+            if not path.startswith(self.directory.path + os.sep) or self._split_relative(path) is None:
                 continue
 
-            if PythonPluginStubFile.can_load_directory(fileman.new(root)):
-                file_pid = None
-                try:
-                    # Generate PluginID for directory
-                    file_pid = PluginId.parse(".".join([partial_root] + splitrelroot))
-
-                    logger.debug("Indexing plugin with file_pid '{}'".format(file_pid))
-
-                    # Generate description object
-                    plugin_description = PythonPluginStubFile(fileman.new(root))
-
-                    # Make the stub
-                    stub = PluginStub(system, plugin_description, file_pid)
-
-                    # Check platform to make sure the plugin is valid for the target:
-                    if stub.check_platform(config_target):
-                        # Add stub to directory (and system)
-                        self._add_plugin_stub(system, stub)
-                    else:
-                        logger.debug("Plugin failed platform check '{}'".format(stub.id))
-                except:
-                    # TODO(Mason): More specific exceptions
-                    tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
-                    logger.error("Plugin failed to load, ID per directory is '{}':\n\t{}".format(file_pid, tb_string))
+            # Plugins at or below the path, which may be new, moved or removed
+            roots.update(known for known in self._plugin_stubs_by_path
+                if known == path or known.startswith(path + os.sep))
+            if os.path.isdir(path):
+                roots.update(root for root, splitrelroot in self._walk_plugin_roots(path))
+
+            # The plugin containing the path
+            directory = os.path.dirname(path)
+            while directory.startswith(self.directory.path + os.sep):
+                if directory in self._plugin_stubs_by_path or os.path.exists(os.path.join(directory, "__plugin__.py")):
+                    roots.add(directory)
+                    break
+                directory = os.path.dirname(directory)
+
+        index_db = self._get_index_db()
+        plugin_roots = []
+        for root in sorted(roots):
+            splitrelroot = self._split_relative(root)
+            if not (splitrelroot is None) and PythonPluginStubFile.can_load_directory(fileman.new(root)):
+                plugin_roots.append((root, splitrelroot))
+            else:
+                self._forget_plugin(system, root, index_db)
+
+        loaded = self._load_in_workers([root for root, splitrelroot in plugin_roots if not self._is_unchanged(root)])
+        for root, splitrelroot in plugin_roots:
+            self._index_plugin(system, partial_root, root, splitrelroot, index_db, loaded.get(root, None))
 
     def __str__(self):
         return str(self.directory.path)
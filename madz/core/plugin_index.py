@@ -0,0 +1,200 @@
+"""core/plugin_index.py
+@OffbyOneStudios 2014
+Provides a persistent index of plugin descriptions, so unchanged plugins need not be reloaded.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+from .. import fileman
+from ..version import version as madz_version
+
+logger = logging.getLogger(__name__)
+
+def platform_key():
+    """Returns a string identifying the current target platform, used to cache platform checks."""
+    from ..config import config_target
+    return repr(sorted(config_target.get_flat_config().items(), key=repr))
+
+class PluginIndexDatabase(object):
+    """A sqlite database of plugin description records, keyed by plugin directory path.
+
+    Each record holds the stamp of the plugin's description files, the stub metadata
+    (see PythonPluginStubFile.metadata_keys) and the results of the plugin's platform checks.
+    Records written by other versions of madz are ignored.
+
+    Attributes:
+        filename: The path of the database file.
+    """
+    format_version = 2
+
+    def __init__(self, filename):
+        """Opens (creating if needed) the index database.
+
+        Args:
+            filename: The path of the database file.
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS plugins (path TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+    @classmethod
+    def for_directory(cls, directory):
+        """Returns the index database of a plugin directory, it is kept in the directory's '.madz' folder."""
+        return cls(os.path.join(directory, ".madz", "plugin_index.sqlite"))
+
+    def _version_key(self):
+        return [self.format_version, madz_version]
+
+    def get(self, path):
+        """Returns the record of the plugin directory at path, or None if there is no usable record."""
+        with self._lock:
+            row = self._connection.execute("SELECT record FROM plugins WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        try:
+            record = json.loads(row[0])
+        except ValueError:
+            logger.warning("Ignoring corrupt plugin index record for '{}'.".format(path))
+            return None
+        if record.get("version") != self._version_key():
+            return None
+        return record
+
+    def set(self, path, record):
+        """Saves the record of the plugin directory at path."""
+        record = dict(record, version=self._version_key())
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO plugins (path, record) VALUES (?, ?)", (path, json.dumps(record)))
+
+    def remove(self, path):
+        """Removes the record of the plugin directory at path, if one exists."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM plugins WHERE path = ?", (path,))
+
+    def paths(self):
+        """Returns the plugin directory paths with records."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT path FROM plugins")]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class IndexedPluginStubFile(object):
+    """A plugin description loader backed by a PluginIndexDatabase record.
+
+    Has the same interface as PythonPluginStubFile, but only imports the plugin's '__plugin__.py'
+    once the full plugin description is actually needed.
+    """
+    def __init__(self, directory, record, ast=None):
+        """Default Constructor
+        Args:
+            directory: The fileman directory of the plugin.
+            record: The plugin's record in the PluginIndexDatabase.
+            ast: The plugin's MDL if it was already parsed, see load_plugin_description.
+        """
+        self._directory = directory
+        self._record = record
+        self._ast = ast
+        self._stub_file = None
+
+    @staticmethod
+    def make_record(plugin_stub_file):
+        """Builds the index record of a loaded plugin description loader."""
+        metadata = plugin_stub_file.get_metadata()
+        return {
+            "stamp": plugin_stub_file.get_description_stamp(),
+            "loader_files": [f.path for f in plugin_stub_file.get_plugin_loader_files()],
+            "metadata": {
+                "namespace": metadata["namespace"],
+                "version": None if metadata["version"] is None else str(metadata["version"]),
+                "implementation_name": metadata["implementation_name"],
+                "language": metadata["language"],
+                "libraries": list(metadata["libraries"] or []),
+                "depends": [str(d) for d in metadata["depends"] or []],
+                "imports": [str(i) for i in metadata["imports"] or []],
+                "executable": bool(metadata["executable"]),
+            },
+            "platforms": {},
+        }
+
+    @property
+    def record(self):
+        return self._record
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def loaded(self):
+        """True once the plugin's '__plugin__.py' has been imported."""
+        return not (self._stub_file is None)
+
+    @property
+    def plugin_description(self):
+        if self._stub_file is None:
+            from .plugin_description.python import PluginStubFile as PythonPluginStubFile
+            logger.debug("Loading indexed plugin description '{}'".format(self._directory.path))
+            self._stub_file = PythonPluginStubFile(self._directory)
+        return self._stub_file.plugin_description
+
+    def get_description_stamp(self):
+        return self._record["stamp"]
+
+    def get_metadata(self):
+        return dict(self._record["metadata"])
+
+    def has_preloaded_ast(self):
+        return not (self._ast is None)
+
+    def get_preloaded_ast(self):
+        """Returns the already parsed MDL of the plugin, or None.
+
+        It is only returned once, as MDL nodes are modified when a description is validated.
+        """
+        ast, self._ast = self._ast, None
+        return ast
+
+    def get_plugin_loader_files(self):
+        return [fileman.new(path) for path in self._record["loader_files"]]
+
+
+def load_plugin_description(path):
+    """Loads the plugin description in the directory path and parses its MDL, meant to be run in a worker process.
+
+    The platform check is made against the worker's target platform, under its platform key.
+
+    Args:
+        path: The plugin directory.
+
+    Returns:
+        A (record, ast) pair of picklable results, for IndexedPluginStubFile. None if the plugin failed to load, it
+        should then be loaded again in the parent process to report the error.
+    """
+    from ..config import config_target
+    from .plugin_description.python import PluginStubFile as PythonPluginStubFile
+    try:
+        directory = fileman.new(path)
+        stub_file = PythonPluginStubFile(directory)
+        plugin = stub_file.plugin_description
+
+        record = IndexedPluginStubFile.make_record(stub_file)
+        record["platforms"][platform_key()] = bool(getattr(plugin, "platform_check", lambda p: False)(config_target))
+
+        return (record, plugin.description.load(directory))
+    except Exception:
+        logger.debug("Worker failed to load plugin '{}'".format(path), exc_info=True)
+        return None
@@ -2,10 +2,22 @@
 @OffbyOne Studios 2013
 Manages plugin resolution.
 """
+import bisect
 import logging
 
+from .plugin_id import *
+
 logger = logging.getLogger(__name__)
 
+def version_key(version):
+    """Returns a sort key for a SemanticVersion following semver precedence. None sorts before any version.
+
+    Prereleases sort before their release, and build metadata is ignored.
+    """
+    if version is None:
+        return (0,)
+    return (1,) + version.sort_key
+
 class PluginFilter(object):
     """Object which can filter a PluginResolvers namespaces"""
     def __init__(self, reverse=False):
@@ -66,7 +78,7 @@ class ImplementationFilter(LambdaFilter):
     def __init__(self, implementation, reverse=False):
         self.implementation = implementation
         self.reverse = reverse
-        self.fn = lambda a: (self.implementation == a.id.implementation_name) != reverse
+        self.fn = lambda a: (self.implementation == a.id.implementation) != reverse
 
 
 class NamespaceFilter(LambdaFilter):
@@ -96,26 +108,32 @@ class VersionFilter(LambdaFilter):
     def __init__(self, version, reverse=False, op=eq):
         self.version = version
         self.reverse = reverse
-        self.fn =self._cmp(op)
-
-    def _cmp(self, other_version):
-        if self.op == self.eq:
-            return lambda a:((a.id.other_version == self.version) != self.reverse)
-        elif self.op == self.gt:
-            return lambda a:((a.id.other_version > self.version) != self.reverse)
-        elif self.op == self.lt:
-            return lambda a:((a.id.other_version < self.version) != self.reverse)
-        elif self.op == self.gteq:
-            return lambda a:((a.id.other_version >= self.version) != self.reverse)
-        elif self.op == self.lteq:
-            return lambda a:((a.id.other_version <= self.version) != self.reverse)
+        self.op = op
+        self.fn = self._cmp(op)
+
+    def _cmp(self, op):
+        version = version_key(self.version)
+        if op == self.eq:
+            return lambda a:((version_key(a.id.version) == version) != self.reverse)
+        elif op == self.gt:
+            return lambda a:((version_key(a.id.version) > version) != self.reverse)
+        elif op == self.lt:
+            return lambda a:((version_key(a.id.version) < version) != self.reverse)
+        elif op == self.gteq:
+            return lambda a:((version_key(a.id.version) >= version) != self.reverse)
+        elif op == self.lteq:
+            return lambda a:((version_key(a.id.version) <= version) != self.reverse)
         else:
-            return lambda a:((a.id.other_version != self.version) != self.reverse)
+            return lambda a:((version_key(a.id.version) != version) != self.reverse)
 
 
 class VersionOrderer(LambdaOrderer):
     def __init__(self, reverse=False):
-        self.fn = lambda a: a.id.version
+        self.fn = lambda a: version_key(a.id.version)
+        self.reverse = reverse
+
+    def sort(self, candidates):
+        return sorted(candidates, key=self.fn, reverse=self.reverse)
 
 
 class PluginResolverException(Exception):
@@ -124,9 +142,13 @@ class PluginResolverException(Exception):
 
 class PluginResolver(object):
     """Class to lookup PluginSystems based on namespaces
-    
+
+        Candidates of each namespace are kept sorted by version (see version_key), oldest first, so
+        version ranges are found by bisection. Resolved queries are cached until the plugins, filters
+        or aliases change.
+
         Attributes:
-            namespaces: Dictionary of namespaces
+            namespaces: Dictionary of namespaces to sorted lists of plugin stubs, or to aliased namespaces.
             plugin_stubs: List of plugin stubs
             filters: List of filters
     """
@@ -134,6 +156,12 @@ class PluginResolver(object):
         self.namespaces = {}
         self.plugin_stubs = set()
         self.filters = [IdentityPluginFilter()]
+        self._version_keys = {}
+        self._cache = {}
+
+    def _invalidate(self):
+        """Clears the resolution cache."""
+        self._cache = {}
 
     def add_filter(self, filter, index=None):
         """Adds a filter to the PluginResolver's filter list."""
@@ -141,6 +169,19 @@ class PluginResolver(object):
             self.filters.append(filter)
         else:
             self.filters[index] = filter
+        self._invalidate()
+
+    def _resolve_namespace(self, namespace):
+        """Follows aliases to the namespace holding the candidates."""
+        try:
+            target = self.namespaces[namespace]
+            if isinstance(target, str):
+                self.namespaces[target]
+                return target
+            return namespace
+        except KeyError as exc:
+            logger.error("Namespace:{} not found.".format(namespace))
+            raise PluginResolverException("Namespace:{} not found.".format(namespace)) from exc
 
     def _get_plugin(self, namespace):
         """Get Plugin by namespace.
@@ -153,14 +194,7 @@ class PluginResolver(object):
         Returns:
             plugin.PythonPluginStub object
         """
-        try:
-            if isinstance(self.namespaces[namespace],list):
-                return self.namespaces[namespace]
-            elif isinstance(self.namespaces[namespace], str):
-                return self.namespaces[self.namespaces[namespace]]
-        except KeyError as exc:
-            logger.error("Namespace:{} not found.".format(namespace))
-            raise PluginResolverException("Namespace:{} not found.".format(namespace)) from exc
+        return self.namespaces[self._resolve_namespace(namespace)]
 
     def add_plugin_stub(self, plugin_stub):
         """Add Plugin Stub to system.
@@ -173,8 +207,14 @@ class PluginResolver(object):
         namespace = plugin_stub.id.namespace
         if not (namespace in self.namespaces):
             self.namespaces[namespace] = []
+            self._version_keys[namespace] = []
 
-        self.namespaces[namespace].append(plugin_stub)
+        # Insert after plugins of the same version, keeping the order they were added in.
+        key = version_key(plugin_stub.id.version)
+        index = bisect.bisect_right(self._version_keys[namespace], key)
+        self.namespaces[namespace].insert(index, plugin_stub)
+        self._version_keys[namespace].insert(index, key)
+        self._invalidate()
 
     def remove_plugin_stub(self, plugin_stub):
         """Remove Plugin Stub from system.
@@ -187,9 +227,13 @@ class PluginResolver(object):
 
         self.plugin_stubs.remove(plugin_stub)
         namespace = plugin_stub.id.namespace 
-        self.namespaces[namespace].remove(plugin_stub)
+        index = self.namespaces[namespace].index(plugin_stub)
+        del self.namespaces[namespace][index]
+        del self._version_keys[namespace][index]
         if len(self.namespaces[namespace]) == 0:
             del self.namespaces[namespace]
+            del self._version_keys[namespace]
+        self._invalidate()
 
         return
         
@@ -210,23 +254,111 @@ class PluginResolver(object):
         if alias_name in self.namespaces:
             raise PluginResolverException("Cannot alias Namespace:{}. Namespace already exists.".format(namespace))
         self.namespaces[alias_name] = namespace
+        self._invalidate()
+
+    def get_plugins_in_range(self, namespace, lower=None, upper=None, include_lower=True, include_upper=False):
+        """Returns the plugins of a namespace with versions in a range, oldest first.
+
+        Args:
+            namespace: A named string of the plugins being searched for.
+            lower: The lowest SemanticVersion of the range, None for no lower bound.
+            upper: The highest SemanticVersion of the range, None for no upper bound.
+            include_lower: If true the range includes lower.
+            include_upper: If true the range includes upper.
+
+        Raises:
+            PluginResolverException if the namespace does not exist.
+        """
+        namespace = self._resolve_namespace(namespace)
+        keys = self._version_keys[namespace]
+
+        start, end = 0, len(keys)
+        if not (lower is None):
+            start = (bisect.bisect_left if include_lower else bisect.bisect_right)(keys, version_key(lower))
+        if not (upper is None):
+            end = (bisect.bisect_right if include_upper else bisect.bisect_left)(keys, version_key(upper))
+        return self.namespaces[namespace][start:end]
+
+    def _query_key(self, query):
+        """Splits a query into a (namespace, version) pair. Queries are namespaces, plugin id strings or PluginIds."""
+        if isinstance(query, PluginId):
+            return (query.namespace, query.version)
+        if "[" in query:
+            plugin_id = PluginId.parse(query)
+            return (plugin_id.namespace, plugin_id.version)
+        return (query, None)
+
+    def get_candidates(self, namespace):
+        """Returns the plugins of a namespace which pass the filters, in the order the filters leave them.
+
+        Raises:
+            PluginResolverException if the namespace does not exist.
+        """
+        key = ("candidates", self._resolve_namespace(namespace))
+        try:
+            return list(self._cache[key])
+        except KeyError:
+            pass
+
+        candidates = self._get_plugin(namespace)
+        for fil in self.filters:
+            candidates = fil.filter(candidates)
+        self._cache[key] = list(candidates)
+        return list(candidates)
+
+    @staticmethod
+    def _newest(candidates):
+        """Returns the first added of the newest candidates, from a list sorted by version, oldest first."""
+        newest_key = version_key(candidates[-1].id.version)
+        for candidate in candidates:
+            if version_key(candidate.id.version) == newest_key:
+                return candidate
 
     def get_plugin(self, namespace):
         """Returns a plugin from the Resolver for a provided namespace.
         
         Args:
-            namespace: A named string of the plugin being searched for
+            namespace: A named string of the plugin being searched for, a plugin id string or a PluginId. If a version is given only plugins with that version are candidates.
             
         Returns:
-            plugin.PythonPluginStub object
+            plugin.PythonPluginStub object, the first candidate left by a PluginOrderer if one is installed, otherwise
+            the newest candidate (the first added, if several share its version).
             
         Raises:
             PluginResolverException if the provided namespace contains no plugin stub.
         """
-        candidates = self._get_plugin(namespace)
+        key = self._query_key(namespace)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        namespace, version = key
+        if version is None:
+            candidates = self._get_plugin(namespace)
+        else:
+            candidates = self.get_plugins_in_range(namespace, version, version, include_upper=True)
+        ordered = False
         for fil in self.filters:
             candidates = fil.filter(candidates)
+            ordered = ordered or isinstance(fil, PluginOrderer)
             if candidates == []:
                 raise PluginResolverException("No candidates match query:{} for filters {}".format(namespace,self.filters))
 
-        return candidates[0]
+        plugin = candidates[0] if ordered else self._newest(candidates)
+        self._cache[key] = plugin
+        return plugin
+
+    def get_plugins(self, queries):
+        """Resolves many queries at once, see get_plugin.
+
+        Args:
+            queries: An iterable of namespaces, plugin id strings or PluginIds.
+
+        Returns:
+            A dictionary of each query to its plugin.PythonPluginStub object.
+
+        Raises:
+            PluginResolverException if any query has no plugin stub.
+        """
+        return {query: self.get_plugin(query) for query in queries}
@@ -16,6 +16,7 @@ from .. import language
 from .. import fileman
 from .files import *
 from .plugin_id import *
+from .dependency_graph import PluginDependencyGraph
 
 from ..MDL import description as pyMDL
 
@@ -23,6 +24,28 @@ logger = logging.getLogger(__name__)
 
 class PluginError(Exception): pass
 
+class PluginMdlLoader(pyMDL.IMdlLoader):
+    """Defers to the MDL loader of a plugin's description, so the description is only loaded when the MDL is."""
+    def __init__(self, plugin_stub):
+        self.plugin_stub = plugin_stub
+
+    def load(self, dir):
+        ast = self.plugin_stub.plugin_description_loader.get_preloaded_ast()
+        if ast is None:
+            ast = self.plugin_stub._get("description").load(dir)
+        return ast
+
+    def dependency_files(self, dir):
+        return self.plugin_stub._get("description").dependency_files(dir)
+
+    def unparsed_source(self, dir):
+        if self.plugin_stub.plugin_description_loader.has_preloaded_ast():
+            return None
+        return self.plugin_stub._get("description").unparsed_source(dir)
+
+    def source_files(self, dir):
+        return self.plugin_stub._get("description").source_files(dir)
+
 class PluginStub(object):
     """An object representing a python plugin description.
 
@@ -40,7 +63,8 @@ class PluginStub(object):
         loaded_depends: The plugins corresponding to depends. (Monkeypatched by init_requires)
         loaded_imports: The plugins corresponding to imports. (Monkeypatched by init_requires)
         loaded_requires: The plugins corresponding to requires. (Monkeypatched by init_requires)
-        description: Contains a PluginDescription object wrapping the MDL for this plugin. (Monkeypatched by init_requires)
+        description: Contains a MDLDescription object wrapping the MDL for this plugin. (Built on demand after init_requires)
+        description_stamp: Changes whenever the plugin description file changes.
         executable: True if this plugin is executable, false otherwise.
     """
     def __init__(self, system, plugin_description_loader, plugin_id):
@@ -50,10 +74,11 @@ class PluginStub(object):
         
         self._directory = plugin_description_loader.directory
         self._directory[File_ModuleEntity] = self
-        self._plugin = plugin_description_loader.plugin_description
+        self._plugin_description_loader = plugin_description_loader
         self._plugin_loader_files = plugin_description_loader.get_plugin_loader_files()
+        self.description_stamp = plugin_description_loader.get_description_stamp()
 
-        self._init_description(plugin_id)
+        self._init_description(plugin_id, plugin_description_loader.get_metadata())
 
         self.inited = False
 
@@ -61,6 +86,49 @@ class PluginStub(object):
     def directory(self):
         return self._directory
 
+    @property
+    def plugin_description_loader(self):
+        return self._plugin_description_loader
+
+    def _plugin():
+        doc = "The plugin description object, loaded on first use."
+        def fget(self):
+            return self._plugin_description_loader.plugin_description
+        return locals()
+    _plugin = property(**_plugin())
+
+    def config():
+        doc = "The plugin specific config from the plugin description."
+        def fget(self):
+            return self._try_get("config")
+        return locals()
+    config = property(**config())
+
+    def description():
+        doc = "The MDLDescription of the plugin, built on first use after init_requires. The MDL itself is only read once the ast is used."
+        def fget(self):
+            if self._description is None:
+                self._description = pyMDL.MDLDescription(PluginMdlLoader(self),
+                    dict((d.id.namespace, d.description) for d in self.loaded_depends),
+                    dir=self.directory)
+            return self._description
+        return locals()
+    description = property(**description())
+
+    def get_built_description(self):
+        """Returns the MDLDescription of the plugin if it has been built, otherwise None."""
+        return self._description
+
+    def language():
+        doc = "The language object of the plugin, built on first use."
+        def fget(self):
+            if self._language is None:
+                with config.and_merge(self.config):
+                    self._language = self.language_module.Language(self)
+            return self._language
+        return locals()
+    language = property(**language())
+
     def __str__(self):
         return "<PluginStub: {!s}>".format(self.id)
 
@@ -93,13 +161,18 @@ class PluginStub(object):
         except:
             return default
 
-    def _init_description(self, file_pid):
-        """Called in __init___, helper to initialize the Plugin Stub."""
+    def _init_description(self, file_pid, metadata):
+        """Called in __init___, helper to initialize the Plugin Stub.
+
+        Args:
+            file_pid: The PluginId given by the plugin's location.
+            metadata: The basic description values of the plugin, from the description loader's get_metadata.
+        """
         # Determine the plugin id from the description file:
         desc_pid = PluginId(
-            self._try_get("namespace"),
-            SemanticVersion.parse(self._try_get("version")),
-            self._try_get("implementation_name"))
+            metadata.get("namespace"),
+            SemanticVersion.parse(metadata.get("version")),
+            metadata.get("implementation_name"))
 
         # Verify the plugin id from the file name and description file are compatible
         if not desc_pid.compatible(file_pid):
@@ -109,24 +182,23 @@ class PluginStub(object):
         self.id = desc_pid.merge(file_pid)
 
         # Get language stuff:
-        self.language_name = self._get("language")
+        self.language_name = metadata["language"]
         self.language_module = language.get_language(self.language_name)
 
-        self.libraries = self._get("libraries")
+        self.libraries = metadata["libraries"]
 
-        # Save the plugin specific configs
+        # The plugin specific configs (self.config) are read from the description on demand.
         # These merges must obey config load order:
         # * Default language config base incase no other config is available
         # * System config contains the correct order for: Default -> User -> System
         # * Plugin config is the config from the plugin descriptions
-        self.config = self._try_get("config")
 
-        # Build and save the language object for the plugin
-        with config.and_merge(self.config):
-            self.language = self.language_module.Language(self)
+        # The language object for the plugin is built on demand (self.language)
+        self._language = None
+        self._description = None
 
         # Initialize depends names:
-        depends = self._try_get("depends")
+        depends = metadata.get("depends") or []
         self.depends = []
         for dep in depends:
             try:
@@ -135,7 +207,7 @@ class PluginStub(object):
                 pass # TODO(Mason): Resuming error messages
 
         # Initialize imports names:
-        imports = self._try_get("imports")
+        imports = metadata.get("imports") or []
         self.imports = []
         for imp in imports:
             try:
@@ -146,14 +218,14 @@ class PluginStub(object):
         # Build requirements names
         self.requires = self.depends + self.imports
 
-        self.executable = self._try_get("executable", False)
+        self.executable = bool(metadata.get("executable", False))
 
     def check_platform(self, target_platform):
         """Calls the check platform function, if one does not exist returns false."""
         return self._try_get("platform_check", lambda p: False)(target_platform)
 
     def init_requires(self, lookup_func):
-        """This initalizes the requires into *_loaded variables by finding the concrete PluginStub objects. Also validates the MDL.
+        """This initalizes the requires into *_loaded variables by finding the concrete PluginStub objects. The MDL is loaded and validated on demand.
 
         This monkeypatches the object with new variables."""
         # New empty mokey-pached variable.
@@ -169,79 +241,58 @@ class PluginStub(object):
         # Construct loaded requires
         self.loaded_requires = self.loaded_depends + self.loaded_imports
 
-        # Build and save the plugin's MDL:
-        with config.and_merge(self.config):
-            ast = self._try_get("description")
-            self.description = pyMDL.MDLDescription(ast, 
-                dict((d.id.namespace, d.description) for d in self.loaded_depends),
-                dir=self.directory)
+        # The plugin's MDL is built on demand (self.description)
+        self._description = None
 
         # Validate the plugin description, and use it's return as whether we succeded or not.
         return True
 
     @contextlib.contextmanager
     def and_configs(self):
-        """"""
-        # Copy state to restore later
-        old_state = config.copy_state()
+        """Uses this plugin's effective config for the duration of the with block.
+
+        The effective config is this plugin's config, it's library configs, and it's language config merged onto the current config. It is cached by the system per command, modes and target platform.
+
+        Yields:
+            The effective config as a FlatConfig of option keys to values.
+        """
+        layer = self.system.effective_configs.get_layer(self, config.copy_state(), self._build_config_layer)
+        with config.and_layer(layer):
+            yield layer.get_flat_config()
 
+    def _build_config_layer(self, base_layer):
+        """Builds the effective config layer of this plugin on top of base_layer."""
         # Merge in this plugin's config
-        with config.and_merge(self.config):
-            # Generate the config to pull the lib configs from (speed and safety)
-            config_for_libs = config.get_merged_config()
+        layer = base_layer.push(self.config)
 
-            # Add the library configs
-            for library in self.libraries:
-                config.add(config_for_libs.get_option(LibraryConfig.make_key(library)))
+        # Generate the config to pull the lib configs from (speed and safety)
+        config_for_libs = layer.get_merged_config()
 
-            # Merge in the language's config
-            with config.and_merge(config.get_option(LanguageConfig.make_key(self.language_name))):
-                yield
+        # Add the library configs
+        for library in self.libraries:
+            layer = layer.push(config_for_libs.get_option(LibraryConfig.make_key(library)))
 
-        # Safely restore the config object
-        config.set_state(old_state)
+        # Merge in the language's config
+        return layer.push(layer.get_merged_config().get_option(LanguageConfig.make_key(self.language_name)))
+
+    def _dependency_graph(self):
+        """The system's dependency graph, or a graph of just this plugin's requirements if the system doesn't have this plugin."""
+        graph = self.system.dependency_graph()
+        if not (self in graph):
+            graph = PluginDependencyGraph([self])
+        return graph
 
     def gen_recursive_loaded_depends(self):
         """Generates a list of all dependencies. In orderish."""
-        
-        # new list to return
-        new_list = []
-        for dep in self.loaded_depends:
-            # inspect recursive subdepends for depends candidates 
-            subdeps = dep.gen_recursive_loaded_depends()
-            for subdep in subdeps:
-                # Add new dependencies 
-                if not(subdep in new_list):
-                    new_list.append(subdep)
-            # Add this plugin's depedencies.
-            if not(dep in new_list):
-                new_list.append(dep)
-                
-        return new_list
+        return self._dependency_graph().recursive_depends(self)
 
     def gen_required_loaded_imports(self):
         """Generates a list of all imports. In orderish."""
-        imports_list = []
-        for plugin_import in self.loaded_imports:
-            if plugin_import not in imports_list:
-                for p in plugin_import.gen_recursive_loaded_depends():
-                    if p not in imports_list:
-                        imports_list.append(p)
-                imports_list.append(plugin_import)
-        return imports_list
+        return self._dependency_graph().required_imports(self)
 
     def gen_recursive_loaded_requires(self):
         """Generates a list of all requirements. No order."""
-        requires_list = []
-        new_list = self.loaded_requries
-        while not (len(new_list) == 0):
-            requires_list.extend(new_list)
-            new_list = []
-            for lreq in requires_list:
-                for lreqreqs in lreq.loaded_requries:
-                    if not (lreqreqs in requires_list or lreqreqs in new_list):
-                        new_list.append(lreqreqs)
-        return requires_list
+        return self._dependency_graph().recursive_requires(self)
 
     def get_plugin_id(self):
         """Returns the PluginId described by the description file."""
@@ -252,14 +303,10 @@ class PluginStub(object):
 
     #TODO: Place on artifact class
     def get_function_index(self, name):
-        func_loc = -1
-        for i, n in enumerate(self.description.definitions()):
-            if n.name == name:
-                func_loc = i
-
-        if func_loc == -1:
+        try:
+            return self.description.get_definition_index(name)
+        except KeyError:
             raise KeyError("Function of name '{}' not found".format(name))
-        return func_loc
 
     #TODO: Place on artifact class
     def output_file_location(self):
@@ -2,37 +2,86 @@
 @OffbyOne Studios 2013
 Class object for manipulating Semantic Versions
 """
+import functools
+
+def _identifier_key(identifier):
+    """Numeric prerelease identifiers compare as numbers, and before alphanumeric identifiers, which compare as strings."""
+    return (0, int(identifier), "") if identifier.isdigit() else (1, 0, identifier)
+
+def _number(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise SemanticVersion.SemanticVersionParseError("Incorrect formatting of {} version number: {!r}".format(name, value))
 
 class SemanticVersion(object):
     """A Semantic Version object for a plugin, as defined by version 2.0.0 on semver.org :
         http://semver.org/spec/v2.0.0.html
-    
+
+    SemanticVersions are immutable, as parsed versions are shared, see SemanticVersion.parse. They are ordered by
+    semver precedence using sort_key, which is computed once. Versions differing only by metadata are equal.
+
     Args:
         major: The major version number. (*1*.0.0)
         minor: The minor version number. (1.*0*.0)
         patch: The patch number (1.0.*0*)
-        prerelease: The prerelease number, if applicable (1.0.0*+40*)
+        prerelease: The prerelease number, if applicable (1.0.0*-40*)
         metadata: Any relevant metadata to the version number.
+
+    Attributes:
+        sort_key: A tuple ordered by semver precedence.
     """
+    __slots__ = ("major", "minor", "patch", "prerelease", "metadata", "sort_key", "_hash")
+
+    # The number of parsed strings kept by SemanticVersion.parse
+    parse_cache_size = 4096
 
     def __init__(self, major , minor, patch, prerelease = None, metadata = None):
-        """Initializes a SemVer object. Defaults to version number 0.0.0 if no information is provided."""
-        self.major = major
-        self.minor = minor
-        self.patch = patch
-        self.prerelease = prerelease
-        self.metadata = metadata
+        """Initializes a SemVer object. Version numbers may be given as ints or as strings of digits."""
+        if prerelease == "":
+            prerelease = None
+        major = _number(major, "major")
+        minor = _number(minor, "minor")
+        patch = _number(patch, "patch")
+
+        if prerelease is None:
+            prerelease_key = (1,)
+        else:
+            prerelease = str(prerelease)
+            prerelease_key = (0,) + tuple(_identifier_key(i) for i in prerelease.split("."))
+        sort_key = (major, minor, patch, prerelease_key)
+
+        set_slot = object.__setattr__
+        set_slot(self, "major", major)
+        set_slot(self, "minor", minor)
+        set_slot(self, "patch", patch)
+        set_slot(self, "prerelease", prerelease)
+        set_slot(self, "metadata", metadata)
+        set_slot(self, "sort_key", sort_key)
+        set_slot(self, "_hash", hash(sort_key))
 
     class SemanticVersionParseError(Exception):
         pass
 
+    def __setattr__(self, name, value):
+        raise AttributeError("SemanticVersion is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError("SemanticVersion is immutable.")
+
+    def __reduce__(self):
+        return (self.__class__, (self.major, self.minor, self.patch, self.prerelease, self.metadata))
+
     @classmethod
     def parse(cls, string):
         """Parses a string to return its SemVer object.
-        
+
+        Parsed versions are interned, parsing the same string again returns the same object while it is among the
+        last parse_cache_size strings parsed.
+
         Args:
             string: A string representation of the SemVer object.
-            
+
         Returns:
             A SemanticVersion object.
         """
@@ -43,6 +92,10 @@ class SemanticVersion(object):
         elif not isinstance(string, str):
             raise TypeError("Provided input is not a string")
 
+        return _parse_interned(cls, string)
+
+    @classmethod
+    def _parse_string(cls, string):
         optargs = {}
 
         # Extract the metadata
@@ -66,91 +119,56 @@ class SemanticVersion(object):
         # Extract the version data
         data = data[0].split('.')
 
-        if len(data) != 3:
+        if len(data) != 3 or not all(d.isdigit() for d in data):
             raise cls.SemanticVersionParseError("Incorrect formatting of version numbers: {}".format(data))
 
         return cls(*data,**optargs)
 
     def __hash__(self):
-        return hash((self.major, self.minor, self.patch, self.prerelease))
+        return self._hash
 
     # Comparison Operators
 
     def same_version_numbers(self, other):
         """Ignoring the prerelease version, returns true if the two SemVer objects have the same
             version numbers."""
-        if self.major == other.major and \
-           self.minor == other.minor and \
-           self.patch == other.patch:
-            return True
-        else:
-            return False
-
+        return self.sort_key[:3] == other.sort_key[:3]
 
     def __eq__(self, other):
         """Compares two SemVer objects for equality, returns true if equal and false otherwise."""
-        if self.same_version_numbers(other) and \
-           self.prerelease == other.prerelease:
-            return True
-        else:
-            return False
-
+        if not isinstance(other, SemanticVersion):
+            return NotImplemented
+        return self.sort_key == other.sort_key
 
     def __ne__(self, other):
         """Compares two SemVer objects for equality, returns true if not equal and false otherwise."""
-        return not (self == other)
-
+        if not isinstance(other, SemanticVersion):
+            return NotImplemented
+        return self.sort_key != other.sort_key
 
     def __lt__(self, other):
-        """Compares two SemVer objects for equality, returns true if the left hand object is less
-            than the right hand object and false otherwise."""
-        if self.major <= other.major and \
-           self.minor <= other.minor and \
-           self.patch <= other.patch:
-            if not self.same_version_numbers(other):
-                return True
-            else:
-                if not self.prerelease and not other.prerelease:
-                    return False
-                elif self.prerelease and other.prerelease:
-                    return self.prerelease < other.prerelease
-                elif self.prerelease:
-                    return True
-
-        return False
-
+        """Returns true if the left hand object has lower precedence than the right hand object."""
+        if not isinstance(other, SemanticVersion):
+            return NotImplemented
+        return self.sort_key < other.sort_key
 
     def __gt__(self, other):
-        """Compares two SemVer objects for equality, returns true if the left hand object is greater
-            than the right hand object and false otherwise."""
-        if self.major >= other.major and \
-           self.minor >= other.minor and \
-           self.patch >= other.patch:
-            if not self.same_version_numbers(other):
-                return True
-            else:
-                if not self.prerelease and not other.prerelease:
-                    return False
-                elif self.prerelease and other.prerelease:
-                    return self.prerelease > other.prerelease
-                elif self.prerelease:
-                    return False
-                else:
-                    return True
-
-        return False
-
+        """Returns true if the left hand object has higher precedence than the right hand object."""
+        if not isinstance(other, SemanticVersion):
+            return NotImplemented
+        return self.sort_key > other.sort_key
 
     def __le__(self, other):
-        """Compares two SemVer objects for equality, returns true if the left hand object is less
-            than or equal to the right hand object and false otherwise."""
-        return not (self > other)
-
+        """Returns true if the left hand object has lower or the same precedence as the right hand object."""
+        if not isinstance(other, SemanticVersion):
+            return NotImplemented
+        return self.sort_key <= other.sort_key
 
     def __ge__(self, other):
-        """Compares two SemVer objects for equality, return true if the left hand object is greater
-            than or equal to the right hand object and false otherwise."""
-        return not (self < other)
+        """Returns true if the left hand object has higher or the same precedence as the right hand object."""
+        if not isinstance(other, SemanticVersion):
+            return NotImplemented
+        return self.sort_key >= other.sort_key
 
     # String Represenation
 
@@ -170,10 +188,13 @@ class SemanticVersion(object):
             self.major,
             self.minor,
             self.patch,
-            ", prerelease={}".format(self.prerelease) if not (self.prerelease is None) else "",
-            ", metadata={}".format(self.metadata) if not (self.metadata is None) else "",
+            ", prerelease={!r}".format(self.prerelease) if not (self.prerelease is None) else "",
+            ", metadata={!r}".format(self.metadata) if not (self.metadata is None) else "",
         )
 
+_parse_interned = functools.lru_cache(maxsize=SemanticVersion.parse_cache_size)(
+    lambda cls, string: cls._parse_string(string))
+
 """
 #Example usage of Semantic Versioning
 
@@ -182,11 +203,11 @@ semver2 = SemanticVersion.parse("1.0.0+42")
 
 if same_version_number(semver, semver2):
     pass
-    
+
 if semver >= semver2:
     pass
-    
+
 print semver
 
 semstr = str(semver)
-"""
\ No newline at end of file
+"""
@@ -7,11 +7,17 @@ import os
 import sys
 import copy
 import logging
+import threading
 import traceback
+import contextvars
 
+from ..config import *
 from ..config import system
 from .plugin_stub import *
 from .plugin_resolver import PluginResolver
+from .effective_config import EffectiveConfigCache
+from .dependency_graph import PluginDependencyGraph
+from .version_solver import PluginVersionSolver, VersionConflict, id_satisfied_by
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +40,24 @@ class PluginSystem(object):
         # TODO: Use config system to generate:
         self.plugin_resolver = PluginResolver()
 
+        self.effective_configs = EffectiveConfigCache()
+
+        # Guards changes to the indexed plugins, held while indexing and while a watcher refreshes plugins.
+        self.lock = threading.RLock()
+        # The active plugins of each thread and asyncio task, so a watcher refreshing the plugins, or another command,
+        # doesn't change them in the middle of a command.
+        self._active_plugins = contextvars.ContextVar("madz.PluginSystem.active_plugins", default=None)
+        # Set by a PluginSystemWatcher which keeps this system up to date.
+        self.watcher = None
+        self._indexed_directories = None
+
+        self._dependency_graph = None
+
+        # Incremented whenever plugin stubs are added or removed, version solutions are cached per generation.
+        self.generation = 0
+        self._version_solutions = {}
+        self._init_assignment = None
+
     def add_directory(self, directory, partial_root=""):
         """Adds a PluginDirectory to the list of directories to retrieve plugins from.
 
@@ -66,6 +90,8 @@ class PluginSystem(object):
             return
         self._plugin_stubs.add((plugin_stub, directory))
         self.plugin_resolver.add_plugin_stub(plugin_stub)
+        self._dependency_graph = None
+        self.generation += 1
 
     def remove_plugin_stub(self, directory, plugin_stub):
         """Remove plugin_stub to the system, only PluginDirectories or virtual plugin providers should call this function.
@@ -78,6 +104,52 @@ class PluginSystem(object):
             return
         self._plugin_stubs.remove((plugin_stub, directory))
         self.plugin_resolver.remove_plugin_stub(plugin_stub)
+        self.effective_configs.invalidate(plugin_stub.id)
+        self._dependency_graph = None
+        self.generation += 1
+
+    def dependency_graph(self):
+        """Returns the PluginDependencyGraph of the plugins in the system, built once the plugins change."""
+        with self.lock:
+            if self._dependency_graph is None:
+                self._dependency_graph = PluginDependencyGraph(plugin for plugin, directory in self._plugin_stubs)
+            return self._dependency_graph
+
+    def description_report(self):
+        """Reports how many plugin MDL descriptions have been materialized, as descriptions are only loaded on demand.
+
+        Returns:
+            A dictionary with the number of "plugins", and how many of their descriptions were "materialized" (loaded) and "validated".
+        """
+        report = {"plugins": 0, "materialized": 0, "validated": 0}
+        for plugin_stub in self.all_plugins():
+            report["plugins"] += 1
+            description = plugin_stub.get_built_description()
+            if not (description is None):
+                report["materialized"] += description.is_materialized()
+                report["validated"] += description.is_validated()
+        return report
+
+    def preload_descriptions(self, plugins, workers=None):
+        """Parses the MDL of plugins, and of the plugins they require, in a batch, see MDLDescription.preload_all.
+
+        Args:
+            plugins: The plugins whose descriptions are about to be used.
+            workers: The number of worker processes, OptionSystemParseWorkers by default.
+
+        Returns:
+            The number of descriptions preloaded.
+        """
+        if workers is None:
+            workers = config.get(OptionSystemParseWorkers)
+
+        graph = self.dependency_graph()
+        preload = []
+        for plugin in plugins:
+            for required in [plugin] + (graph.recursive_requires(plugin) if plugin in graph else []):
+                if not (required in preload):
+                    preload.append(required)
+        return pyMDL.MDLDescription.preload_all([plugin.description for plugin in preload], workers=workers)
 
     def resolve_plugin(self, string):
         """Retrieve a plugin by namespace.
@@ -91,13 +163,17 @@ class PluginSystem(object):
         return self.plugin_resolver.get_plugin(string)
 
     def resolve_plugins(self, plugin_strings):
-        return map(self.resolve_plugin, plugin_strings)
+        """Retrieve many plugins at once, see resolve_plugin."""
+        plugin_strings = list(plugin_strings)
+        resolved = self.plugin_resolver.get_plugins(plugin_strings)
+        return [resolved[string] for string in plugin_strings]
 
     def all_plugins(self):
-        return map(lambda p: p[0], self._plugin_stubs)
+        with self.lock:
+            return [plugin_stub for plugin_stub, directory in self._plugin_stubs]
 
     def set_active_plugins(self, plugins, add_depends=False, add_requires=False):
-        """Sets the active plugins of the PluginSystem object to the provided plugins list.
+        """Sets the active plugins of the PluginSystem object to the provided plugins list, for this thread or task.
         
         Args:
             plugins: A list of plugins
@@ -123,41 +199,161 @@ class PluginSystem(object):
 
         plugins = list(set(plugins))
 
-        self._active_plugins = list(plugins)
+        self._active_plugins.set(list(plugins))
         return plugins
 
     def revert_active_plugins(self):
-        """Sets all plugins in the universe to active plugins."""
-        self._active_plugins = list(self.all_plugins())
+        """Sets all plugins in the universe to active plugins, for this thread or task."""
+        self._active_plugins.set(self.all_plugins())
 
     def active_plugins(self):
-        """Returns a list of the active plugins in the system."""
-        return list(self._active_plugins)
+        """Returns a list of the active plugins in the system, for this thread or task, by default all plugins."""
+        active_plugins = self._active_plugins.get()
+        if active_plugins is None:
+            return self.all_plugins()
+        return list(active_plugins)
+
+    def solve_versions(self, roots=None):
+        """Chooses one version of each required namespace, treating the versions in depends and imports as constraints.
+
+        Solutions are cached until plugin stubs are added or removed.
+
+        Args:
+            roots: PluginIds or plugin id strings which must be satisfied, by default every namespace in the system.
+
+        Returns:
+            A dictionary of namespaces to the chosen PluginStub.
 
-    def _init_plugin(self, plugin):
+        Raises:
+            VersionConflict if no consistent choice of versions exists.
+        """
+        if roots is None:
+            roots = [PluginId(namespace, None, None) for namespace, candidates in self.plugin_resolver.namespaces.items()
+                if isinstance(candidates, list)]
+        key = frozenset(str(root) for root in roots)
+
+        cached = self._version_solutions.get(key, None)
+        if not (cached is None) and cached[0] == self.generation:
+            return cached[1]
+
+        solver = PluginVersionSolver(self.plugin_resolver)
+        assignment = solver.solve(roots)
+        logger.debug("Solved versions of {} namespaces in {} steps.".format(len(assignment), solver.steps))
+        self._version_solutions = {key: (self.generation, assignment)}
+        return assignment
+
+    def _make_resolve_func(self):
+        """Returns the function used to resolve the PluginIds of depends and imports while initializing plugins."""
+        if not config.get(OptionSystemSolveVersions):
+            return lambda id: self.plugin_resolver.get_plugin(id.namespace)
+
+        try:
+            assignment = self.solve_versions()
+        except VersionConflict as exc:
+            logger.error("Failed to solve plugin versions, resolving the newest compatible versions instead: {}".format(exc))
+            assignment = {}
+
+        # Plugins initialized against a different solution must be initialized again.
+        if not (self._init_assignment is None) and self._init_assignment != assignment:
+            for plugin_stub, directory in self._plugin_stubs:
+                plugin_stub.inited = False
+        self._init_assignment = assignment
+
+        def resolve_func(required_id):
+            chosen = assignment.get(required_id.namespace, None)
+            if not (chosen is None) and id_satisfied_by(required_id, chosen):
+                return chosen
+            # Plugins left out of the solution get the newest compatible version.
+            for candidate in reversed(self.plugin_resolver.get_candidates(required_id.namespace)):
+                if id_satisfied_by(required_id, candidate):
+                    return candidate
+            return self.plugin_resolver.get_plugin(required_id.namespace)
+        return resolve_func
+
+    def _init_plugin(self, plugin, resolve_func=None):
         """Private function called in PluginSystem.index"""
-        resolve_func = lambda id: self.plugin_resolver.get_plugin(id.namespace)
+        if resolve_func is None:
+            resolve_func = self._make_resolve_func()
 
         if not(plugin.inited):
             for dep_id in plugin.depends:
-                self._init_plugin(resolve_func(dep_id))
+                self._init_plugin(resolve_func(dep_id), resolve_func)
 
             if not plugin.init_requires(resolve_func):
                 logger.error("Plugin {} failed to load.".format(plugin.id))
             plugin.inited = True
+            self._dependency_graph = None
 
-    def index(self):
-        """Searches all PluginDirectory objects for plugins and indexs them into the universe."""
-        for directory, partial_root in self.directories:
-            logger.debug("Indexing plugins from '{}' into '{}'".format(directory, partial_root))
-            directory.index_plugins(self, partial_root)
+    def _reset_stale_plugins(self):
+        """Marks plugins as uninitialized if any of their requirements were replaced or removed since they were initialized."""
+        current = set(id(plugin_stub) for plugin_stub, directory in self._plugin_stubs)
+        stale = {}
 
+        def is_stale(plugin):
+            if not (id(plugin) in stale):
+                stale[id(plugin)] = False
+                if plugin.inited:
+                    stale[id(plugin)] = any(
+                        not (id(req) in current) or is_stale(req) for req in plugin.loaded_requires)
+            return stale[id(plugin)]
+
+        for plugin_stub, directory in self._plugin_stubs:
+            if is_stale(plugin_stub):
+                logger.debug("Reinitializing plugin '{}'".format(plugin_stub))
+                plugin_stub.inited = False
+
+    def _init_plugins(self):
+        """Initializes the plugins which are not yet initialized."""
+        resolve_func = self._make_resolve_func()
         for plugin_stub, directory in self._plugin_stubs:
+            if plugin_stub.inited:
+                continue
             logger.debug("Initializing plugin '{}'".format(plugin_stub))
             try:
-                self._init_plugin(plugin_stub)
+                self._init_plugin(plugin_stub, resolve_func)
             except:
                 tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
                 logger.error("Plugin failed to init: '{}':\n\t{}".format(plugin_stub, tb_string))
 
-        self.revert_active_plugins()
\ No newline at end of file
+    def index(self):
+        """Searches all PluginDirectory objects for plugins and indexs them into the universe.
+
+        Plugins which are unchanged since the last index keep their state, plugins depending on changed plugins are reinitialized.
+        """
+        with self.lock:
+            for directory, partial_root in self.directories:
+                logger.debug("Indexing plugins from '{}' into '{}'".format(directory, partial_root))
+                directory.index_plugins(self, partial_root)
+
+            self._reset_stale_plugins()
+            self._init_plugins()
+
+            self.revert_active_plugins()
+            self._indexed_directories = list(self.directories)
+
+    def refresh(self, paths):
+        """Re-indexes only the plugins affected by changes to the given file and directory paths.
+
+        Plugins depending on changed plugins are reinitialized, so their MDL descriptions are rebuilt.
+
+        Args:
+            paths: The changed paths.
+        """
+        paths = list(paths)
+        with self.lock:
+            for directory, partial_root in self.directories:
+                directory.refresh_plugins(self, partial_root, paths)
+
+            self._reset_stale_plugins()
+            self._init_plugins()
+
+            self.revert_active_plugins()
+
+    def ensure_indexed(self):
+        """Indexes the system, unless a watcher is keeping the index of every directory up to date."""
+        with self.lock:
+            if self.watcher is None or not self.watcher.is_watching() \
+                    or self._indexed_directories != self.directories:
+                self.index()
+            else:
+                self.revert_active_plugins()
@@ -0,0 +1,221 @@
+"""core/version_solver.py
+@OffbyOneStudios 2014
+Chooses a consistent set of plugin versions for a plugin graph.
+"""
+
+import logging
+
+from .plugin_id import *
+from .plugin_resolver import PluginResolverException, version_key
+
+logger = logging.getLogger(__name__)
+
+def version_satisfies(required, version):
+    """Returns true if version satisfies a required version, following semver compatibility.
+
+    A compatible version has the same major version (and minor version, for 0.x versions) and is no older than the
+    required version. Any version, or no version, satisfies a required version of None.
+
+    Args:
+        required: The SemanticVersion given by a depends or imports, or None.
+        version: The SemanticVersion of a candidate plugin, or None.
+    """
+    if required is None:
+        return True
+    if version is None:
+        return False
+    if required.major != version.major:
+        return False
+    if required.major == 0 and required.minor != version.minor:
+        return False
+    return version.sort_key >= required.sort_key
+
+def id_satisfied_by(required_id, plugin_stub):
+    """Returns true if plugin_stub satisfies the version and implementation of the PluginId required_id."""
+    if not (required_id.implementation is None) and required_id.implementation != plugin_stub.id.implementation:
+        return False
+    return version_satisfies(required_id.version, plugin_stub.id.version)
+
+
+class VersionConflict(PluginResolverException):
+    """Raised when no consistent set of plugin versions exists.
+
+    Attributes:
+        namespace: The namespace which could not be satisfied.
+        requirements: The (PluginId, required by PluginStub or None) pairs on the namespace when it failed.
+    """
+    def __init__(self, namespace, requirements):
+        self.namespace = namespace
+        self.requirements = requirements
+        super().__init__("No version of '{}' satisfies: {}".format(namespace,
+            ", ".join("{} (from {})".format(required_id, "root" if source is None else source) for required_id, source in requirements)))
+
+
+class PluginVersionSolver(object):
+    """Picks one plugin version per namespace, such that every picked plugin's depends and imports are satisfied.
+
+    Versions given in depends and imports are constraints, see version_satisfies. Newer versions are preferred.
+    The search backtracks iteratively, choosing the namespace with the fewest remaining candidates first.
+    The candidates left by each set of constraints are memoized, and each conflict found is cached as a set
+    of plugins which can't be picked together, so later branches containing it are skipped early.
+
+    Attributes:
+        resolver: The PluginResolver providing the candidates of each namespace.
+        steps: The number of candidates tried by the last solve.
+    """
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.steps = 0
+        self._candidates = {}
+        self._viable = {}
+
+    @staticmethod
+    def _constraint_key(required_id):
+        return (version_key(required_id.version), required_id.implementation)
+
+    def _get_candidates(self, namespace):
+        """The candidates of a namespace, newest first."""
+        if not (namespace in self._candidates):
+            try:
+                candidates = self.resolver.get_candidates(namespace)
+            except PluginResolverException:
+                candidates = []
+            self._candidates[namespace] = sorted(candidates, key=lambda p: version_key(p.id.version), reverse=True)
+        return self._candidates[namespace]
+
+    def _get_viable(self, namespace, constraint_keys, required_ids):
+        """The candidates of a namespace satisfying every required id, memoized on the set of constraints."""
+        key = (namespace, constraint_keys)
+        if not (key in self._viable):
+            self._viable[key] = [candidate for candidate in self._get_candidates(namespace)
+                if all(id_satisfied_by(required_id, candidate) for required_id in required_ids)]
+        return self._viable[key]
+
+    def solve(self, roots):
+        """Solves the versions of the plugins required by roots.
+
+        Args:
+            roots: PluginIds (or strings parsable as PluginIds) which must be satisfied.
+
+        Returns:
+            A dictionary of namespaces to the chosen PluginStub.
+
+        Raises:
+            VersionConflict if there is no consistent choice of versions.
+        """
+        self.steps = 0
+
+        # Requirements on each namespace, as (PluginId, source plugin) pairs, and the trail of additions to undo.
+        requirements = {}
+        trail = []
+        assignment = {}
+        # Sets of plugins which can't be picked together, indexed by each member.
+        nogoods = {}
+
+        # The viable candidates of each namespace under its current requirements.
+        current_viable = {}
+
+        def require(required_id, source):
+            requirements.setdefault(required_id.namespace, []).append((required_id, source))
+            trail.append(required_id.namespace)
+            current_viable.pop(required_id.namespace, None)
+
+        def undo(mark):
+            while len(trail) > mark:
+                namespace = trail.pop()
+                requirements[namespace].pop()
+                if not requirements[namespace]:
+                    del requirements[namespace]
+                current_viable.pop(namespace, None)
+
+        def viable(namespace, extra=()):
+            if not extra and namespace in current_viable:
+                return current_viable[namespace]
+            reqs = [r for r, s in requirements.get(namespace, [])] + list(extra)
+            constraint_keys = frozenset(self._constraint_key(r) for r in reqs)
+            result = self._get_viable(namespace, constraint_keys, reqs)
+            if not extra:
+                current_viable[namespace] = result
+            return result
+
+        def learn(nogood):
+            nogood = frozenset(nogood)
+            for member in nogood:
+                nogoods.setdefault(member, set()).add(nogood)
+
+        def blocked(candidate):
+            for nogood in nogoods.get(candidate, ()):
+                if all(member is candidate or assignment.get(member.id.namespace, None) is member for member in nogood):
+                    return True
+            return False
+
+        def consistent(candidate):
+            """Forward checks the requirements of candidate, learning a conflict if they fail."""
+            for required_id in candidate.requires:
+                namespace = required_id.namespace
+                chosen = assignment.get(namespace, None)
+                if not (chosen is None):
+                    if not id_satisfied_by(required_id, chosen):
+                        learn([candidate, chosen])
+                        return False
+                elif not viable(namespace, [required_id]):
+                    learn([candidate] + [s for r, s in requirements.get(namespace, []) if not (s is None)])
+                    return False
+            return True
+
+        def pick_namespace():
+            best = None
+            best_count = None
+            for namespace in requirements:
+                if namespace in assignment:
+                    continue
+                count = len(viable(namespace))
+                if best is None or count < best_count:
+                    best, best_count = namespace, count
+                    if count <= 1:
+                        break
+            return best
+
+        for root in roots:
+            require(PluginId.parse(root), None)
+
+        # Each frame is [namespace, viable candidates, next candidate index, trail mark]
+        stack = []
+        last_failure = None
+        while True:
+            namespace = pick_namespace()
+            if namespace is None:
+                return dict(assignment)
+
+            candidates = viable(namespace)
+            if not candidates:
+                last_failure = (namespace, list(requirements.get(namespace, [])))
+            stack.append([namespace, candidates, 0, len(trail)])
+
+            # Advance the top frame to its next usable candidate, backtracking as needed.
+            while stack:
+                frame = stack[-1]
+                namespace, candidates, index, mark = frame
+                assignment.pop(namespace, None)
+                undo(mark)
+
+                while index < len(candidates):
+                    candidate = candidates[index]
+                    index += 1
+                    self.steps += 1
+                    if blocked(candidate) or not consistent(candidate):
+                        continue
+                    assignment[namespace] = candidate
+                    for required_id in candidate.requires:
+                        require(required_id, candidate)
+                    break
+                frame[2] = index
+
+                if namespace in assignment:
+                    break
+                if last_failure is None or last_failure[0] != namespace:
+                    last_failure = (namespace, list(requirements.get(namespace, [])))
+                stack.pop()
+
+            if not stack:
+                raise VersionConflict(*last_failure)
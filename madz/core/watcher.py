@@ -0,0 +1,336 @@
+"""core/watcher.py
+@OffbyOneStudios 2014
+Watches plugin directories for changes, keeping a PluginSystem up to date.
+"""
+
+import os
+import sys
+import abc
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import traceback
+import ctypes
+import ctypes.util
+
+from ..config import *
+
+logger = logging.getLogger(__name__)
+
+def _is_hidden(top, path):
+    """Returns true if path is in a hidden directory below top, these are skipped like in PluginDirectory."""
+    relpath = os.path.relpath(path, top)
+    if relpath == ".":
+        return False
+    for d in relpath.split(os.sep):
+        if d.startswith('.'):
+            return True
+    return False
+
+class IWatcher(metaclass=abc.ABCMeta):
+    """Reports changes to the files and directories of watched trees."""
+
+    @abc.abstractmethod
+    def add_tree(self, path):
+        """Starts watching the directory tree at path."""
+        pass
+
+    @abc.abstractmethod
+    def poll(self, timeout):
+        """Waits up to timeout seconds for changes.
+
+        Returns:
+            A set of the changed paths. A changed directory stands for everything below it.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(IWatcher):
+    """A portable watcher which compares stats of every file in the watched trees."""
+    def __init__(self):
+        self._trees = {}
+
+    @staticmethod
+    def _snapshot(top):
+        snapshot = {}
+        for root, dirs, files in os.walk(top):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in [root] + [os.path.join(root, f) for f in files]:
+                try:
+                    stat = os.stat(name)
+                except OSError:
+                    continue
+                snapshot[name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def add_tree(self, path):
+        path = os.path.abspath(path)
+        if not (path in self._trees):
+            self._trees[path] = self._snapshot(path)
+
+    def poll(self, timeout):
+        time.sleep(timeout)
+        changes = set()
+        for top, old in self._trees.items():
+            new = self._snapshot(top)
+            changes.update(name for name, stat in new.items() if old.get(name, None) != stat)
+            changes.update(name for name in old if not (name in new))
+            self._trees[top] = new
+        return changes
+
+
+class InotifyWatcher(IWatcher):
+    """A linux watcher using inotify through ctypes."""
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    watch_mask = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+        | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    _event_header = struct.Struct("iIII")
+
+    class NotAvailable(Exception): pass
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise InotifyWatcher.NotAvailable("inotify requires linux.")
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self._libc.inotify_init1.argtypes = [ctypes.c_int]
+            self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        except (OSError, AttributeError) as exc:
+            raise InotifyWatcher.NotAvailable("inotify is not available.") from exc
+
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise InotifyWatcher.NotAvailable(os.strerror(ctypes.get_errno()))
+
+        self._trees = []
+        self._watches = {}
+        self._paths = {}
+
+    def _top_of(self, path):
+        for top in self._trees:
+            if path == top or path.startswith(top + os.sep):
+                return top
+        return None
+
+    def _add_watch(self, path):
+        if path in self._paths:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.watch_mask | self.IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning("Out of inotify watches, '{}' is not watched.".format(path))
+            return
+        self._watches[wd] = path
+        self._paths[path] = wd
+
+    def _add_watches(self, top, path):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if not _is_hidden(top, os.path.join(root, d))]
+            self._add_watch(root)
+
+    def _forget_watch(self, wd):
+        path = self._watches.pop(wd, None)
+        if not (path is None):
+            self._paths.pop(path, None)
+
+    def add_tree(self, path):
+        path = os.path.abspath(path)
+        if not (path in self._trees):
+            self._trees.append(path)
+            self._add_watches(path, path)
+
+    def _read_events(self):
+        data = b""
+        while True:
+            try:
+                chunk = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            except InterruptedError:
+                continue
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def poll(self, timeout):
+        try:
+            ready = select.select([self._fd], [], [], timeout)[0]
+        except InterruptedError:
+            ready = []
+        if not ready:
+            return set()
+
+        changes = set()
+        data = self._read_events()
+        offset = 0
+        while offset + self._event_header.size <= len(data):
+            wd, mask, cookie, length = self._event_header.unpack_from(data, offset)
+            offset += self._event_header.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were lost, everything may have changed
+                changes.update(self._trees)
+                continue
+            if mask & self.IN_IGNORED:
+                self._forget_watch(wd)
+                continue
+
+            directory = self._watches.get(wd, None)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+
+            top = self._top_of(path)
+            if top is None or _is_hidden(top, path):
+                continue
+            changes.add(path)
+
+            if (mask & self.IN_ISDIR) and (mask & (self.IN_CREATE | self.IN_MOVED_TO)):
+                self._add_watches(top, path)
+        return changes
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher():
+    """Returns the best watcher for this platform, an InotifyWatcher if possible, otherwise a PollingWatcher."""
+    try:
+        return InotifyWatcher()
+    except InotifyWatcher.NotAvailable as exc:
+        logger.debug("Using polling watcher: {}".format(exc))
+        return PollingWatcher()
+
+
+class PluginSystemWatcher(object):
+    """Keeps the plugins of a PluginSystem up to date by watching its plugin directories.
+
+    Runs in a background thread, batching changes and passing them to PluginSystem.refresh.
+    While watching, PluginSystem.ensure_indexed does not need to re-index the system.
+
+    Plugins are indexed under the system's config and user_config, the configs commands run under, so that
+    plugins are resolved alike whether the watcher or a command indexed them.
+
+    Attributes:
+        system: The PluginSystem being watched.
+        user_config: The UserConfig plugins are indexed under, or None.
+        interval: How long to wait for changes at a time, in seconds. This is also how long stopping may take.
+        settle_time: How long to wait for more changes after a change, so that a burst of changes is refreshed at once.
+    """
+    def __init__(self, system, watcher=None, interval=0.5, settle_time=0.05, user_config=None):
+        self.system = system
+        self.user_config = user_config
+        self.interval = interval
+        self.settle_time = settle_time
+        self._watcher = watcher
+        self._thread = None
+        self._stopping = threading.Event()
+        self._ready = threading.Event()
+        self._watched = set()
+
+    def _sync_trees(self):
+        """Watches any directories added to the system since the last check."""
+        for directory, partial_root in list(self.system.directories):
+            path = directory.directory.path
+            if not (path in self._watched):
+                self._watcher.add_tree(path)
+                self._watched.add(path)
+
+    def _run(self):
+        try:
+            with config.and_merge(self.system.config):
+                if self.user_config is None:
+                    self._watch()
+                else:
+                    with config.and_merge(self.user_config):
+                        self._watch()
+        except:
+            tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
+            logger.error("Plugin watcher failed:\n\t{}".format(tb_string))
+        finally:
+            self._ready.clear()
+            self._watcher.close()
+
+    def _watch(self):
+        # Watch before indexing, so no changes are missed in between.
+        self._sync_trees()
+        self.system.index()
+        self._ready.set()
+
+        while not self._stopping.is_set():
+            self._sync_trees()
+            changes = self._watcher.poll(self.interval)
+            if not changes:
+                continue
+            while True:
+                more = self._watcher.poll(self.settle_time)
+                if not more:
+                    break
+                changes |= more
+
+            start = time.time()
+            try:
+                self.system.refresh(changes)
+            except:
+                tb_string = "\n\t".join(("".join(traceback.format_exception(*sys.exc_info()))).split("\n"))
+                logger.error("Failed to refresh plugins:\n\t{}".format(tb_string))
+            logger.debug("Refreshed {} changed paths in {:.3f}s.".format(len(changes), time.time() - start))
+
+    def start(self):
+        """Starts watching in a background thread, returns once the system has been indexed."""
+        if not (self._thread is None):
+            return
+        if self._watcher is None:
+            self._watcher = make_watcher()
+        self._stopping.clear()
+        self.system.watcher = self
+        self._thread = threading.Thread(target=self._run, name="madz-plugin-watcher", daemon=True)
+        self._thread.start()
+        while not self._ready.wait(0.1) and self._thread.is_alive():
+            pass
+
+    def stop(self):
+        """Stops watching, and waits for the background thread to finish."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        self._watcher = None
+        self._watched = set()
+        if self.system.watcher is self:
+            self.system.watcher = None
+
+    def is_watching(self):
+        """Returns true while the system is being kept up to date."""
+        return self._ready.is_set() and not (self._thread is None) and self._thread.is_alive()
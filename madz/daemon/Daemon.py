@@ -9,6 +9,7 @@ import zmq
 import pydynecs
 
 from .. import bootstrap
+from ..core.watcher import PluginSystemWatcher
 from . import *
 
 logger = logging.getLogger(__name__)
@@ -19,13 +20,15 @@ daemon_filename = ".madz-daemon"
 class Daemon(object):
     current = None
 
-    def __init__(self, system):
+    def __init__(self, system, user_config=None):
         if not (Daemon.current is None):
             raise Exception("Can't re-init daemon.")
         Daemon.current = self
 
         self.context = zmq.Context()
         self.system = system
+        # Index plugins under the same configs as commands, see PluginSystemWatcher.
+        self.watcher = PluginSystemWatcher(system, user_config=user_config)
         self.minions = []
         self._ohshit = False
 
@@ -87,6 +90,9 @@ class Daemon(object):
 
         self._banished = False
 
+        # Keep the plugin system indexed while the daemon runs, so commands don't have to re-index it.
+        self.watcher.start()
+
         try:
             while not self._banished:
                 try:
@@ -127,6 +133,7 @@ class Daemon(object):
                     banish_report += self.banish_daemon()
                     self.control_socket.send_pyobj(banish_report)
         finally:
+            self.watcher.stop()
             if os.path.exists(daemon_filename):
                 os.remove(daemon_filename)
             self.control_socket.close()
@@ -171,18 +171,21 @@ def execute_args_across(argv, system, user_config):
             if not (logging_setup._log_ch is None):
                 logging_setup._log_ch.setLevel(logging_setup._log_level_name_index[args.log_level])
 
-            system.index()
-
-            if not (args.plugins_from_file == None):
-                if args.plugins == None:
-                    args.plugins = [[_plugin_names_from_file(args.plugins_from_file)]]
-                else:
-                    args.plugins += [_plugin_names_from_file(args.plugins_from_file)]
-
-            # Setup active plugins
-            if not (args.plugins is None):
-                active_plugins = [item for sublist in args.plugins for item in sublist]
-                system.set_active_plugins(system.resolve_plugins(active_plugins))
+            # The plugin watcher may not change the plugins while they are resolved. The command then works on the
+            # plugins it resolved, its active plugins, even if the watcher refreshes the plugins meanwhile.
+            with system.lock:
+                system.ensure_indexed()
+
+                if not (args.plugins_from_file == None):
+                    if args.plugins == None:
+                        args.plugins = [[_plugin_names_from_file(args.plugins_from_file)]]
+                    else:
+                        args.plugins += [_plugin_names_from_file(args.plugins_from_file)]
+
+                # Setup active plugins
+                if not (args.plugins is None):
+                    active_plugins = [item for sublist in args.plugins for item in sublist]
+                    system.set_active_plugins(system.resolve_plugins(active_plugins))
 
             # Expand out the parsed arguments
             parsed_commands = args.commands
@@ -206,3 +209,6 @@ def execute_args_across(argv, system, user_config):
 
                     # Remove Modes, safely clean up config.
                     config.set_state(old_config_state)
+
+            report = system.description_report()
+            logger.debug("Materialized {materialized} and validated {validated} of {plugins} plugin descriptions.".format(**report))
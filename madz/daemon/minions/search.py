@@ -24,7 +24,7 @@ class SearchMinion(IMinion):
     class SearchThread(threading.Thread):
         def __init__(self, minion):
             super().__init__()
-            Daemon.current.system.index()
+            Daemon.current.system.ensure_indexed()
             self._minion = minion
             self._database = query_tools.QueryDatabase(file="madz.db", system=Daemon.current.system, table_handlers=SearchMinion.tables)
             self._database.start()
@@ -8,13 +8,13 @@ class BaseCompiler(object):
 
     Attributes:
         language: A BaseLanguage object.
-        config: A MergedConfig object.
+        config: The effective config, a FlatConfig of option keys to values.
     """
     __metaclass__ = abc.ABCMeta
 
     def __init__(self, language):
         self.language = language
-        self.config = config.save()
+        self.config = config.get_flat_config()
 
     class BuildType():
         DynamicPlugin = 0
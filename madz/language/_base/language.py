@@ -54,7 +54,6 @@ class BaseLanguage(metaclass=abc.ABCMeta):
 
     def get_plugin_description_files(self):
         """Returns the names of the plugin description files attached to the language."""
-        foo = self.plugin_stub.description.ast
         return self.plugin_stub._plugin_loader_files
 
     @property
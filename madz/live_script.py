@@ -7,6 +7,7 @@ import os, sys, imp
 # logging namespace
 from .helper import logging_setup as logging
 from . import start_script as madz
+from .config.compiled import load_config_files
     
 class Daemon(object):
     """Class which runs madz in live mode"""
@@ -38,15 +39,8 @@ class Daemon(object):
             madz.logging.bind_to_file(logging_file)
         
         
-        system_config = None
         # Build Config
-        for config_path in self.args.get("plugin_configs", []):
-            with open(config_path) as module_file:
-                config_tmp = imp.load_module("config", module_file, config_path, ('.py', 'r', imp.PY_SOURCE))
-                if system_config is None:
-                    system_config = config_tmp.config
-                else:
-                    system_config = system_config.merge(config_tmp.config)
+        system_config = load_config_files(self.args.get("plugin_configs", []))
         
         # Build the System
         self.system = madz.core.make_system(system_config)
@@ -6,7 +6,7 @@ from .. import daemon_tools
 
 def start(argv, system, user_config):
     try:
-        Daemon.current = Daemon(system)
+        Daemon.current = Daemon(system, user_config)
         daemon_tools.CurrentSystem = system
         Daemon.current.start()
     finally:
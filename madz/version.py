@@ -0,0 +1,6 @@
+"""version.py
+@OffbyOneStudios 2014
+The version of madz.
+"""
+
+version = "0.5.0-dev"